@@ -2,11 +2,10 @@ from contextlib import asynccontextmanager
 import os
 from pathlib import Path
 
-from fastapi import Depends, FastAPI
+from fastapi import Depends, FastAPI, Header
 from fastapi.openapi.docs import get_redoc_html, get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
 from fastapi.responses import FileResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
 from tortoise import Tortoise
 
 from core.dependency import get_current_username
@@ -17,6 +16,11 @@ from core.init_app import (
     register_exceptions,
     register_routers,
 )
+from core.jobs import job_queue
+from services.file_service import file_service
+from services.image_service import image_service
+from services.storage_reaper_service import JOB_KIND as STORAGE_REAP_JOB
+from utils.storage import storage
 
 import sys
 import locale
@@ -40,7 +44,15 @@ except ImportError as e:
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_data()
+    if settings.REAPER_INTERVAL_SECONDS:
+        job_queue.schedule(
+            STORAGE_REAP_JOB, settings.REAPER_INTERVAL_SECONDS, {"mode": settings.REAPER_MODE}
+        )
+    await job_queue.start()
     yield
+    await job_queue.stop()
+    image_service.shutdown()
+    await storage.close()
     await Tortoise.close_connections()
 
 
@@ -59,10 +71,15 @@ def create_app() -> FastAPI:
     register_exceptions(app)
     register_routers(app, prefix="/api")
     
-    # 添加静态文件服务 - 提供uploads目录的文件
-    uploads_dir = Path(__file__).parent.parent / "uploads"
-    if uploads_dir.exists():
-        app.mount("/uploads", StaticFiles(directory=str(uploads_dir)), name="uploads")
+    # 上传文件 - 经由存储后端读取（本地磁盘或对象存储）
+    @app.get("/uploads/{path:path}", include_in_schema=False)
+    async def serve_uploads(
+        path: str,
+        if_none_match: str | None = Header(None),
+        range_header: str | None = Header(None, alias="Range"),
+    ):
+        """服务上传目录中的文件"""
+        return await file_service.upload_response(path, if_none_match, range_header)
     
     # 添加OPTIONS请求处理器
     @app.options("/{path:path}", include_in_schema=False)
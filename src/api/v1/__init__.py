@@ -4,7 +4,7 @@ from core.dependency import DependPermisson, DependAuth
 
 from .apis import apis_router
 from .base import base_router
-from .files import files_router
+from .files import avatars_router, files_router
 from .roles import roles_router
 from .users import users_router
 from .games import games_router
@@ -26,6 +26,8 @@ v1_router.include_router(apis_router, prefix="/api", dependencies=[DependPermiss
 #     auditlog_router, prefix="/auditlog", dependencies=[DependPermisson]
 # )
 v1_router.include_router(files_router, prefix="/files", dependencies=[DependPermisson], tags=["上传文件"])
+# 头像与 /uploads 静态目录一样公开访问，供 <img> 直接引用
+v1_router.include_router(avatars_router, prefix="/avatars", tags=["上传文件"])
 v1_router.include_router(games_router, prefix="/games", dependencies=[DependAuth])
 v1_router.include_router(deepseek_router, prefix="/deepseek", dependencies=[DependAuth], tags=["DeepSeek API"])
 
@@ -1,8 +1,9 @@
 from fastapi import APIRouter
 
+from .avatars import router as avatars_router
 from .files import router
 
 files_router = APIRouter()
 files_router.include_router(router, tags=["上传文件"])
 
-__all__ = ["files_router"]
+__all__ = ["files_router", "avatars_router"]
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Header, HTTPException, Query
+
+from repositories.file_mapping import file_mapping_repository
+from services.file_service import file_service
+from services.image_service import THUMBNAIL_SIZES, image_service
+
+router = APIRouter()
+
+
+@router.get(
+    "/{file_hash}",
+    summary="获取头像",
+)
+async def get_avatar(
+    file_hash: str,
+    size: int | None = Query(None, description="缩略图边长（32/64/128），为空时返回原图"),
+    if_none_match: str | None = Header(None),
+):
+    """
+    获取头像原图或WebP缩略图
+
+    地址由内容哈希决定，内容不会改变，响应可被浏览器和CDN长期缓存。
+
+    Args:
+        file_hash: 图片内容哈希
+        size: 缩略图边长
+        if_none_match: 客户端缓存的ETag
+
+    Returns:
+        图片内容，缓存命中时返回304
+    """
+    if size is not None and size not in THUMBNAIL_SIZES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的尺寸，可选: {', '.join(map(str, THUMBNAIL_SIZES))}",
+        )
+
+    mapping = await file_mapping_repository.get_image_by_hash(file_hash)
+    if not mapping or not mapping.file_path:
+        raise HTTPException(status_code=404, detail="头像不存在")
+
+    file_path, etag = mapping.file_path, file_hash
+    if size is not None:
+        try:
+            file_path = await image_service.ensure_thumbnail(file_path, size)
+        except FileNotFoundError as e:
+            raise HTTPException(status_code=404, detail="头像不存在") from e
+        etag = f"{file_hash}-{size}"
+
+    return await file_service.file_response(
+        file_path,
+        file_hash=etag,
+        if_none_match=if_none_match,
+        cache_control="public, max-age=31536000, immutable",
+    )
@@ -1,7 +1,12 @@
-from fastapi import APIRouter, File, UploadFile
+from fastapi import APIRouter, File, Header, HTTPException, Query, Request, UploadFile
 
-from core.dependency import DependAuth
+from core.dependency import DependAuth, DependPermisson
+from models import User
+from repositories.file_mapping import file_mapping_repository
+from schemas.base import Success
+from schemas.files import MultipartUploadComplete, MultipartUploadInit
 from services.file_service import file_service
+from services.storage_reaper_service import REAP_MODES, storage_reaper_service
 
 router = APIRouter()
 
@@ -24,3 +29,177 @@ async def upload_file(
         上传成功的响应，包含文件信息
     """
     return await file_service.upload_file(file)
+
+
+@router.get(
+    "/{file_id}/download",
+    summary="下载文件",
+)
+async def download_file(
+    file_id: str,
+    if_none_match: str | None = Header(None),
+    range_header: str | None = Header(None, alias="Range"),
+    current_user: User = DependAuth,
+):
+    """
+    下载文件，支持 Range 请求
+
+    文件ID对应的内容不会改变，响应可被客户端长期缓存。
+    只有上传者和超级管理员可以下载，其他用户视为文件不存在。
+
+    Args:
+        file_id: 文件ID
+        if_none_match: 客户端缓存的ETag
+        range_header: 请求的字节区间
+        current_user: 当前用户
+
+    Returns:
+        文件内容，缓存命中时返回304
+    """
+    mapping = await file_mapping_repository.get_file_mapping_by_file_id(file_id)
+    if (
+        not mapping
+        or not mapping["file_path"]
+        or not (current_user.is_superuser or mapping["upload_user_id"] == current_user.id)
+    ):
+        raise HTTPException(status_code=404, detail="文件不存在")
+
+    return await file_service.file_response(
+        mapping["file_path"],
+        filename=mapping["original_filename"],
+        file_hash=mapping["file_hash"],
+        if_none_match=if_none_match,
+        range_header=range_header,
+        cache_control="private, max-age=31536000, immutable",
+    )
+
+
+@router.post(
+    "/multipart",
+    summary="创建分片上传",
+    dependencies=[DependAuth],
+)
+async def init_multipart_upload(upload_in: MultipartUploadInit):
+    """
+    创建可续传的分片上传会话
+
+    Args:
+        upload_in: 文件名、文件大小与分片大小
+
+    Returns:
+        上传会话信息，包含 upload_id 与分片数量
+    """
+    data = await file_service.init_multipart_upload(
+        upload_in.filename, upload_in.file_size, upload_in.part_size
+    )
+    return Success(data=data)
+
+
+@router.get(
+    "/multipart/{upload_id}",
+    summary="查询分片上传进度",
+    dependencies=[DependAuth],
+)
+async def get_multipart_upload(upload_id: str):
+    """
+    查询已上传与缺失的分片，断线后只需重传缺失的分片
+
+    Args:
+        upload_id: 上传会话ID
+
+    Returns:
+        上传会话信息
+    """
+    return Success(data=await file_service.get_multipart_upload(upload_id))
+
+
+@router.put(
+    "/multipart/{upload_id}/parts/{part_number}",
+    summary="上传分片",
+    dependencies=[DependAuth],
+)
+async def upload_part(
+    upload_id: str,
+    part_number: int,
+    request: Request,
+    x_part_sha256: str = Header(..., description="分片内容的SHA-256（十六进制）"),
+):
+    """
+    上传一个分片，请求体为分片的原始字节
+
+    Args:
+        upload_id: 上传会话ID
+        part_number: 分片序号（从1开始）
+        request: 请求对象（流式读取请求体）
+        x_part_sha256: 分片校验和
+
+    Returns:
+        分片信息
+    """
+    data = await file_service.upload_part(
+        upload_id, part_number, request.stream(), x_part_sha256
+    )
+    return Success(data=data)
+
+
+@router.post(
+    "/multipart/{upload_id}/complete",
+    summary="完成分片上传",
+    dependencies=[DependAuth],
+)
+async def complete_multipart_upload(
+    upload_id: str,
+    complete_in: MultipartUploadComplete | None = None,
+):
+    """
+    按序合并全部分片并保存文件
+
+    Args:
+        upload_id: 上传会话ID
+        complete_in: 整个文件的校验和（可选）
+
+    Returns:
+        上传成功的响应，包含文件信息
+    """
+    data = await file_service.complete_multipart_upload(
+        upload_id, complete_in.file_hash if complete_in else None
+    )
+    return Success(data=data, msg="文件上传成功")
+
+
+@router.delete(
+    "/multipart/{upload_id}",
+    summary="取消分片上传",
+    dependencies=[DependAuth],
+)
+async def abort_multipart_upload(upload_id: str):
+    """
+    取消分片上传并删除已上传的分片
+
+    Args:
+        upload_id: 上传会话ID
+    """
+    await file_service.abort_multipart_upload(upload_id)
+    return Success(msg="已取消上传")
+
+
+@router.post(
+    "/gc",
+    summary="回收孤儿文件",
+    dependencies=[DependPermisson],
+)
+async def reap_orphan_files(
+    mode: str = Query("report", description="report / quarantine / delete"),
+    limit: int = Query(100, ge=0, le=1000, description="报告中最多列出的文件数"),
+):
+    """
+    扫描上传目录，默认只返回孤儿文件报告（dry-run）
+
+    Args:
+        mode: 回收模式
+        limit: 报告中最多列出的文件数
+    """
+    if mode not in REAP_MODES:
+        raise HTTPException(status_code=400, detail=f"不支持的回收模式: {mode}")
+    report = await storage_reaper_service.reap(mode=mode, report_limit=limit)
+    return Success(data=report)
@@ -1,9 +1,13 @@
 from fastapi import APIRouter
 
 from .ai_codes import ai_codes_router
+from .battles import battles_router
+from .leaderboard import leaderboard_router
 
 games_router = APIRouter()
 
 games_router.include_router(ai_codes_router, prefix="/ai-codes", tags=["游戏模块"])
+games_router.include_router(battles_router, prefix="/battles", tags=["游戏模块"])
+games_router.include_router(leaderboard_router, prefix="/leaderboard", tags=["游戏模块"])
 
 __all__ = ["games_router"]
@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, Header, HTTPException, UploadFile, File, Form
 from typing import List, Optional
 import os
 
+from tortoise.transactions import in_transaction
+
 from core.dependency import DependAuth, DependPermisson
 from core.crud import CRUD
+from core.jobs import job_queue
+from games import list_available_games
 from models.games import AICode
 from models import User
+from schemas.base import Success
 from schemas.games import AICodeCreate, AICodeUpdate, AICodeResponse
+from services.ai_code_processing_service import ai_code_processing_service
 from services.file_service import file_service
 from services.user_service import user_service
 
@@ -36,8 +42,7 @@ async def get_game_ai_codes(
         AI代码列表
     """
     # 验证游戏类型
-    valid_game_types = ["rock_paper_scissors", "avalon"]
-    if game_type not in valid_game_types:
+    if game_type not in list_available_games():
         raise HTTPException(status_code=400, detail="不支持的游戏类型")
     
     # 获取用户的AI代码
@@ -74,8 +79,7 @@ async def upload_game_ai_code(
         上传成功的AI代码信息
     """
     # 验证游戏类型
-    valid_game_types = ["rock_paper_scissors", "avalon"]
-    if game_type not in valid_game_types:
+    if game_type not in list_available_games():
         raise HTTPException(status_code=400, detail="不支持的游戏类型")
     
     # 验证文件类型
@@ -86,26 +90,19 @@ async def upload_game_ai_code(
     
     # 验证文件大小 (10MB)
     max_size = 10 * 1024 * 1024
-    if file.size > max_size:
+    if file.size and file.size > max_size:
         raise HTTPException(status_code=400, detail="文件大小不能超过10MB")
     
     try:
         # 在文件服务读取文件之前，先保存文件信息
         original_filename = file.filename
-        original_size = file.size
         
         # 上传文件
-        file_info = await file_service.upload_file(file)
-        
-        # 计算文件哈希值（使用已保存的文件信息）
-        import hashlib
-        file_hash = hashlib.md5(f"{original_filename}_{original_size}".encode()).hexdigest()
-        
-        # 从Success响应中获取文件路径
-        # file_info是一个Success对象，需要通过content属性访问数据
-        file_path = ""
-        if hasattr(file_info, 'content') and isinstance(file_info.content, dict):
-            file_path = file_info.content.get("data", {}).get("file_path", "")
+        file_info = await file_service.save_upload(file, max_size=max_size)
+
+        # 文件路径和基于内容的SHA-256哈希
+        file_path = file_info["file_path"]
+        file_hash = file_info["file_hash"]
         
         # 创建AI代码记录
         ai_code_data = AICodeCreate(
@@ -115,14 +112,17 @@ async def upload_game_ai_code(
             game_type=game_type,
             file_path=file_path,
             file_name=original_filename,
-            file_size=original_size,
+            file_size=file_info["file_size"],
             file_hash=file_hash,
+            file_id=file_info["file_id"],
             version=1,
             is_active=False
         )
         
-        # 保存到数据库
-        ai_code = await CRUD(AICode).create(ai_code_data.model_dump())
+        # 保存到数据库，并在同一事务中添加处理任务（解压、语法检查、版本登记）
+        async with in_transaction():
+            ai_code = await CRUD(AICode).create(ai_code_data.model_dump())
+            await ai_code_processing_service.enqueue(ai_code)
         
         return ai_code
         
@@ -170,6 +170,10 @@ async def activate_ai_code(
     if ai_code.user_id != current_user_id:
         raise HTTPException(status_code=403, detail="无权限操作此AI代码")
     
+    # 上传后处理未通过或尚未完成时不能参赛
+    if ai_code.processing_status != "ready":
+        raise HTTPException(status_code=409, detail="AI代码尚未通过上传检查")
+    
     try:
         # 先停用同游戏类型的其他AI代码
         await CRUD(AICode).update_multi(
@@ -188,19 +192,60 @@ async def activate_ai_code(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"激活失败: {str(e)}")
 
+@ai_codes_router.get(
+    "/{ai_code_id}/processing",
+    summary="查询AI代码处理状态",
+)
+async def get_ai_code_processing(
+    ai_code_id: int,
+    current_user_id: int = Depends(get_current_user_id)
+):
+    """
+    查询上传后处理任务的状态
+    
+    Args:
+        ai_code_id: AI代码ID
+        current_user_id: 当前用户ID
+    
+    Returns:
+        处理状态与任务执行结果
+    """
+    ai_code = await CRUD(AICode).get(ai_code_id)
+    if not ai_code:
+        raise HTTPException(status_code=404, detail="AI代码不存在")
+    if ai_code.user_id != current_user_id:
+        raise HTTPException(status_code=403, detail="无权限查看此AI代码")
+    
+    job = None
+    if ai_code.processing_job_id:
+        job = await job_queue.get_status(ai_code.processing_job_id)
+    
+    return Success(data={
+        "ai_code_id": ai_code.id,
+        "processing_status": ai_code.processing_status,
+        "processing_error": ai_code.processing_error,
+        "job": job,
+    })
+
 @ai_codes_router.get(
     "/{ai_code_id}/download",
     summary="下载AI代码文件"
 )
 async def download_ai_code(
     ai_code_id: int,
+    if_none_match: Optional[str] = Header(None),
+    range_header: Optional[str] = Header(None, alias="Range"),
     current_user_id: int = Depends(get_current_user_id)
 ):
     """
     下载AI代码文件
+
+    支持 Range 断点续传；以文件哈希作为ETag，未变化时返回304。
     
     Args:
         ai_code_id: AI代码ID
+        if_none_match: 客户端缓存的ETag
+        range_header: 请求的字节区间
         current_user_id: 当前用户ID
     
     Returns:
@@ -216,8 +261,14 @@ async def download_ai_code(
         raise HTTPException(status_code=403, detail="无权限下载此AI代码")
     
     try:
-        # 从文件服务下载文件
-        file_content = await file_service.download_file(ai_code.file_path)
+        # 流式文件响应（不将文件读入内存）
+        response = await file_service.file_response(
+            ai_code.file_path,
+            filename=ai_code.file_name,
+            file_hash=ai_code.file_hash,
+            if_none_match=if_none_match,
+            range_header=range_header,
+        )
         
         # 更新最后使用时间
         await CRUD(AICode).update(
@@ -225,8 +276,10 @@ async def download_ai_code(
             {"last_used": "now()"}
         )
         
-        return file_content
+        return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"下载失败: {str(e)}")
 
@@ -332,7 +385,9 @@ async def delete_ai_code(
     try:
         # 删除文件
         if ai_code.file_path:
-            await file_service.delete_file(ai_code.file_path)
+            await file_service.delete_file(
+                ai_code.file_path, ai_code.file_id, user_id=ai_code.user_id
+            )
         
         # 删除数据库记录
         await CRUD(AICode).delete(ai_code_id)
@@ -0,0 +1,69 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+
+from core.dependency import DependAuth
+from games.replay_log import ReplayLogError, ReplayLogReader, game_log_path
+from models import User
+from models.games import Battle, BattlePlayer
+
+battles_router = APIRouter()
+
+
+@battles_router.get("/{battle_id}/replay", summary="获取对战回放")
+async def get_battle_replay(
+    battle_id: int,
+    start_round: int = Query(0, ge=0, description="起始回合（包含）"),
+    end_round: Optional[int] = Query(None, ge=0, description="结束回合（包含）"),
+    current_user: User = DependAuth,
+):
+    """
+    以NDJSON流式返回对战回放
+
+    仅解压请求回合区间所在的日志块，每行一条 {"round", "player", "move"} 记录。
+    只有对战参与者和超级管理员可以查看，其他用户视为对战不存在。
+
+    Args:
+        battle_id: 对战ID
+        start_round: 起始回合
+        end_round: 结束回合，为空表示到结尾
+        current_user: 当前用户
+
+    Returns:
+        NDJSON流
+    """
+    if end_round is not None and end_round < start_round:
+        raise HTTPException(status_code=400, detail="结束回合不能小于起始回合")
+
+    battle = await Battle.filter(id=battle_id).first()
+    if not battle or not (
+        current_user.is_superuser
+        or await BattlePlayer.filter(battle_id=battle_id, user_id=current_user.id).exists()
+    ):
+        raise HTTPException(status_code=404, detail="对战不存在")
+    if not battle.game_log_uuid:
+        raise HTTPException(status_code=404, detail="该对战没有回放日志")
+
+    try:
+        # 读取文件头与索引同样是阻塞IO
+        reader = await asyncio.to_thread(
+            ReplayLogReader, str(game_log_path(battle.game_log_uuid))
+        )
+    except (OSError, ValueError, ReplayLogError):
+        raise HTTPException(status_code=404, detail="回放日志不存在或已损坏")
+
+    def lines():
+        for round_no, player, move in reader.read_rounds(start_round, end_round):
+            yield json.dumps(
+                {"round": round_no, "player": player, "move": move},
+                ensure_ascii=False,
+            ) + "\n"
+
+    # 解压与解码在线程池中进行，避免阻塞事件循环
+    return StreamingResponse(
+        iterate_in_threadpool(lines()), media_type="application/x-ndjson"
+    )
@@ -0,0 +1,80 @@
+from fastapi import APIRouter, Depends, Query
+
+from core.dependency import DependAuth
+from models import User
+from schemas.base import Success
+from services.leaderboard_service import leaderboard_service
+
+leaderboard_router = APIRouter()
+
+
+async def get_current_user_id(current_user: User = DependAuth):
+    return current_user.id
+
+
+@leaderboard_router.get("/{game_type}/top", summary="获取排行榜前N名")
+async def get_top(
+    game_type: str,
+    ranking_id: int = Query(0, description="排行榜ID"),
+    limit: int = Query(10, ge=1, le=100, description="返回数量"),
+):
+    """
+    获取排行榜前N名
+
+    Args:
+        game_type: 游戏类型
+        ranking_id: 排行榜ID
+        limit: 返回数量
+
+    Returns:
+        排名列表
+    """
+    return Success(data=await leaderboard_service.top(game_type, ranking_id, limit))
+
+
+@leaderboard_router.get("/{game_type}/me", summary="获取我的排名")
+async def get_my_rank(
+    game_type: str,
+    ranking_id: int = Query(0, description="排行榜ID"),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """
+    获取当前用户的排名
+
+    Args:
+        game_type: 游戏类型
+        ranking_id: 排行榜ID
+        current_user_id: 当前用户ID
+
+    Returns:
+        名次和ELO分数，未上榜时为空
+    """
+    return Success(
+        data=await leaderboard_service.get_rank(current_user_id, game_type, ranking_id)
+    )
+
+
+@leaderboard_router.get("/{game_type}/around", summary="获取我附近的排名")
+async def get_around_me(
+    game_type: str,
+    ranking_id: int = Query(0, description="排行榜ID"),
+    radius: int = Query(5, ge=1, le=50, description="上下各取的名次数"),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    """
+    获取当前用户上下邻近的排名
+
+    Args:
+        game_type: 游戏类型
+        ranking_id: 排行榜ID
+        radius: 上下各取的名次数
+        current_user_id: 当前用户ID
+
+    Returns:
+        排名列表
+    """
+    return Success(
+        data=await leaderboard_service.around(
+            current_user_id, game_type, ranking_id, radius
+        )
+    )
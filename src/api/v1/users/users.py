@@ -2,9 +2,11 @@ from fastapi import APIRouter, Body, Query, UploadFile, File, Depends, HTTPExcep
 from typing import Optional
 import os
 
+from schemas.base import Fail, Success
 from schemas.users import UserCreate, UserUpdate, AvatarUpload, ProfileUpdate, UpdatePassword
 from services.user_service import user_service
 from services.file_service import file_service
+from services.image_service import THUMBNAIL_SIZES, avatar_url, image_service
 from core.dependency import DependAuth, DependPermisson
 from core.ctx import CTX_USER_ID
 from models import User
@@ -33,7 +35,10 @@ async def list_user(
 async def get_user(
     user_id: int = Query(..., description="用户ID"),
 ):
-    return await user_service.get_user_detail(user_id)
+    user = await user_service.get_user_detail(user_id)
+    if user is None:
+        return Fail(msg="用户不存在")
+    return Success(data=user)
 
 
 @router.post("/create", summary="创建用户", dependencies=[DependPermisson])
@@ -96,7 +101,7 @@ async def upload_avatar(
         CTX_USER_ID.set(current_user.id)
         
         # 上传文件
-        file_info = await file_service.upload_file(file)
+        file_info = await file_service.upload_file(file, max_size=max_size)
         
         # 检查上传结果 - Success对象没有success属性，需要检查状态码
         if hasattr(file_info, 'status_code') and file_info.status_code != 200:
@@ -105,6 +110,7 @@ async def upload_avatar(
         # 获取文件路径 - 直接使用文件服务返回的数据
         # file_service.upload_file() 返回的是 Success 对象，直接访问 data 属性
         file_path = ""
+        data = {}
         
         try:
             # 从Success对象的data属性中获取文件路径
@@ -131,6 +137,21 @@ async def upload_avatar(
         if not file_path:
             raise HTTPException(status_code=500, detail="文件上传失败，未获取到文件路径")
         
+        # 在进程池中生成WebP缩略图，同时确认文件确实是可解码的图片
+        thumbnails = {}
+        file_hash = data.get("file_hash") if isinstance(data, dict) else None
+        try:
+            await image_service.generate_thumbnails(file_path)
+            if file_hash:
+                thumbnails = {str(size): avatar_url(file_hash, size) for size in THUMBNAIL_SIZES}
+        except Exception as e:
+            await file_service.delete_file(
+                file_path,
+                data.get("file_id") if isinstance(data, dict) else None,
+                user_id=current_user.id,
+            )
+            raise HTTPException(status_code=400, detail="无法识别的图片文件") from e
+        
         # 更新用户头像
         result = await user_service.update_user_avatar(current_user.id, file_path)
         if hasattr(result, 'status_code') and result.status_code != 200:
@@ -141,6 +162,7 @@ async def upload_avatar(
         
         return AvatarUpload(
             avatar_url=normalized_path,
+            thumbnails=thumbnails,
             message="头像上传成功"
         )
         
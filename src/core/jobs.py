@@ -0,0 +1,276 @@
+import asyncio
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta
+from typing import Any
+
+from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
+
+from log import logger
+from models.admin import BackgroundJob
+from settings import settings
+
+JobHandler = Callable[[dict], Awaitable[Any]]
+FailureHandler = Callable[[dict, str], Awaitable[None]]
+
+RETRY_BACKOFF_SECONDS = 5  # 第n次失败后等待 5 * 2^(n-1) 秒再重试
+LEASE_RENEWALS = 3  # 每个租约周期内续租的次数，偶尔一次续租失败不会导致租约过期
+
+
+class LeaseLostError(Exception):
+    """任务租约已被其他工作协程领取"""
+
+
+class JobQueue:
+    """持久化后台任务队列
+
+    与请求级的 BgTasks 不同，任务保存在 background_job 表中：
+    - 入队与业务数据可在同一事务中提交，请求立即返回
+    - 固定数量的工作协程领取任务，并发数有上限
+    - 领取时写入租约，执行期间定期续租；进程崩溃后租约过期的任务会被重新领取
+    - 失败按指数退避重试，超过次数后标记为 failed
+    - 可注册周期任务，到期时若同类任务未在排队或执行则入队
+    """
+
+    def __init__(self):
+        self._handlers: dict[str, JobHandler] = {}
+        self._failure_handlers: dict[str, FailureHandler] = {}
+        self._schedules: dict[str, tuple[float, dict]] = {}
+        self._workers: list[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    def register(
+        self, kind: str, handler: JobHandler, on_failure: FailureHandler | None = None
+    ) -> None:
+        """
+        注册任务处理函数
+
+        Args:
+            kind: 任务类型
+            handler: 接收任务参数并返回可JSON序列化结果的处理函数
+            on_failure: 重试次数用尽后调用，接收任务参数与错误信息，用于把业务状态置为终态
+        """
+        self._handlers[kind] = handler
+        if on_failure is not None:
+            self._failure_handlers[kind] = on_failure
+
+    def schedule(self, kind: str, interval: float, payload: dict | None = None) -> None:
+        """
+        注册周期任务，start 时开始计时
+
+        Args:
+            kind: 任务类型（需已注册处理函数）
+            interval: 入队间隔（秒）
+            payload: 任务参数
+        """
+        self._schedules[kind] = (interval, payload or {})
+
+    async def enqueue(
+        self, kind: str, payload: dict | None = None, max_attempts: int = 3
+    ) -> BackgroundJob:
+        """
+        添加任务
+
+        Args:
+            kind: 任务类型
+            payload: 任务参数
+            max_attempts: 最多执行次数
+
+        Returns:
+            BackgroundJob: 任务记录
+        """
+        job = await BackgroundJob.create(
+            kind=kind,
+            payload=payload or {},
+            max_attempts=max_attempts,
+            run_at=datetime.now(),
+        )
+        self._wakeup.set()
+        return job
+
+    async def get_status(self, job_id: int) -> dict | None:
+        """查询任务状态"""
+        job = await BackgroundJob.filter(id=job_id).first()
+        if not job:
+            return None
+        return await job.to_dict(exclude_fields=["payload", "locked_until"])
+
+    async def start(self, concurrency: int | None = None) -> None:
+        """启动工作协程"""
+        if self._workers:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        size = concurrency or settings.JOB_WORKER_CONCURRENCY
+        self._workers = [
+            asyncio.create_task(self._work(), name=f"job-worker-{i}")
+            for i in range(size)
+        ]
+        self._workers.extend(
+            asyncio.create_task(self._tick(kind, interval, payload), name=f"job-schedule-{kind}")
+            for kind, (interval, payload) in self._schedules.items()
+        )
+        logger.info(f"后台任务队列已启动，并发数 {size}")
+
+    async def stop(self) -> None:
+        """停止领取新任务；执行中的任务被取消，租约到期后会被重新领取"""
+        self._stopping = True
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def run_pending(self) -> int:
+        """在当前协程中执行所有已到期的任务，返回执行数量"""
+        count = 0
+        while job := await self._claim():
+            await self._run(job)
+            count += 1
+        return count
+
+    async def _work(self) -> None:
+        while not self._stopping:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error(f"领取后台任务失败: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), settings.JOB_POLL_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            await self._run(job)
+
+    async def _tick(self, kind: str, interval: float, payload: dict) -> None:
+        """周期入队；多个进程同时运行时，已有排队或执行中的同类任务则跳过"""
+        while not self._stopping:
+            await asyncio.sleep(interval)
+            try:
+                if not await BackgroundJob.filter(
+                    kind=kind, status__in=["pending", "running"]
+                ).exists():
+                    await self.enqueue(kind, payload, max_attempts=1)
+            except Exception as e:
+                logger.error(f"周期任务 {kind} 入队失败: {e}")
+
+    async def _claim(self) -> BackgroundJob | None:
+        """
+        领取一个到期任务
+
+        PostgreSQL/MySQL 上以 FOR UPDATE SKIP LOCKED 跳过其他进程正在领取的行；
+        更新时再比较 status 与 attempts，不支持行锁的数据库上同样只有一方领取成功。
+        """
+        now = datetime.now()
+        async with in_transaction():
+            job = (
+                await BackgroundJob.filter(
+                    Q(status="pending", run_at__lte=now)
+                    | Q(status="running", locked_until__lt=now)
+                )
+                .order_by("run_at", "id")
+                .select_for_update(skip_locked=True)
+                .first()
+            )
+            if job is None:
+                return None
+
+            locked_until = now + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+            claimed = await BackgroundJob.filter(
+                id=job.id, status=job.status, attempts=job.attempts
+            ).update(
+                status="running", attempts=job.attempts + 1, locked_until=locked_until
+            )
+            if not claimed:
+                return None
+
+        job.status = "running"
+        job.attempts += 1
+        job.locked_until = locked_until
+        return job
+
+    async def _run(self, job: BackgroundJob) -> None:
+        handler = self._handlers.get(job.kind)
+        try:
+            if handler is None:
+                raise LookupError(f"未注册的任务类型: {job.kind}")
+            result = await self._execute(job, handler)
+        except asyncio.CancelledError:
+            raise
+        except LeaseLostError:
+            logger.warning(f"后台任务 {job.id}({job.kind}) 租约已被重新领取，放弃本次执行")
+            return
+        except Exception as e:
+            logger.error(f"后台任务 {job.id}({job.kind}) 第 {job.attempts} 次执行失败: {e}")
+            if job.attempts < job.max_attempts:
+                delay = RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+                updates = {
+                    "status": "pending",
+                    "run_at": datetime.now() + timedelta(seconds=delay),
+                }
+            else:
+                updates = {"status": "failed"}
+            updates.update(error=f"{type(e).__name__}: {e}", locked_until=None)
+        else:
+            updates = {"status": "succeeded", "result": result, "locked_until": None}
+
+        # 只更新自己持有的租约，租约过期后被其他工作协程重新领取的任务不受影响
+        updated = await BackgroundJob.filter(
+            id=job.id, status="running", attempts=job.attempts
+        ).update(**updates)
+
+        on_failure = self._failure_handlers.get(job.kind)
+        if updated and updates["status"] == "failed" and on_failure is not None:
+            try:
+                await on_failure(job.payload or {}, updates["error"])
+            except Exception as e:
+                logger.error(f"后台任务 {job.id}({job.kind}) 失败回调出错: {e}")
+
+    async def _execute(self, job: BackgroundJob, handler: JobHandler) -> Any:
+        """
+        执行处理函数，执行期间定期延长租约
+
+        续租时发现租约已被其他工作协程领取（例如本进程长时间阻塞导致续租未及时执行），
+        取消处理函数并抛出 LeaseLostError，避免同一任务同时执行两份。
+        """
+        task = asyncio.create_task(handler(job.payload or {}))
+        heartbeat = asyncio.create_task(self._renew_lease(job))
+        try:
+            await asyncio.wait({task, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+            lease_lost = not task.done()
+        finally:
+            heartbeat.cancel()
+            task.cancel()
+            await asyncio.gather(task, heartbeat, return_exceptions=True)
+
+        if lease_lost:
+            raise LeaseLostError(f"任务 {job.id} 的租约已被重新领取")
+        return task.result()
+
+    async def _renew_lease(self, job: BackgroundJob) -> None:
+        """定期延长租约；租约不再属于本次执行时返回"""
+        interval = settings.JOB_LEASE_SECONDS / LEASE_RENEWALS
+        while True:
+            await asyncio.sleep(interval)
+            locked_until = datetime.now() + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+            try:
+                renewed = await BackgroundJob.filter(
+                    id=job.id, status="running", attempts=job.attempts
+                ).update(locked_until=locked_until)
+            except Exception as e:
+                logger.error(f"后台任务 {job.id}({job.kind}) 续租失败: {e}")
+                continue
+            if not renewed:
+                return
+            job.locked_until = locked_until
+
+
+# 全局实例
+job_queue = JobQueue()
@@ -6,91 +6,159 @@ Games Package - 游戏逻辑包
 - 阿瓦隆
 - 其他游戏类型
 
-此包提供统一的游戏接口和自动发现机制
+此包提供统一的游戏接口和延迟加载的游戏注册表：
+- 内置游戏：读取各游戏目录下的 manifest.json（不导入游戏模块）
+- 第三方游戏：通过 "evoai.games" 入口点注册，值指向裁判类，
+  例如 ``chess = "evoai_chess.referee:Referee"``
+
+注册时只记录元数据，裁判类在首次调用 get_game_referee() 时才导入。
 """
 
-import os
 import importlib
-from typing import Dict, Type, Any
+import json
+import logging
+import os
+import threading
+from importlib.metadata import entry_points
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
 
-# 游戏注册表
+ENTRY_POINT_GROUP = "evoai.games"
+MANIFEST_FILE = "manifest.json"
+
+# 游戏注册表：游戏ID -> 元数据（name / version / description / referee / source）
 GAME_REGISTRY: Dict[str, Dict[str, Any]] = {}
 
-def _discover_games():
-    """自动发现并注册所有游戏"""
+_referees: Dict[str, Any] = {}
+_referee_lock = threading.Lock()
+
+
+def _discover_builtin_games() -> None:
+    """读取内置游戏的清单文件"""
     current_dir = os.path.dirname(__file__)
-    
-    for item in os.listdir(current_dir):
-        item_path = os.path.join(current_dir, item)
-        
-        # 检查是否是目录且包含__init__.py文件
-        if (os.path.isdir(item_path) and 
-            os.path.exists(os.path.join(item_path, "__init__.py")) and
-            not item.startswith("_")):
-            
-            try:
-                # 动态导入游戏模块
-                module = importlib.import_module(f".{item}", package=__name__)
-                
-                # 获取游戏信息
-                game_name = getattr(module, "GAME_NAME", item)
-                game_version = getattr(module, "GAME_VERSION", "1.0.0")
-                game_description = getattr(module, "GAME_DESCRIPTION", "")
-                referee_class = getattr(module, "Referee", None)
-                
-                # 注册游戏
-                GAME_REGISTRY[item] = {
-                    "name": game_name,
-                    "version": game_version,
-                    "description": game_description,
-                    "referee": referee_class,
-                    "module": module
-                }
-                
-            except ImportError as e:
-                print(f"警告: 无法导入游戏模块 {item}: {e}")
-            except Exception as e:
-                print(f"警告: 游戏模块 {item} 注册失败: {e}")
-
-# 自动发现游戏
-_discover_games()
-
-def get_game(game_id: str) -> Dict[str, Any]:
+
+    with os.scandir(current_dir) as it:
+        items = sorted(it, key=lambda entry: entry.name)
+
+    for item in items:
+        if not item.is_dir() or item.name.startswith("_"):
+            continue
+        manifest_path = os.path.join(item.path, MANIFEST_FILE)
+        if not os.path.isfile(manifest_path):
+            continue
+
+        try:
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            GAME_REGISTRY[item.name] = {
+                "name": manifest.get("name", item.name),
+                "version": manifest.get("version", "1.0.0"),
+                "description": manifest.get("description", ""),
+                "referee": f"{__name__}.{item.name}.{manifest['referee']}",
+                "source": "builtin",
+            }
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("游戏清单无效，已跳过 %s: %s", item.name, e)
+
+
+def _discover_entry_point_games() -> None:
+    """读取第三方包通过入口点注册的游戏（内置游戏优先）"""
+    try:
+        discovered = entry_points(group=ENTRY_POINT_GROUP)
+    except Exception as e:
+        logger.warning("读取游戏入口点失败: %s", e)
+        return
+
+    for ep in discovered:
+        if ep.name in GAME_REGISTRY:
+            logger.warning("游戏ID冲突，已忽略入口点 %s = %s", ep.name, ep.value)
+            continue
+        dist = ep.dist
+        GAME_REGISTRY[ep.name] = {
+            "name": ep.name,
+            "version": dist.version if dist else "1.0.0",
+            "description": (dist.metadata["Summary"] or "") if dist else "",
+            "referee": ep.value,
+            "source": dist.name if dist else "entry_point",
+        }
+
+
+def _load_referee(game_id: str, target: str):
+    """导入 "模块:属性" 形式的裁判类"""
+    module_name, _, attr = target.partition(":")
+    try:
+        referee = importlib.import_module(module_name)
+        for part in (attr or "Referee").split("."):
+            referee = getattr(referee, part)
+        return referee
+    except (ImportError, AttributeError) as e:
+        logger.warning("无法加载游戏 %s 的裁判 %s: %s", game_id, target, e)
+        return None
+
+
+# 启动时只登记元数据
+_discover_builtin_games()
+_discover_entry_point_games()
+
+
+def get_game(game_id: str) -> Optional[Dict[str, Any]]:
     """获取指定游戏的信息"""
-    return GAME_REGISTRY.get(game_id)
+    game_info = GAME_REGISTRY.get(game_id)
+    return dict(game_info) if game_info else None
+
 
 def get_all_games() -> Dict[str, Dict[str, Any]]:
     """获取所有已注册游戏的信息"""
-    return GAME_REGISTRY.copy()
+    return {game_id: dict(info) for game_id, info in GAME_REGISTRY.items()}
+
 
 def get_game_referee(game_id: str):
-    """获取指定游戏的裁判类"""
+    """获取指定游戏的裁判类（首次调用时导入）"""
     game_info = GAME_REGISTRY.get(game_id)
-    return game_info.get("referee") if game_info else None
+    if not game_info:
+        return None
+
+    referee = _referees.get(game_id)
+    if referee is None:
+        with _referee_lock:
+            referee = _referees.get(game_id)
+            if referee is None:
+                referee = _load_referee(game_id, game_info["referee"])
+                if referee is not None:
+                    _referees[game_id] = referee
+    return referee
+
 
 def list_available_games() -> list:
     """列出所有可用的游戏ID"""
     return list(GAME_REGISTRY.keys())
 
-# 为了向后兼容，仍然导出Referee类
+
+# 为了向后兼容，仍然导出Referee类（按需导入）
 # 但建议使用get_game_referee()函数来获取特定游戏的裁判类
-try:
-    from .rock_paper_scissors.referee import Referee as RockPaperScissorsReferee
-    from .avalon.referee import Referee as AvalonReferee
-except ImportError:
-    RockPaperScissorsReferee = None
-    AvalonReferee = None
+_LEGACY_REFEREES = {
+    "RockPaperScissorsReferee": "rock_paper_scissors",
+    "AvalonReferee": "avalon",
+}
+
+
+def __getattr__(name: str):
+    if name in _LEGACY_REFEREES:
+        return get_game_referee(_LEGACY_REFEREES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
     # 游戏注册系统
     "GAME_REGISTRY",
+    "ENTRY_POINT_GROUP",
     "get_game",
-    "get_all_games", 
+    "get_all_games",
     "get_game_referee",
     "list_available_games",
-    
+
     # 向后兼容的导出
     "RockPaperScissorsReferee",
     "AvalonReferee",
 ]
-
@@ -4,15 +4,26 @@ Avalon Game Package - 阿瓦隆游戏包
 实现七人局阿瓦隆游戏的核心逻辑
 """
 
-from .referee import Referee
+import json
+from pathlib import Path
 
-# 游戏元数据
-GAME_NAME = "阿瓦隆"
-GAME_VERSION = "1.0.0"
-GAME_DESCRIPTION = "七人局阿瓦隆游戏，支持AI和玩家参与"
+from .referee import AvalonError, AvalonState, Phase, Referee, Role, Side
+
+# 游戏元数据（与注册表共用 manifest.json）
+_MANIFEST = json.loads(
+    Path(__file__).with_name("manifest.json").read_text(encoding="utf-8")
+)
+GAME_NAME = _MANIFEST["name"]
+GAME_VERSION = _MANIFEST["version"]
+GAME_DESCRIPTION = _MANIFEST["description"]
 
 __all__ = [
     "Referee",
+    "AvalonState",
+    "AvalonError",
+    "Phase",
+    "Role",
+    "Side",
     "GAME_NAME",
     "GAME_VERSION",
     "GAME_DESCRIPTION"
@@ -1,211 +1,474 @@
 """
-Rock Paper Scissors Game Referee - 石头剪刀布游戏裁判
+Avalon Game Referee - 七人局阿瓦隆游戏裁判
 
 负责：
-- 游戏规则验证
+- 身份分配与视野
+- 组队提议、投票、任务与刺杀的规则校验
 - 胜负判定
-- 结果计算
+
+局面保存在 AvalonState 中：使用 __slots__，玩家集合（队伍、投票、阵营）
+均为7位整数位掩码，任务结果按每个任务2位打包，复制和比较的开销都很小，
+便于每秒模拟数千局。所有随机性来自以种子初始化的 random.Random，
+同一种子与同一动作序列总能复现相同的对局。
 """
 
 import logging
 import random
-from typing import Dict, List, Tuple, Optional
-from enum import Enum
+import time
+from enum import IntEnum
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
 
 logger = logging.getLogger(__name__)
 
-
-class Move(Enum):
-    """游戏动作枚举"""
-    ROCK = "rock"
-    PAPER = "paper"
-    SCISSORS = "scissors"
+NUM_PLAYERS = 7
+
+# 每个任务的出队人数，以及任务失败所需的失败票数（七人局第4个任务需2张）
+QUEST_TEAM_SIZES = (2, 3, 3, 4, 4)
+QUEST_FAILS_REQUIRED = (1, 1, 1, 2, 1)
+QUESTS_TO_WIN = 3
+MAX_REJECTIONS = 5  # 连续5次组队被否决则邪恶方获胜
+
+# 任务结果的2位编码
+QUEST_PENDING = 0
+QUEST_SUCCESS = 1
+QUEST_FAIL = 2
+
+
+class AvalonError(ValueError):
+    """非法的阿瓦隆动作"""
+
+
+class Role(IntEnum):
+    """身份"""
+    MERLIN = 0
+    PERCIVAL = 1
+    LOYAL_SERVANT = 2
+    MORGANA = 3
+    ASSASSIN = 4
+    OBERON = 5
+
+
+class Phase(IntEnum):
+    """对局阶段"""
+    TEAM_PROPOSAL = 0
+    TEAM_VOTE = 1
+    QUEST = 2
+    ASSASSINATION = 3
+    FINISHED = 4
+
+
+class Side(IntEnum):
+    """阵营（winner 为 NONE 表示对局未结束）"""
+    NONE = 0
+    GOOD = 1
+    EVIL = 2
+
+
+# 七人局身份配置：4名正义（梅林、派西维尔、2名忠臣），3名邪恶（莫甘娜、刺客、奥伯伦）
+SEVEN_PLAYER_ROLES = (
+    Role.MERLIN,
+    Role.PERCIVAL,
+    Role.LOYAL_SERVANT,
+    Role.LOYAL_SERVANT,
+    Role.MORGANA,
+    Role.ASSASSIN,
+    Role.OBERON,
+)
+EVIL_ROLES = frozenset((Role.MORGANA, Role.ASSASSIN, Role.OBERON))
+
+ROLE_NAMES = {
+    Role.MERLIN: "梅林",
+    Role.PERCIVAL: "派西维尔",
+    Role.LOYAL_SERVANT: "亚瑟的忠臣",
+    Role.MORGANA: "莫甘娜",
+    Role.ASSASSIN: "刺客",
+    Role.OBERON: "奥伯伦",
+}
+
+
+def seats(mask: int) -> Iterator[int]:
+    """按座位号升序遍历位掩码中的玩家"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def to_mask(players: Iterable[int]) -> int:
+    """将座位号集合转为位掩码"""
+    mask = 0
+    for player in players:
+        mask |= 1 << player
+    return mask
+
+
+class AvalonState:
+    """阿瓦隆局面
+
+    Attributes:
+        seed: 对局种子
+        roles: 各座位身份编码（bytes，下标为座位号）
+        evil_mask: 邪恶方玩家位掩码
+        phase: 当前阶段
+        quest_no: 当前任务序号（0-4）
+        leader: 当前队长座位号
+        rejections: 当前任务连续被否决的组队次数
+        team: 当前提议的队伍位掩码
+        votes: 最近一次投票中赞成的玩家位掩码
+        quests: 任务结果，每个任务占2位（见 QUEST_*）
+        successes / failures: 成功与失败的任务数
+        winner: 获胜阵营
+        assassin_target: 刺客的刺杀目标（-1 表示尚未刺杀）
+    """
+
+    __slots__ = (
+        "seed",
+        "roles",
+        "evil_mask",
+        "phase",
+        "quest_no",
+        "leader",
+        "rejections",
+        "team",
+        "votes",
+        "quests",
+        "successes",
+        "failures",
+        "winner",
+        "assassin_target",
+    )
+
+    def __init__(self, seed: int, roles: bytes, leader: int):
+        self.seed = seed
+        self.roles = roles
+        self.evil_mask = to_mask(
+            i for i, role in enumerate(roles) if role in EVIL_ROLES
+        )
+        self.phase = Phase.TEAM_PROPOSAL
+        self.quest_no = 0
+        self.leader = leader
+        self.rejections = 0
+        self.team = 0
+        self.votes = 0
+        self.quests = 0
+        self.successes = 0
+        self.failures = 0
+        self.winner = Side.NONE
+        self.assassin_target = -1
+
+    def copy(self) -> "AvalonState":
+        """浅复制局面（所有字段均为不可变值）"""
+        clone = AvalonState.__new__(AvalonState)
+        for name in AvalonState.__slots__:
+            setattr(clone, name, getattr(self, name))
+        return clone
+
+    def quest_result(self, quest_no: int) -> int:
+        """获取指定任务的结果编码"""
+        return (self.quests >> (2 * quest_no)) & 0b11
+
+    def seat_of(self, role: Role) -> int:
+        """获取持有指定身份的第一个座位号"""
+        return self.roles.index(role)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.phase == Phase.FINISHED
+
+    def __repr__(self) -> str:
+        return (
+            f"AvalonState(seed={self.seed}, phase={Phase(self.phase).name}, "
+            f"quest_no={self.quest_no}, leader={self.leader}, "
+            f"successes={self.successes}, failures={self.failures}, "
+            f"winner={Side(self.winner).name})"
+        )
 
 
-class GameResult(Enum):
-    """游戏结果枚举"""
-    WIN = "win"
-    LOSS = "loss"
-    DRAW = "draw"
-    ERROR = "error"
+class Referee:
+    """七人局阿瓦隆游戏裁判
 
+    裁判本身无状态，所有动作方法都直接修改传入的 AvalonState；
+    非法动作抛出 AvalonError 且不修改局面。
+    """
 
-class Referee:
-    """石头剪刀布游戏裁判"""
-
-    def __init__(self):
-        """初始化裁判"""
-        self.valid_moves = [move.value for move in Move]
-        self.win_conditions = {
-            Move.ROCK.value: Move.SCISSORS.value,      # 石头胜剪刀
-            Move.PAPER.value: Move.ROCK.value,         # 布胜石头
-            Move.SCISSORS.value: Move.PAPER.value      # 剪刀胜布
-        }
+    num_players = NUM_PLAYERS
 
-    def validate_move(self, move: str) -> bool:
+    def new_game(self, seed: Optional[int] = None) -> AvalonState:
         """
-        验证玩家动作是否有效
+        开始新对局：按种子洗牌分配身份并随机选出首任队长
 
         Args:
-            move: 玩家动作
+            seed: 随机种子，为空时随机生成（可从 state.seed 取回用于复现）
 
         Returns:
-            bool: 是否有效
+            AvalonState: 初始局面
         """
-        return move in self.valid_moves
-
-    def determine_winner(self, move1: str, move2: str) -> Tuple[GameResult, GameResult]:
+        if seed is None:
+            seed = random.getrandbits(63)
+        rng = random.Random(seed)
+        roles = list(SEVEN_PLAYER_ROLES)
+        rng.shuffle(roles)
+        return AvalonState(seed, bytes(roles), rng.randrange(NUM_PLAYERS))
+
+    def required_team_size(self, state: AvalonState) -> int:
+        return QUEST_TEAM_SIZES[state.quest_no]
+
+    def propose_team(
+        self, state: AvalonState, player: int, team: Iterable[int]
+    ) -> int:
         """
-        判定两个玩家之间的胜负
+        队长提议出队成员
 
         Args:
-            move1: 玩家1的动作
-            move2: 玩家2的动作
+            state: 局面
+            player: 提议者座位号（必须是队长）
+            team: 队员座位号
 
         Returns:
-            Tuple[GameResult, GameResult]: (玩家1结果, 玩家2结果)
+            int: 队伍位掩码
         """
-        try:
-            # 验证动作
-            if not self.validate_move(move1) or not self.validate_move(move2):
-                logger.error(f"无效的动作: {move1} vs {move2}")
-                return GameResult.ERROR, GameResult.ERROR
-
-            # 平局
-            if move1 == move2:
-                return GameResult.DRAW, GameResult.DRAW
+        self._expect_phase(state, Phase.TEAM_PROPOSAL)
+        if player != state.leader:
+            raise AvalonError(f"玩家{player}不是队长")
+
+        members = list(team)
+        if any(not 0 <= p < NUM_PLAYERS for p in members):
+            raise AvalonError(f"无效的座位号: {members}")
+        mask = to_mask(members)
+        required = QUEST_TEAM_SIZES[state.quest_no]
+        if mask.bit_count() != required or len(members) != required:
+            raise AvalonError(f"第{state.quest_no + 1}个任务需要{required}名不同的队员")
+
+        state.team = mask
+        state.phase = Phase.TEAM_VOTE
+        return mask
+
+    def vote(self, state: AvalonState, approvals: Sequence[bool]) -> bool:
+        """
+        全体玩家对提议的队伍投票，超过半数赞成则通过
 
-            # 判定胜负
-            if self.win_conditions[move1] == move2:
-                # 玩家1获胜
-                return GameResult.WIN, GameResult.LOSS
-            else:
-                # 玩家2获胜
-                return GameResult.LOSS, GameResult.WIN
+        Args:
+            state: 局面
+            approvals: 按座位号排列的赞成(True)/反对(False)
 
-        except Exception as e:
-            logger.error(f"判定胜负时出错: {e}")
-            return GameResult.ERROR, GameResult.ERROR
+        Returns:
+            bool: 队伍是否通过
+        """
+        self._expect_phase(state, Phase.TEAM_VOTE)
+        if len(approvals) != NUM_PLAYERS:
+            raise AvalonError(f"需要{NUM_PLAYERS}名玩家的投票")
+
+        state.votes = to_mask(i for i, approve in enumerate(approvals) if approve)
+        if state.votes.bit_count() * 2 > NUM_PLAYERS:
+            state.rejections = 0
+            state.phase = Phase.QUEST
+            return True
+
+        state.rejections += 1
+        state.team = 0
+        if state.rejections >= MAX_REJECTIONS:
+            self._finish(state, Side.EVIL)
+        else:
+            state.leader = (state.leader + 1) % NUM_PLAYERS
+            state.phase = Phase.TEAM_PROPOSAL
+        return False
 
-    def start_match(self, player1_move: str, player2_move: str) -> Dict[str, any]:
+    def play_quest(self, state: AvalonState, cards: Dict[int, bool]) -> int:
         """
-        开始一场比赛
+        队员执行任务，正义方只能出成功票
 
         Args:
-            player1_move: 玩家1的动作
-            player2_move: 玩家2的动作
-
-        Returns:
-            Dict: 比赛结果
-        """
-        try:
-            logger.info(f"开始比赛: {player1_move} vs {player2_move}")
-
-            # 判定胜负
-            result1, result2 = self.determine_winner(
-                player1_move, player2_move)
-
-            if result1 == GameResult.ERROR:
-                return {
-                    "success": False,
-                    "error": "无效的动作",
-                    "player1_result": None,
-                    "player2_result": None
-                }
-
-            # 构建结果
-            match_result = {
-                "success": True,
-                "player1_move": player1_move,
-                "player2_move": player2_move,
-                "player1_result": result1.value,
-                "player2_result": result2.value,
-                "winner": None,
-                "is_draw": result1 == GameResult.DRAW
-            }
-
-            # 确定获胜者
-            if result1 == GameResult.WIN:
-                match_result["winner"] = "player1"
-            elif result2 == GameResult.WIN:
-                match_result["winner"] = "player2"
-
-            logger.info(f"比赛结果: {match_result}")
-            return match_result
-
-        except Exception as e:
-            logger.error(f"开始比赛时出错: {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "player1_result": None,
-                "player2_result": None
-            }
-
-    def generate_random_move(self) -> str:
-        """
-        生成随机动作（用于AI或测试）
+            state: 局面
+            cards: 队员座位号 -> 是否出成功票
 
         Returns:
-            str: 随机动作
+            int: 失败票数
         """
-        return random.choice(self.valid_moves)
+        self._expect_phase(state, Phase.QUEST)
+        if to_mask(cards) != state.team or len(cards) != state.team.bit_count():
+            raise AvalonError("任务票必须由且仅由全部队员提交")
+
+        fail_mask = to_mask(p for p, success in cards.items() if not success)
+        if fail_mask & ~state.evil_mask:
+            raise AvalonError("正义方玩家只能出成功票")
+
+        fails = fail_mask.bit_count()
+        quest_no = state.quest_no
+        if fails >= QUEST_FAILS_REQUIRED[quest_no]:
+            state.quests |= QUEST_FAIL << (2 * quest_no)
+            state.failures += 1
+        else:
+            state.quests |= QUEST_SUCCESS << (2 * quest_no)
+            state.successes += 1
+
+        state.team = 0
+        if state.failures >= QUESTS_TO_WIN:
+            self._finish(state, Side.EVIL)
+        elif state.successes >= QUESTS_TO_WIN:
+            state.phase = Phase.ASSASSINATION
+        else:
+            state.quest_no += 1
+            state.leader = (state.leader + 1) % NUM_PLAYERS
+            state.phase = Phase.TEAM_PROPOSAL
+        return fails
 
-    def get_move_name(self, move: str) -> str:
+    def assassinate(self, state: AvalonState, player: int, target: int) -> bool:
         """
-        获取动作的中文名称
+        正义方完成三个任务后，刺客指认梅林
 
         Args:
-            move: 动作值
+            state: 局面
+            player: 刺客座位号
+            target: 刺杀目标座位号
 
         Returns:
-            str: 中文名称
+            bool: 是否刺中梅林
         """
-        move_names = {
-            Move.ROCK.value: "石头",
-            Move.PAPER.value: "布",
-            Move.SCISSORS.value: "剪刀"
-        }
-        return move_names.get(move, "未知")
+        self._expect_phase(state, Phase.ASSASSINATION)
+        if not 0 <= player < NUM_PLAYERS or state.roles[player] != Role.ASSASSIN:
+            raise AvalonError(f"玩家{player}不是刺客")
+        if not 0 <= target < NUM_PLAYERS:
+            raise AvalonError(f"无效的刺杀目标: {target}")
+
+        state.assassin_target = target
+        hit = state.roles[target] == Role.MERLIN
+        self._finish(state, Side.EVIL if hit else Side.GOOD)
+        return hit
+
+    def known_players(self, state: AvalonState, player: int) -> int:
+        """
+        获取玩家在夜晚阶段看到的玩家位掩码
 
-    def get_result_description(self, result: GameResult) -> str:
+        - 梅林看到所有邪恶方
+        - 派西维尔看到梅林和莫甘娜（无法区分）
+        - 除奥伯伦外的邪恶方互相可见，但看不到奥伯伦
+        """
+        role = state.roles[player]
+        if role == Role.MERLIN:
+            return state.evil_mask
+        if role == Role.PERCIVAL:
+            return to_mask(
+                i for i, r in enumerate(state.roles) if r in (Role.MERLIN, Role.MORGANA)
+            )
+        if role in EVIL_ROLES and role != Role.OBERON:
+            oberon = 1 << state.seat_of(Role.OBERON)
+            return state.evil_mask & ~oberon & ~(1 << player)
+        return 0
+
+    def observation(self, state: AvalonState, player: int) -> Dict[str, Any]:
         """
-        获取结果的中文描述
+        生成发给AI代码的局面（只包含该玩家可见的信息）
 
         Args:
-            result: 游戏结果
+            state: 局面
+            player: 座位号
 
         Returns:
-            str: 中文描述
+            Dict: 可JSON序列化的局面字典
         """
-        result_descriptions = {
-            GameResult.WIN: "胜利",
-            GameResult.LOSS: "失败",
-            GameResult.DRAW: "平局",
-            GameResult.ERROR: "错误"
+        return {
+            "seat": player,
+            "role": Role(state.roles[player]).name.lower(),
+            "known_players": list(seats(self.known_players(state, player))),
+            "phase": Phase(state.phase).name.lower(),
+            "quest_no": state.quest_no,
+            "leader": state.leader,
+            "team_size": QUEST_TEAM_SIZES[state.quest_no],
+            "team": list(seats(state.team)),
+            "last_votes": list(seats(state.votes)),
+            "rejections": state.rejections,
+            "quest_results": [
+                state.quest_result(i) for i in range(len(QUEST_TEAM_SIZES))
+            ],
         }
-        return result_descriptions.get(result, "未知")
 
-    def log_match_summary(self, match_result: Dict[str, any]):
+    def outcomes(self, state: AvalonState) -> List[str]:
         """
-        记录比赛摘要
+        按座位号返回每名玩家的结果（win/loss）
 
-        Args:
-            match_result: 比赛结果
+        Raises:
+            AvalonError: 对局尚未结束时
         """
-        if not match_result.get("success"):
-            logger.warning(f"比赛失败: {match_result.get('error', '未知错误')}")
-            return
-
-        p1_move = self.get_move_name(match_result["player1_move"])
-        p2_move = self.get_move_name(match_result["player2_move"])
-        p1_result = self.get_result_description(
-            GameResult(match_result["player1_result"]))
-        p2_result = self.get_result_description(
-            GameResult(match_result["player2_result"]))
-
-        if match_result["is_draw"]:
-            logger.info(f"比赛结束: {p1_move} vs {p2_move} = 平局")
+        if state.winner == Side.NONE:
+            raise AvalonError("对局尚未结束")
+        evil_won = state.winner == Side.EVIL
+        return [
+            "win" if bool(state.evil_mask >> i & 1) == evil_won else "loss"
+            for i in range(NUM_PLAYERS)
+        ]
+
+    def get_role_name(self, role: int) -> str:
+        """获取身份的中文名称"""
+        return ROLE_NAMES.get(role, "未知")
+
+    def _expect_phase(self, state: AvalonState, phase: Phase) -> None:
+        if state.phase != phase:
+            raise AvalonError(
+                f"当前阶段为{Phase(state.phase).name}，无法执行{phase.name}动作"
+            )
+
+    def _finish(self, state: AvalonState, winner: Side) -> None:
+        state.winner = winner
+        state.phase = Phase.FINISHED
+
+
+def play_random_game(seed: int, referee: Optional[Referee] = None) -> AvalonState:
+    """
+    以随机策略模拟一局（用于测试与性能基准）
+
+    身份分配与各玩家的选择都由种子决定，同一种子得到相同的对局。
+    """
+    referee = referee or Referee()
+    state = referee.new_game(seed)
+    rng = random.Random(seed ^ 0x5A5A5A5A)
+    everyone = range(NUM_PLAYERS)
+
+    while state.phase != Phase.FINISHED:
+        if state.phase == Phase.TEAM_PROPOSAL:
+            team = rng.sample(everyone, QUEST_TEAM_SIZES[state.quest_no])
+            referee.propose_team(state, state.leader, team)
+        elif state.phase == Phase.TEAM_VOTE:
+            referee.vote(state, [rng.random() < 0.6 for _ in everyone])
+        elif state.phase == Phase.QUEST:
+            referee.play_quest(
+                state,
+                {
+                    p: not (state.evil_mask >> p & 1 and rng.random() < 0.5)
+                    for p in seats(state.team)
+                },
+            )
         else:
-            winner = "玩家1" if match_result["winner"] == "player1" else "玩家2"
-            logger.info(f"比赛结束: {p1_move} vs {p2_move} = {winner}获胜")
+            referee.assassinate(
+                state, state.seat_of(Role.ASSASSIN), rng.choice(everyone)
+            )
+    return state
+
+
+def benchmark_random_games(games: int = 10_000, seed: int = 0) -> Dict[str, float]:
+    """
+    测量随机策略下的对局模拟吞吐量
+
+    Args:
+        games: 对局数
+        seed: 起始种子
+
+    Returns:
+        Dict: 每秒对局数及双方胜率
+    """
+    referee = Referee()
+    evil_wins = 0
+    start = time.perf_counter()
+    for offset in range(games):
+        if play_random_game(seed + offset, referee).winner == Side.EVIL:
+            evil_wins += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "games": games,
+        "games_per_sec": games / elapsed,
+        "evil_win_rate": evil_wins / games,
+    }
+
+
+if __name__ == "__main__":
+    for name, value in benchmark_random_games().items():
+        print(f"{name}: {value:,.3f}")
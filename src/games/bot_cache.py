@@ -0,0 +1,361 @@
+"""
+Compiled Bot Cache - AI代码编译缓存
+
+按文件内容的SHA-256缓存：
+- Python源码编译后的字节码（marshal格式）
+- .zip 压缩包解压后的目录
+
+热门AI代码重复对局时无需再次读取、编译或解压。
+缓存位于本地磁盘，超过容量预算时按最近使用时间（LRU）淘汰；
+正在被工作进程池使用（持有 CacheLease）的解压目录不会被淘汰。
+"""
+
+import hashlib
+import importlib.util
+import logging
+import marshal
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from pathlib import Path
+from types import CodeType
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows：仅在进程内计数
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BOT_CACHE_DIR = "cache/bots"
+BOT_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 512MB
+ARCHIVE_ENTRY_FILE = "main.py"  # 压缩包中的入口文件
+MAX_ARCHIVE_ENTRIES = 1000
+MAX_ARCHIVE_UNPACKED_BYTES = 100 * 1024 * 1024  # 解压后总大小上限
+MAX_COMPRESSION_RATIO = 100  # 单个成员的压缩比上限，防止压缩炸弹
+
+# 字节码与解释器版本绑定，键中包含magic number避免跨版本误用
+_BYTECODE_TAG = importlib.util.MAGIC_NUMBER.hex()
+
+
+class BotCacheError(Exception):
+    """AI代码缓存处理失败"""
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """分块计算文件的SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _is_sha256(value: Optional[str]) -> bool:
+    if not value or len(value) != 64:
+        return False
+    try:
+        int(value, 16)
+    except ValueError:
+        return False
+    return True
+
+
+def check_archive_members(infos: List[zipfile.ZipInfo]) -> List[str]:
+    """
+    在解压前校验压缩包成员
+
+    成员数、解压后总大小、单个成员的压缩比和路径都在这里检查。
+    解压时 zipfile 按声明的大小截断输出，因此声明值可以作为上限使用。
+
+    Args:
+        infos: 压缩包成员（不含目录）
+
+    Returns:
+        List[str]: 错误列表，为空表示通过
+    """
+    if len(infos) > MAX_ARCHIVE_ENTRIES:
+        return [f"压缩包文件数超过 {MAX_ARCHIVE_ENTRIES}"]
+    if sum(info.file_size for info in infos) > MAX_ARCHIVE_UNPACKED_BYTES:
+        return ["压缩包解压后大小超过限制"]
+
+    errors = []
+    for info in infos:
+        name = info.filename.replace("\\", "/")
+        if name.startswith("/") or ".." in name.split("/") or ":" in name:
+            errors.append(f"压缩包包含非法路径: {info.filename}")
+        elif info.file_size > MAX_COMPRESSION_RATIO * max(info.compress_size, 1):
+            errors.append(f"压缩比异常: {info.filename}")
+    return errors
+
+
+def extract_archive_members(
+    archive: zipfile.ZipFile, infos: List[zipfile.ZipInfo], target: Path
+) -> None:
+    """
+    把已通过 check_archive_members 校验的成员解压到 target
+
+    先解压到同级的临时目录再整体改名，其他进程已完成同一内容的解压时直接复用。
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{target.name}.", dir=target.parent))
+    try:
+        archive.extractall(staging, members=infos)
+        os.rename(staging, target)
+    except OSError:
+        if not target.is_dir():
+            raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def _entry_size(path: Path) -> int:
+    if path.is_dir():
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, files in os.walk(path)
+            for name in files
+        )
+    return path.stat().st_size
+
+
+class CacheLease:
+    """
+    解压目录的使用凭证
+
+    持有期间淘汰会跳过该目录：进程内用引用计数，
+    跨进程（如模拟任务的进程池）用锁文件上的共享 flock。
+    """
+
+    def __init__(self, cache: "CompiledBotCache", name: str):
+        self.cache = cache
+        self.name = name
+        self._fd: Optional[int] = None
+        with cache._lock:
+            cache._leases[name] = cache._leases.get(name, 0) + 1
+        if fcntl is not None:
+            cache._ensure_dir()
+            self._fd = os.open(cache._lock_path(name), os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_SH)
+
+    def release(self) -> None:
+        """归还凭证，可重复调用"""
+        if self.name is None:
+            return
+        with self.cache._lock:
+            count = self.cache._leases.get(self.name, 0) - 1
+            if count > 0:
+                self.cache._leases[self.name] = count
+            else:
+                self.cache._leases.pop(self.name, None)
+        if self._fd is not None:
+            os.close(self._fd)  # 关闭即释放flock
+            self._fd = None
+        self.name = None
+
+
+class CompiledBotCache:
+    """基于内容哈希的AI代码编译缓存"""
+
+    def __init__(
+        self, cache_dir: str = BOT_CACHE_DIR, max_bytes: int = BOT_CACHE_MAX_BYTES
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._leases: Dict[str, int] = {}
+
+    def _lock_path(self, name: str) -> Path:
+        return self.cache_dir / f".{name}.lock"
+
+    def _ensure_dir(self) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def resolve_hash(self, file_path: str, file_hash: Optional[str] = None) -> str:
+        """
+        获取文件内容哈希
+
+        数据库中的哈希是SHA-256时直接使用，否则（如旧数据）重新计算。
+        """
+        if _is_sha256(file_hash):
+            return file_hash.lower()
+        return file_sha256(file_path)
+
+    def lease(
+        self, file_path: str, file_hash: Optional[str] = None
+    ) -> Optional[CacheLease]:
+        """
+        在使用压缩包AI代码前获取其解压目录的使用凭证
+
+        应在 load_bot 之前获取，避免解压完成到开始使用之间被淘汰。
+
+        Returns:
+            Optional[CacheLease]: 凭证；源码文件不需要凭证，返回None
+        """
+        if not file_path.lower().endswith(".zip"):
+            return None
+        return CacheLease(self, self.resolve_hash(file_path, file_hash))
+
+    def load_code(self, file_path: str, file_hash: Optional[str] = None) -> CodeType:
+        """
+        获取Python源码编译后的字节码
+
+        Args:
+            file_path: 源码文件路径
+            file_hash: 已知的内容SHA-256（可选）
+
+        Returns:
+            CodeType: 编译后的代码对象
+        """
+        digest = self.resolve_hash(file_path, file_hash)
+        entry = self.cache_dir / f"{digest}.{_BYTECODE_TAG}.bin"
+
+        try:
+            data = entry.read_bytes()
+            code = marshal.loads(data)
+            self._touch(entry)
+            self.hits += 1
+            return code
+        except FileNotFoundError:
+            pass
+        except (EOFError, ValueError, TypeError):
+            logger.warning("AI代码字节码缓存已损坏，重新编译: %s", entry)
+
+        self.misses += 1
+        source = Path(file_path).read_bytes()
+        try:
+            code = compile(source, file_path, "exec", dont_inherit=True)
+        except SyntaxError as e:
+            raise BotCacheError(f"AI代码语法错误: {e}") from e
+
+        self._write_atomic(entry, marshal.dumps(code))
+        self._evict()
+        return code
+
+    def extract_archive(self, file_path: str, file_hash: Optional[str] = None) -> Path:
+        """
+        获取.zip压缩包解压后的目录
+
+        Args:
+            file_path: 压缩包路径
+            file_hash: 已知的内容SHA-256（可选）
+
+        Returns:
+            Path: 解压目录
+        """
+        digest = self.resolve_hash(file_path, file_hash)
+        target = self.cache_dir / digest
+
+        if target.is_dir():
+            self._touch(target)
+            self.hits += 1
+            return target
+
+        self.misses += 1
+        self._safe_extract(file_path, target)
+        self._evict()
+        return target
+
+    def load_bot(
+        self, file_path: str, file_hash: Optional[str] = None
+    ) -> Tuple[CodeType, Optional[str]]:
+        """
+        获取AI代码入口的字节码
+
+        Returns:
+            Tuple[CodeType, Optional[str]]: (代码对象, 需加入sys.path的目录)
+        """
+        if file_path.lower().endswith(".zip"):
+            root = self.extract_archive(file_path, file_hash)
+            entry_file = root / ARCHIVE_ENTRY_FILE
+            if not entry_file.is_file():
+                raise BotCacheError(f"压缩包中缺少入口文件: {ARCHIVE_ENTRY_FILE}")
+            return self.load_code(str(entry_file)), str(root)
+        return self.load_code(file_path, file_hash), None
+
+    def _safe_extract(self, file_path: str, target: Path) -> None:
+        """校验成员后解压zip（与上传检查共用同一套限制）"""
+        try:
+            with zipfile.ZipFile(file_path) as archive:
+                infos = [info for info in archive.infolist() if not info.is_dir()]
+                errors = check_archive_members(infos)
+                if errors:
+                    raise BotCacheError("; ".join(errors))
+                extract_archive_members(archive, infos, target)
+        except zipfile.BadZipFile as e:
+            raise BotCacheError(f"无效的压缩包: {e}") from e
+
+    def _write_atomic(self, entry: Path, data: bytes) -> None:
+        self._ensure_dir()
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, entry)
+        except Exception:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+    def _touch(self, entry: Path) -> None:
+        """更新访问时间（以mtime记录LRU顺序）"""
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        """超出容量预算时淘汰最久未使用的条目"""
+        with self._lock:
+            entries = []
+            total = 0
+            with os.scandir(self.cache_dir) as it:
+                for item in it:
+                    if item.name.startswith("."):
+                        continue
+                    path = Path(item.path)
+                    size = _entry_size(path)
+                    entries.append((item.stat().st_mtime, size, path))
+                    total += size
+
+            if total <= self.max_bytes:
+                return
+
+            entries.sort(key=lambda e: e[0])
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if path.is_dir():
+                    if not self._remove_unleased_dir(path):
+                        continue
+                else:
+                    path.unlink(missing_ok=True)
+                total -= size
+                logger.info("淘汰AI代码缓存: %s", path.name)
+
+    def _remove_unleased_dir(self, path: Path) -> bool:
+        """删除没有任何凭证的解压目录，调用方需持有 self._lock"""
+        if self._leases.get(path.name):
+            return False
+        if fcntl is None:
+            shutil.rmtree(path, ignore_errors=True)
+            return True
+
+        fd = os.open(self._lock_path(path.name), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False  # 其他进程正在使用
+            shutil.rmtree(path, ignore_errors=True)
+            return True
+        finally:
+            os.close(fd)
+
+
+# 全局实例
+bot_cache = CompiledBotCache()
@@ -0,0 +1,308 @@
+"""
+Replay Log - 对战回放日志的紧凑二进制格式
+
+文件结构：
+- 文件头: MAGIC(4) + 版本(1) + 压缩方式(1)
+- 数据块: 若干条记录拼接后整体压缩；每块只包含完整的回合
+- 索引: 每个数据块的 (起始回合, 偏移, 压缩长度, 记录数)，均为varint
+- 文件尾: 索引偏移(8字节小端) + INDEX_MAGIC(4)
+
+记录格式（varint编码，带长度前缀）：
+    len | round | player | move_ref [| move_len | move_bytes]
+
+动作以规范化JSON序列化后在块内驻留：首次出现时 move_ref=0 并跟随字面值，
+之后以 (编号+1) 引用。每块独立解码，读取任意回合区间时只需解压相关的块。
+"""
+
+import bisect
+import json
+import logging
+import os
+import struct
+import uuid
+import zlib
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # 未安装zstandard时退化为zlib
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+GAME_LOGS_DIR = "game_logs"
+GAME_LOG_SUFFIX = ".glog"
+
+MAGIC = b"LAGL"
+INDEX_MAGIC = b"LAGI"
+FORMAT_VERSION = 1
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+DEFAULT_BLOCK_RECORDS = 4096
+
+_HEADER_SIZE = len(MAGIC) + 2
+_TRAILER = struct.Struct("<Q4s")
+
+
+class ReplayLogError(Exception):
+    """回放日志格式错误"""
+
+
+def encode_varint(value: int, out: bytearray) -> None:
+    """无符号LEB128编码"""
+    if value < 0:
+        raise ValueError("varint只支持非负整数")
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """解码varint，返回 (值, 新位置)"""
+    result = shift = 0
+    while True:
+        if pos >= len(data):
+            raise ReplayLogError("varint数据被截断")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _compress(data: bytes, compression: int) -> bytes:
+    if compression == COMPRESSION_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 6)
+
+
+def _decompress(data: bytes, compression: int) -> bytes:
+    if compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise ReplayLogError("读取该回放需要安装 zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(data)
+    raise ReplayLogError(f"未知的压缩方式: {compression}")
+
+
+def game_log_path(game_log_uuid: str, base_dir: str = GAME_LOGS_DIR) -> Path:
+    """根据日志UUID得到存储路径（按前两位分目录）"""
+    name = uuid.UUID(game_log_uuid).hex
+    return Path(base_dir) / name[:2] / f"{name}{GAME_LOG_SUFFIX}"
+
+
+class ReplayLogWriter:
+    """回放日志写入器
+
+    写入临时文件，close() 时写入索引并原子重命名，未完成的日志不会被读到。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        block_records: int = DEFAULT_BLOCK_RECORDS,
+        compression: Optional[int] = None,
+    ):
+        self.path = Path(path)
+        self.block_records = block_records
+        if compression is None:
+            compression = COMPRESSION_ZSTD if zstandard is not None else COMPRESSION_ZLIB
+        self.compression = compression
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        self._file: Optional[BinaryIO] = open(self._tmp_path, "wb")
+        self._file.write(MAGIC + bytes([FORMAT_VERSION, self.compression]))
+
+        self._index: List[Tuple[int, int, int, int]] = []
+        self._block = bytearray()
+        self._block_first_round: Optional[int] = None
+        self._block_count = 0
+        self._symbols: dict = {}
+        self._last_round: Optional[int] = None
+        self.records = 0
+
+    def append(self, round_no: int, player: int, move: Any) -> None:
+        """
+        追加一条动作记录
+
+        Args:
+            round_no: 回合号（非负且不递减）
+            player: 玩家位置
+            move: 动作（可JSON序列化）
+        """
+        if self._file is None:
+            raise ReplayLogError("回放日志已关闭")
+        if self._last_round is not None and round_no < self._last_round:
+            raise ReplayLogError("回合号必须不递减")
+
+        # 只在回合边界切块，保证每个回合完整位于同一块中
+        if (
+            self._block_count >= self.block_records
+            and round_no != self._last_round
+        ):
+            self._flush_block()
+
+        if self._block_first_round is None:
+            self._block_first_round = round_no
+        self._last_round = round_no
+
+        record = bytearray()
+        encode_varint(round_no, record)
+        encode_varint(player, record)
+        literal = json.dumps(move, separators=(",", ":"), sort_keys=True).encode()
+        ref = self._symbols.get(literal)
+        if ref is None:
+            self._symbols[literal] = len(self._symbols)
+            encode_varint(0, record)
+            encode_varint(len(literal), record)
+            record += literal
+        else:
+            encode_varint(ref + 1, record)
+
+        encode_varint(len(record), self._block)
+        self._block += record
+        self._block_count += 1
+        self.records += 1
+
+    def _flush_block(self) -> None:
+        if not self._block_count:
+            return
+        compressed = _compress(bytes(self._block), self.compression)
+        offset = self._file.tell()
+        self._file.write(compressed)
+        self._index.append(
+            (self._block_first_round, offset, len(compressed), self._block_count)
+        )
+        self._block = bytearray()
+        self._block_first_round = None
+        self._block_count = 0
+        self._symbols = {}
+
+    def close(self) -> None:
+        """写入索引并完成文件"""
+        if self._file is None:
+            return
+        self._flush_block()
+        index = bytearray()
+        encode_varint(len(self._index), index)
+        for entry in self._index:
+            for value in entry:
+                encode_varint(value, index)
+        index_offset = self._file.tell()
+        self._file.write(index)
+        self._file.write(_TRAILER.pack(index_offset, INDEX_MAGIC))
+        self._file.close()
+        self._file = None
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        """放弃写入并删除临时文件"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._tmp_path.unlink(missing_ok=True)
+
+    def __enter__(self) -> "ReplayLogWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class ReplayLogReader:
+    """回放日志读取器，按索引只解压请求的回合区间所在的块"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            header = f.read(_HEADER_SIZE)
+            if len(header) != _HEADER_SIZE or header[: len(MAGIC)] != MAGIC:
+                raise ReplayLogError("不是有效的回放日志")
+            if header[len(MAGIC)] != FORMAT_VERSION:
+                raise ReplayLogError(f"不支持的回放日志版本: {header[len(MAGIC)]}")
+            self.compression = header[len(MAGIC) + 1]
+
+            f.seek(-_TRAILER.size, os.SEEK_END)
+            index_offset, index_magic = _TRAILER.unpack(f.read(_TRAILER.size))
+            if index_magic != INDEX_MAGIC:
+                raise ReplayLogError("回放日志索引缺失")
+            f.seek(index_offset)
+            index_data = f.read()[: -_TRAILER.size]
+
+        count, pos = decode_varint(index_data, 0)
+        self.blocks: List[Tuple[int, int, int, int]] = []
+        for _ in range(count):
+            entry = []
+            for _ in range(4):
+                value, pos = decode_varint(index_data, pos)
+                entry.append(value)
+            self.blocks.append(tuple(entry))
+        self._first_rounds = [block[0] for block in self.blocks]
+
+    @property
+    def total_records(self) -> int:
+        return sum(block[3] for block in self.blocks)
+
+    def read_rounds(
+        self, start_round: int = 0, end_round: Optional[int] = None
+    ) -> Iterator[Tuple[int, int, Any]]:
+        """
+        读取回合区间内的记录
+
+        Args:
+            start_round: 起始回合（包含）
+            end_round: 结束回合（包含），为空表示到结尾
+
+        Yields:
+            Tuple[int, int, Any]: (回合, 玩家, 动作)
+        """
+        first_block = max(bisect.bisect_right(self._first_rounds, start_round) - 1, 0)
+        with open(self.path, "rb") as f:
+            for first_round, offset, length, _ in self.blocks[first_block:]:
+                if end_round is not None and first_round > end_round:
+                    return
+                f.seek(offset)
+                data = _decompress(f.read(length), self.compression)
+                for record in self._decode_block(data):
+                    round_no = record[0]
+                    if round_no < start_round:
+                        continue
+                    if end_round is not None and round_no > end_round:
+                        return
+                    yield record
+
+    @staticmethod
+    def _decode_block(data: bytes) -> Iterator[Tuple[int, int, Any]]:
+        symbols: List[Any] = []
+        pos = 0
+        while pos < len(data):
+            length, pos = decode_varint(data, pos)
+            end = pos + length
+            round_no, pos = decode_varint(data, pos)
+            player, pos = decode_varint(data, pos)
+            ref, pos = decode_varint(data, pos)
+            if ref == 0:
+                literal_len, pos = decode_varint(data, pos)
+                move = json.loads(data[pos : pos + literal_len])
+                symbols.append(move)
+            else:
+                move = symbols[ref - 1]
+            pos = end
+            yield round_no, player, move
+
+
+def open_game_log(
+    base_dir: str = GAME_LOGS_DIR, **kwargs
+) -> Tuple[str, ReplayLogWriter]:
+    """创建一个新的回放日志，返回 (日志UUID, 写入器)"""
+    game_log_uuid = str(uuid.uuid4())
+    writer = ReplayLogWriter(str(game_log_path(game_log_uuid, base_dir)), **kwargs)
+    return game_log_uuid, writer
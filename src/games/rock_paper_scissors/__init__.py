@@ -4,12 +4,18 @@ Rock Paper Scissors Game Package - 石头剪刀布游戏包
 实现石头剪刀布游戏的核心逻辑
 """
 
+import json
+from pathlib import Path
+
 from .referee import Referee
 
-# 游戏元数据
-GAME_NAME = "石头剪刀布"
-GAME_VERSION = "1.0.0"
-GAME_DESCRIPTION = "经典的石头剪刀布游戏，支持AI对战和玩家对战"
+# 游戏元数据（与注册表共用 manifest.json）
+_MANIFEST = json.loads(
+    Path(__file__).with_name("manifest.json").read_text(encoding="utf-8")
+)
+GAME_NAME = _MANIFEST["name"]
+GAME_VERSION = _MANIFEST["version"]
+GAME_DESCRIPTION = _MANIFEST["description"]
 
 __all__ = [
     "Referee",
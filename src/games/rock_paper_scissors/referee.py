@@ -9,9 +9,12 @@ Rock Paper Scissors Game Referee - 石头剪刀布游戏裁判
 
 import logging
 import random
-from typing import Dict, List, Tuple, Optional
+import time
+from typing import Dict, List, Tuple, Optional, Sequence, Union
 from enum import Enum
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
 
@@ -22,6 +25,23 @@ class Move(Enum):
     SCISSORS = "scissors"
 
 
+# 动作的整数编码：按 石头 < 布 < 剪刀 的循环顺序排列，
+# 使得 (move1 - move2) % 3 == 1 表示玩家1获胜，== 2 表示玩家2获胜
+MOVE_CODES: Dict[str, int] = {
+    Move.ROCK.value: 0,
+    Move.PAPER.value: 1,
+    Move.SCISSORS.value: 2,
+}
+
+# 批量判定的结果编码
+OUTCOME_WIN = 1
+OUTCOME_DRAW = 0
+OUTCOME_LOSS = -1
+
+# 以 (move1 - move2) % 3 为下标查表得到玩家1的结果
+_OUTCOME_TABLE = np.array([OUTCOME_DRAW, OUTCOME_WIN, OUTCOME_LOSS], dtype=np.int8)
+
+
 class GameResult(Enum):
     """游戏结果枚举"""
     WIN = "win"
@@ -36,6 +56,7 @@ class Referee:
     def __init__(self):
         """初始化裁判"""
         self.valid_moves = [move.value for move in Move]
+        self._valid_move_set = frozenset(self.valid_moves)
         self.win_conditions = {
             Move.ROCK.value: Move.SCISSORS.value,      # 石头胜剪刀
             Move.PAPER.value: Move.ROCK.value,         # 布胜石头
@@ -47,12 +68,12 @@ class Referee:
         验证玩家动作是否有效
 
         Args:
-            move: 玩家动作
+            move: 玩家动作（AI代码可能返回任意类型，如不可哈希的列表）
 
         Returns:
             bool: 是否有效
         """
-        return move in self.valid_moves
+        return isinstance(move, str) and move in self._valid_move_set
 
     def determine_winner(self, move1: str, move2: str) -> Tuple[GameResult, GameResult]:
         """
@@ -99,7 +120,7 @@ class Referee:
             Dict: 比赛结果
         """
         try:
-            logger.info(f"开始比赛: {player1_move} vs {player2_move}")
+            logger.info("开始比赛: %s vs %s", player1_move, player2_move)
 
             # 判定胜负
             result1, result2 = self.determine_winner(
@@ -130,7 +151,7 @@ class Referee:
             elif result2 == GameResult.WIN:
                 match_result["winner"] = "player2"
 
-            logger.info(f"比赛结果: {match_result}")
+            logger.info("比赛结果: %s", match_result)
             return match_result
 
         except Exception as e:
@@ -142,6 +163,74 @@ class Referee:
                 "player2_result": None
             }
 
+    def encode_moves(self, moves: Union[Sequence[str], np.ndarray]) -> np.ndarray:
+        """
+        将动作序列编码为整数数组（每个动作只编码一次）
+
+        Args:
+            moves: 字符串动作序列，或已编码的整数数组
+
+        Returns:
+            np.ndarray: int8 编码数组（0=石头, 1=布, 2=剪刀）
+
+        Raises:
+            ValueError: 存在无效动作时
+        """
+        if isinstance(moves, np.ndarray) and moves.dtype.kind in "iu":
+            # 先检查范围再转换，否则 256 等编码在转为 int8 时会回绕成合法值
+            if moves.size and (moves.min() < 0 or moves.max() > 2):
+                raise ValueError("动作编码必须在 0-2 之间")
+            return moves.astype(np.int8, copy=False)
+
+        try:
+            return np.fromiter(
+                (MOVE_CODES[move] for move in moves), dtype=np.int8, count=len(moves)
+            )
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"无效的动作: {e.args[0]}") from e
+
+    def judge_batch(
+        self,
+        moves1: Union[Sequence[str], np.ndarray],
+        moves2: Union[Sequence[str], np.ndarray],
+    ) -> Dict[str, any]:
+        """
+        批量判定多回合胜负（向量化，一次遍历完成）
+
+        Args:
+            moves1: 玩家1的动作序列（字符串或整数编码）
+            moves2: 玩家2的动作序列（字符串或整数编码）
+
+        Returns:
+            Dict: 包含每回合结果数组及胜/负/平汇总
+                - player1_outcomes / player2_outcomes: int8 数组（1=胜, 0=平, -1=负）
+                - player1_wins / player2_wins / draws: 汇总计数
+                - rounds: 回合数
+
+        Raises:
+            ValueError: 动作无效或两个序列长度不一致时
+        """
+        codes1 = self.encode_moves(moves1)
+        codes2 = self.encode_moves(moves2)
+        if codes1.shape != codes2.shape:
+            raise ValueError(
+                f"动作序列长度不一致: {codes1.shape} vs {codes2.shape}"
+            )
+
+        # int16 避免 int8 相减溢出，取模后查表
+        diff = (codes1.astype(np.int16) - codes2) % 3
+        player1_outcomes = _OUTCOME_TABLE[diff]
+        counts = np.bincount(diff.ravel(), minlength=3)
+
+        return {
+            "player1_outcomes": player1_outcomes,
+            "player2_outcomes": -player1_outcomes,
+            "player1_wins": int(counts[1]),
+            "player2_wins": int(counts[2]),
+            "draws": int(counts[0]),
+            "rounds": int(codes1.size),
+        }
+
     def generate_random_move(self) -> str:
         """
         生成随机动作（用于AI或测试）
@@ -209,3 +298,45 @@ class Referee:
         else:
             winner = "玩家1" if match_result["winner"] == "player1" else "玩家2"
             logger.info(f"比赛结束: {p1_move} vs {p2_move} = {winner}获胜")
+
+
+def benchmark_judge_batch(rounds: int = 1_000_000, seed: int = 0) -> Dict[str, float]:
+    """
+    对比逐回合判定与批量判定的吞吐量
+
+    Args:
+        rounds: 回合数
+        seed: 随机种子
+
+    Returns:
+        Dict: 两种方式的每秒回合数及加速比
+    """
+    referee = Referee()
+    rng = np.random.default_rng(seed)
+    codes1 = rng.integers(0, 3, size=rounds, dtype=np.int8)
+    codes2 = rng.integers(0, 3, size=rounds, dtype=np.int8)
+    moves1 = [referee.valid_moves[c] for c in codes1]
+    moves2 = [referee.valid_moves[c] for c in codes2]
+
+    start = time.perf_counter()
+    for move1, move2 in zip(moves1, moves2):
+        referee.determine_winner(move1, move2)
+    per_call_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    referee.judge_batch(codes1, codes2)
+    batch_seconds = time.perf_counter() - start
+
+    per_call_rate = rounds / per_call_seconds
+    batch_rate = rounds / batch_seconds
+    return {
+        "rounds": rounds,
+        "per_call_rounds_per_sec": per_call_rate,
+        "batch_rounds_per_sec": batch_rate,
+        "speedup": batch_rate / per_call_rate,
+    }
+
+
+if __name__ == "__main__":
+    for name, value in benchmark_judge_batch().items():
+        print(f"{name}: {value:,.0f}")
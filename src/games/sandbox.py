@@ -0,0 +1,558 @@
+"""
+Bot Sandbox - AI代码沙箱执行引擎
+
+负责：
+- 将AI代码文件加载到预先创建的工作进程池中
+- 对工作进程施加资源限制（CPU时间、内存、禁止网络）
+- 逐步请求动作并进行超时控制
+- 统计吞吐量等运行指标
+
+工作进程在多回合之间保持常驻，解释器启动和导入开销每个机器人只付出一次。
+
+AI代码约定：模块中需定义入口函数（默认 ``get_move``），
+接收一个可序列化的局面字典，返回动作。
+"""
+
+import hashlib
+import json
+import logging
+import marshal
+import multiprocessing
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .bot_cache import BotCacheError, CacheLease, CompiledBotCache, bot_cache
+from .replay_log import ReplayLogWriter
+from .sandbox_worker import (
+    _MSG_ERROR,
+    _MSG_OK,
+    _MSG_READY,
+    _MSG_SEED,
+    _MSG_STOP,
+    MAX_MESSAGE_BYTES,
+    _seed_process,
+)
+
+logger = logging.getLogger(__name__)
+
+# 工作进程入口脚本，以独立的解释器运行
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_worker.py")
+
+
+@dataclass(frozen=True)
+class SandboxLimits:
+    """沙箱资源限制"""
+
+    cpu_seconds: int = 30  # 单个工作进程累计CPU时间上限
+    memory_bytes: int = 256 * 1024 * 1024  # 地址空间上限
+    move_timeout: float = 1.0  # 单步动作超时（秒）
+    startup_timeout: float = 10.0  # 加载AI代码超时（秒）
+    allow_network: bool = False  # 为False时无法进入独立网络命名空间则拒绝启动
+
+
+@dataclass
+class MoveResult:
+    """单步动作结果"""
+
+    success: bool
+    move: Any = None
+    error: Optional[str] = None
+    timed_out: bool = False
+    elapsed: float = 0.0
+
+
+@dataclass
+class PoolMetrics:
+    """工作进程池运行指标"""
+
+    moves: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    restarts: int = 0
+    busy_seconds: float = 0.0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    def to_dict(self) -> Dict[str, float]:
+        wall_seconds = time.perf_counter() - self.started_at
+        return {
+            "moves": self.moves,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "restarts": self.restarts,
+            "avg_move_ms": (self.busy_seconds / self.moves * 1000) if self.moves else 0.0,
+            "moves_per_sec": self.moves / wall_seconds if wall_seconds > 0 else 0.0,
+        }
+
+
+class BotLoadError(Exception):
+    """AI代码加载失败"""
+
+
+class _ProtocolError(Exception):
+    """工作进程发回的消息不合法"""
+
+
+def _receive(conn: Connection) -> Tuple[str, Any]:
+    """
+    父进程读取工作进程的消息
+
+    工作进程运行不可信代码，只按JSON解析且限制长度；
+    pickle 反序列化会执行对方构造的任意对象。
+    """
+    try:
+        status, payload = json.loads(conn.recv_bytes(maxlength=MAX_MESSAGE_BYTES))
+    except (ValueError, TypeError) as e:
+        raise _ProtocolError("工作进程返回的消息格式无效") from e
+    if status not in (_MSG_READY, _MSG_OK, _MSG_ERROR):
+        raise _ProtocolError(f"未知的消息类型: {status!r}")
+    if status == _MSG_ERROR and not isinstance(payload, str):
+        raise _ProtocolError("工作进程返回的错误信息无效")
+    return status, payload
+
+
+def derive_seed(seed: int, position: int) -> int:
+    """由对局种子和座位号派生各AI代码进程的随机种子（跨进程稳定，不受哈希随机化影响）"""
+    digest = hashlib.sha256(f"{seed}/{position}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def compile_bot(
+    file_path: str,
+    file_hash: Optional[str] = None,
+    cache: CompiledBotCache = bot_cache,
+) -> Tuple[bytes, Optional[str]]:
+    """
+    通过编译缓存获取AI代码字节码
+
+    Returns:
+        Tuple[bytes, Optional[str]]: (marshal后的字节码, 需加入sys.path的目录)
+    """
+    try:
+        code, search_path = cache.load_bot(file_path, file_hash)
+    except (BotCacheError, OSError) as e:
+        raise BotLoadError(str(e)) from e
+    return marshal.dumps(code), search_path
+
+
+class BotWorker:
+    """常驻的AI代码工作进程"""
+
+    def __init__(
+        self,
+        file_path: str,
+        entry_point: str = "get_move",
+        limits: SandboxLimits = SandboxLimits(),
+        compiled: Optional[Tuple[bytes, Optional[str]]] = None,
+    ):
+        self.file_path = file_path
+        self.entry_point = entry_point
+        self.limits = limits
+        self.compiled = compiled
+        self._process = None
+        self._conn: Optional[Connection] = None
+
+    @property
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def start(self) -> None:
+        """启动工作进程并等待AI代码加载完成"""
+        if self.compiled is None:
+            self.compiled = compile_bot(self.file_path)
+
+        parent_conn, child_conn = multiprocessing.Pipe()
+        try:
+            # 以隔离模式启动全新的解释器：空环境变量，只传入管道的文件描述符，
+            # 父进程的数据库/Redis连接和已加载的配置都不会进入工作进程
+            self._process = subprocess.Popen(
+                [sys.executable, "-I", WORKER_SCRIPT, str(child_conn.fileno())],
+                pass_fds=(child_conn.fileno(),),
+                env={},
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except OSError as e:
+            parent_conn.close()
+            raise BotLoadError(f"无法启动AI代码进程: {e}") from e
+        finally:
+            child_conn.close()
+        self._conn = parent_conn
+
+        code_bytes, search_path = self.compiled
+        limits = {
+            "cpu_seconds": self.limits.cpu_seconds,
+            "memory_bytes": self.limits.memory_bytes,
+            "allow_network": self.limits.allow_network,
+        }
+        try:
+            parent_conn.send((self.file_path, self.entry_point, limits, code_bytes, search_path))
+        except OSError as e:
+            self.kill()
+            raise BotLoadError(f"AI代码进程异常退出: {self.file_path}") from e
+
+        if not parent_conn.poll(self.limits.startup_timeout):
+            self.kill()
+            raise BotLoadError(f"AI代码加载超时: {self.file_path}")
+        try:
+            status, detail = _receive(parent_conn)
+        except (EOFError, OSError, _ProtocolError) as e:
+            self.kill()
+            raise BotLoadError(f"AI代码进程异常退出: {self.file_path}") from e
+        if status != _MSG_READY:
+            self.kill()
+            raise BotLoadError(detail)
+
+    def request_move(self, state: Any, timeout: Optional[float] = None) -> MoveResult:
+        """
+        请求一步动作
+
+        Args:
+            state: 局面数据（需可pickle）
+            timeout: 超时时间，默认使用 limits.move_timeout
+
+        Returns:
+            MoveResult: 动作结果（动作必须是字符串）；超时、进程崩溃或
+                返回非法消息时工作进程会被终止
+        """
+        if not self.is_alive or self._conn is None:
+            return MoveResult(success=False, error="工作进程未运行")
+
+        timeout = self.limits.move_timeout if timeout is None else timeout
+        start = time.perf_counter()
+        try:
+            self._conn.send(("move", state))
+            if not self._conn.poll(timeout):
+                self.kill()
+                return MoveResult(
+                    success=False,
+                    error="动作超时",
+                    timed_out=True,
+                    elapsed=time.perf_counter() - start,
+                )
+            status, payload = _receive(self._conn)
+        except (EOFError, OSError, BrokenPipeError, _ProtocolError) as e:
+            self.kill()
+            return MoveResult(
+                success=False,
+                error=str(e) if isinstance(e, _ProtocolError) else "工作进程异常退出",
+                elapsed=time.perf_counter() - start,
+            )
+
+        elapsed = time.perf_counter() - start
+        if status == _MSG_OK:
+            if not isinstance(payload, str):
+                return MoveResult(success=False, error="动作必须是字符串", elapsed=elapsed)
+            return MoveResult(success=True, move=payload, elapsed=elapsed)
+        return MoveResult(success=False, error=payload, elapsed=elapsed)
+
+    def seed(self, seed: int) -> bool:
+        """
+        重置工作进程中的随机数种子
+
+        Args:
+            seed: 随机种子
+
+        Returns:
+            bool: 是否成功；失败时工作进程已被终止
+        """
+        if not self.is_alive or self._conn is None:
+            return False
+        try:
+            self._conn.send((_MSG_SEED, seed))
+            if self._conn.poll(self.limits.move_timeout):
+                status, _ = _receive(self._conn)
+                if status == _MSG_OK:
+                    return True
+        except (EOFError, OSError, BrokenPipeError, _ProtocolError):
+            pass
+        self.kill()
+        return False
+
+    def stop(self) -> None:
+        """正常停止工作进程"""
+        if self.is_alive and self._conn is not None:
+            try:
+                self._conn.send((_MSG_STOP, None))
+            except (OSError, BrokenPipeError):
+                pass
+            try:
+                self._process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                pass
+        self.kill()
+
+    def kill(self) -> None:
+        """强制终止工作进程"""
+        if self.is_alive:
+            self._process.kill()
+            self._process.wait()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class BotWorkerPool:
+    """
+    单个AI代码的预创建工作进程池
+
+    每场对局通过 checkout() 独占一个常驻工作进程，
+    对局内的多回合复用同一进程，以保留AI代码自身的状态。
+    AI代码只在启动时经编译缓存解析一次，进程重启时直接复用字节码；
+    压缩包AI代码的解压目录在进程池关闭前不会被缓存淘汰。
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        size: int = 2,
+        entry_point: str = "get_move",
+        limits: SandboxLimits = SandboxLimits(),
+        file_hash: Optional[str] = None,
+        cache: CompiledBotCache = bot_cache,
+    ):
+        self.file_path = file_path
+        self.size = size
+        self.entry_point = entry_point
+        self.limits = limits
+        self.file_hash = file_hash
+        self.cache = cache
+        self._compiled: Optional[Tuple[bytes, Optional[str]]] = None
+        self._lease: Optional[CacheLease] = None
+        self.metrics = PoolMetrics()
+        self._workers: List[BotWorker] = []
+        self._idle: "queue.Queue[BotWorker]" = queue.Queue()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_ai_code(cls, ai_code, **kwargs) -> "BotWorkerPool":
+        """根据 AICode 记录创建工作进程池"""
+        if ai_code.get_file_extension() not in ("py", "zip"):
+            raise BotLoadError(f"暂不支持运行该类型的AI代码: {ai_code.file_name}")
+        return cls(ai_code.file_path, file_hash=ai_code.file_hash, **kwargs)
+
+    def start(self) -> "BotWorkerPool":
+        """预先启动全部工作进程"""
+        try:
+            self._lease = self.cache.lease(self.file_path, self.file_hash)
+        except OSError as e:
+            raise BotLoadError(str(e)) from e
+        try:
+            self._compiled = compile_bot(self.file_path, self.file_hash, self.cache)
+            for _ in range(self.size):
+                worker = self._spawn()
+                self._workers.append(worker)
+                self._idle.put(worker)
+        except BaseException:
+            self.close()
+            raise
+        logger.info("AI代码工作进程池已启动: %s (%d个进程)", self.file_path, self.size)
+        return self
+
+    def _spawn(self) -> BotWorker:
+        worker = BotWorker(
+            self.file_path, self.entry_point, self.limits, self._compiled
+        )
+        worker.start()
+        return worker
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None) -> Iterator["PooledWorker"]:
+        """借出一个工作进程，用完后归还；已失效的进程会被替换"""
+        worker = self._idle.get(timeout=timeout)
+        pooled = PooledWorker(self, worker)
+        try:
+            yield pooled
+        finally:
+            self._release(pooled.worker)
+
+    def _release(self, worker: BotWorker) -> None:
+        if not worker.is_alive:
+            with self._lock:
+                self.metrics.restarts += 1
+                if worker in self._workers:
+                    self._workers.remove(worker)
+            try:
+                worker = self._spawn()
+            except BotLoadError as e:
+                logger.error("AI代码工作进程重启失败: %s", e)
+                return
+            with self._lock:
+                self._workers.append(worker)
+        self._idle.put(worker)
+
+    def _record(self, result: MoveResult) -> None:
+        with self._lock:
+            self.metrics.moves += 1
+            self.metrics.busy_seconds += result.elapsed
+            if result.timed_out:
+                self.metrics.timeouts += 1
+            elif not result.success:
+                self.metrics.errors += 1
+
+    def close(self) -> None:
+        """停止全部工作进程"""
+        for worker in self._workers:
+            worker.stop()
+        self._workers.clear()
+        if self._lease is not None:
+            self._lease.release()
+            self._lease = None
+
+    def __enter__(self) -> "BotWorkerPool":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class PooledWorker:
+    """从进程池借出的工作进程，负责记录指标"""
+
+    def __init__(self, pool: BotWorkerPool, worker: BotWorker):
+        self.pool = pool
+        self.worker = worker
+
+    def request_move(self, state: Any, timeout: Optional[float] = None) -> MoveResult:
+        result = self.worker.request_move(state, timeout)
+        self.pool._record(result)
+        return result
+
+    def seed(self, seed: int) -> bool:
+        return self.worker.seed(seed)
+
+
+class BaselineBotPool:
+    """
+    内置基线AI（在当前进程中运行），接口与 BotWorkerPool 一致
+
+    用于在没有对手AI代码时评估强度，例如随机出拳的基线。
+    基线使用进程内的 random 模块，seed() 即 random.seed()。
+    """
+
+    def __init__(self, name: str):
+        if name not in BASELINE_BOTS:
+            raise BotLoadError(f"未知的基线AI: {name}")
+        self.name = name
+        self.metrics = PoolMetrics()
+        self._get_move = BASELINE_BOTS[name]()
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None) -> Iterator["BaselineBotPool"]:
+        yield self
+
+    def request_move(self, state: Any, timeout: Optional[float] = None) -> MoveResult:
+        self.metrics.moves += 1
+        return MoveResult(success=True, move=self._get_move(state))
+
+    def seed(self, seed: int) -> bool:
+        _seed_process(seed)
+        return True
+
+    def start(self) -> "BaselineBotPool":
+        return self
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "BaselineBotPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+def _random_rps_baseline():
+    from .rock_paper_scissors.referee import Referee
+
+    referee = Referee()
+    return lambda state: referee.generate_random_move()
+
+
+# 内置基线AI：名称 -> 返回 get_move(state) 函数的工厂
+BASELINE_BOTS = {
+    "random": _random_rps_baseline,
+    "rock": lambda: (lambda state: "rock"),
+}
+
+
+def play_rps_match(
+    pool1: BotWorkerPool,
+    pool2: BotWorkerPool,
+    rounds: int = 100,
+    log_writer: Optional[ReplayLogWriter] = None,
+    seed: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    使用两个AI代码进程池进行一场多回合石头剪刀布对局
+
+    超时、报错或无效动作的一方判负该回合；双方都无效时记为平局。
+    超时或崩溃的工作进程会被终止，该方本场剩余回合全部判负。
+
+    Args:
+        pool1: 玩家1的进程池
+        pool2: 玩家2的进程池
+        rounds: 回合数
+        log_writer: 回放日志写入器（可选），无效动作记为 None
+        seed: 对局种子（可选），开局前按座位派生种子重置双方进程的随机数
+
+    Returns:
+        Dict: 胜/负/平汇总及双方指标
+    """
+    from .rock_paper_scissors.referee import Referee
+
+    referee = Referee()
+    history1: List[Optional[str]] = []
+    history2: List[Optional[str]] = []
+    player1_wins = player2_wins = draws = 0
+    valid1: List[str] = []
+    valid2: List[str] = []
+
+    with pool1.checkout() as bot1, pool2.checkout() as bot2:
+        if seed is not None:
+            bot1.seed(derive_seed(seed, 0))
+            bot2.seed(derive_seed(seed, 1))
+        for round_no in range(rounds):
+            result1 = bot1.request_move(
+                {"round": round_no, "my_history": history1, "opponent_history": history2}
+            )
+            result2 = bot2.request_move(
+                {"round": round_no, "my_history": history2, "opponent_history": history1}
+            )
+            move1 = result1.move if result1.success and referee.validate_move(result1.move) else None
+            move2 = result2.move if result2.success and referee.validate_move(result2.move) else None
+            history1.append(move1)
+            history2.append(move2)
+            if log_writer is not None:
+                log_writer.append(round_no, 0, move1)
+                log_writer.append(round_no, 1, move2)
+
+            if move1 is not None and move2 is not None:
+                valid1.append(move1)
+                valid2.append(move2)
+            elif move1 is not None:
+                player1_wins += 1
+            elif move2 is not None:
+                player2_wins += 1
+            else:
+                draws += 1
+
+    judged = referee.judge_batch(valid1, valid2)
+    forfeits = rounds - judged["rounds"]
+    return {
+        "rounds": rounds,
+        "player1_wins": player1_wins + judged["player1_wins"],
+        "player2_wins": player2_wins + judged["player2_wins"],
+        "draws": draws + judged["draws"],
+        "forfeited_rounds": forfeits,
+        "player1_metrics": pool1.metrics.to_dict(),
+        "player2_metrics": pool2.metrics.to_dict(),
+    }
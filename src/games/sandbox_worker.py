@@ -0,0 +1,155 @@
+"""
+Bot Sandbox Worker - AI代码工作进程入口
+
+由 sandbox.BotWorker 以 ``python -I sandbox_worker.py <fd>`` 启动全新的解释器：
+不继承父进程已打开的文件描述符（数据库/Redis连接、监听端口）、
+已导入的模块（配置中的密钥）和环境变量，只通过 <fd> 对应的管道通信。
+
+本模块只能依赖标准库，不能导入项目中的任何模块。
+"""
+
+import ctypes
+import json
+import marshal
+import os
+import random
+import sys
+from multiprocessing.connection import Connection
+from types import ModuleType
+from typing import Any, Optional
+
+try:
+    import resource
+except ImportError:  # Windows 不支持 rlimit
+    resource = None
+
+# Linux unshare(2) 的命名空间标志
+_CLONE_NEWNET = 0x40000000
+_CLONE_NEWUSER = 0x10000000
+
+# 工作进程发回的单条消息上限；消息只能是JSON，父进程不会反序列化任何对象
+MAX_MESSAGE_BYTES = 64 * 1024
+
+_MSG_READY = "ready"
+_MSG_OK = "ok"
+_MSG_ERROR = "error"
+_MSG_STOP = "stop"
+_MSG_SEED = "seed"
+
+
+def _current_address_space() -> int:
+    """当前进程已占用的虚拟地址空间"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def _apply_limits(cpu_seconds: int, memory_bytes: int, allow_network: bool) -> None:
+    """在工作进程中施加资源限制"""
+    if resource is not None:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+        # 内存上限按"解释器已占用的地址空间 + 预算"计算
+        memory_limit = _current_address_space() + memory_bytes
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+    if not allow_network:
+        _isolate_network()
+
+
+def _isolate_network() -> None:
+    """
+    进入独立的空网络命名空间（只有未启用的回环接口）
+
+    替换 socket 模块可以被 ``import _socket`` 绕过，因此只依赖内核隔离：
+    先尝试直接 unshare（需要 CAP_SYS_ADMIN），再尝试借助非特权用户命名空间；
+    都失败时拒绝运行AI代码。
+    """
+    if not sys.platform.startswith("linux"):
+        raise PermissionError("当前平台无法隔离网络，需设置 allow_network=True")
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    for flags in (_CLONE_NEWNET, _CLONE_NEWUSER | _CLONE_NEWNET):
+        if libc.unshare(flags) == 0:
+            return
+    errno = ctypes.get_errno()
+    raise PermissionError(f"无法进入独立的网络命名空间: {os.strerror(errno)}")
+
+
+def _send(conn: Connection, status: str, payload: Any) -> None:
+    """工作进程向父进程发送消息，只允许JSON数据"""
+    try:
+        data = json.dumps([status, payload]).encode()
+    except (TypeError, ValueError) as e:
+        data = json.dumps([_MSG_ERROR, f"返回值无法序列化为JSON: {e}"]).encode()
+    if len(data) > MAX_MESSAGE_BYTES:
+        data = json.dumps([_MSG_ERROR, "返回值过大"]).encode()
+    conn.send_bytes(data)
+
+
+def _seed_process(seed: int) -> None:
+    """重置进程内的随机数状态，AI代码使用 random 或 numpy.random 时结果可复现"""
+    random.seed(seed)
+    numpy = sys.modules.get("numpy")
+    if numpy is not None:
+        numpy.random.seed(seed % 2**32)
+
+
+def _load_entry(
+    file_path: str, entry_point: str, code_bytes: bytes, search_path: Optional[str]
+):
+    """执行预编译的AI代码模块并返回入口函数"""
+    if search_path:
+        sys.path.insert(0, search_path)
+    module = ModuleType("bot_module")
+    module.__file__ = file_path
+    sys.modules["bot_module"] = module
+    exec(marshal.loads(code_bytes), module.__dict__)
+
+    entry = getattr(module, entry_point, None)
+    if not callable(entry):
+        raise LookupError(f"AI代码缺少入口函数: {entry_point}")
+    return entry
+
+
+def worker_main(conn: Connection) -> None:
+    """
+    工作进程主循环
+
+    第一条消息为启动参数 (文件路径, 入口函数名, 资源限制字典, 字节码, 搜索目录)，
+    只包含基本类型，之后逐条处理动作请求。
+    """
+    try:
+        file_path, entry_point, limits, code_bytes, search_path = conn.recv()
+        _apply_limits(**limits)
+        entry = _load_entry(file_path, entry_point, code_bytes, search_path)
+    except BaseException as e:
+        _send(conn, _MSG_ERROR, f"{type(e).__name__}: {e}")
+        conn.close()
+        return
+
+    _send(conn, _MSG_READY, None)
+    while True:
+        try:
+            command, payload = conn.recv()
+        except (EOFError, OSError):
+            break
+        if command == _MSG_STOP:
+            break
+        if command == _MSG_SEED:
+            _seed_process(payload)
+            _send(conn, _MSG_OK, None)
+            continue
+        try:
+            move = entry(payload)
+        except BaseException as e:
+            _send(conn, _MSG_ERROR, f"{type(e).__name__}: {e}")
+        else:
+            _send(conn, _MSG_OK, move)
+    conn.close()
+
+
+if __name__ == "__main__":
+    worker_main(Connection(int(sys.argv[1])))
@@ -130,7 +130,58 @@ class FileMapping(BaseModel, TimestampMixin):
     file_type = fields.CharField(max_length=50, description="文件类型")
     file_size = fields.IntField(null=True, description="文件大小(字节)")
     upload_user_id = fields.IntField(description="上传用户ID", index=True)
-    file_path = fields.CharField(max_length=500, null=True, description="本地文件路径")
+    file_path = fields.CharField(
+        max_length=500, null=True, description="本地文件路径", index=True
+    )
+    file_hash = fields.CharField(
+        max_length=64, null=True, description="文件内容SHA-256", index=True
+    )
 
     class Meta:
         table = "file_mapping"
+
+
+class MultipartUpload(BaseModel, TimestampMixin):
+    """分片上传会话模型 - 记录可续传上传的进度，分片内容保存在磁盘"""
+
+    upload_id = fields.CharField(
+        max_length=64, unique=True, description="上传会话ID", index=True
+    )
+    user_id = fields.IntField(description="上传用户ID", index=True)
+    original_filename = fields.CharField(max_length=255, description="原始文件名")
+    file_size = fields.BigIntField(description="文件总大小(字节)")
+    part_size = fields.IntField(description="分片大小(字节)")
+    part_count = fields.IntField(description="分片数量")
+    status = fields.CharField(
+        max_length=20, default="uploading", description="会话状态", index=True
+    )
+    file_id = fields.CharField(
+        max_length=255, null=True, description="完成后的文件ID"
+    )
+    expires_at = fields.DatetimeField(description="过期时间", index=True)
+    assembling_at = fields.DatetimeField(null=True, description="开始合并的时间")
+
+    class Meta:
+        table = "multipart_upload"
+
+
+class BackgroundJob(BaseModel, TimestampMixin):
+    """后台任务模型 - 持久化的任务队列，进程重启后未完成的任务会继续执行"""
+
+    kind = fields.CharField(max_length=64, description="任务类型", index=True)
+    payload = fields.JSONField(null=True, description="任务参数")
+    status = fields.CharField(
+        max_length=20, default="pending", description="任务状态", index=True
+    )
+    attempts = fields.IntField(default=0, description="已执行次数")
+    max_attempts = fields.IntField(default=3, description="最多执行次数")
+    run_at = fields.DatetimeField(description="最早执行时间", index=True)
+    locked_until = fields.DatetimeField(null=True, description="租约到期时间")
+    result = fields.JSONField(null=True, description="执行结果")
+    error = fields.TextField(null=True, description="最近一次错误")
+
+    class Meta:
+        table = "background_job"
+        indexes = [
+            ("status", "run_at"),
+        ]
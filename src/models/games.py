@@ -42,9 +42,23 @@ class Battle(BaseModel, TimestampMixin):
     game_log_uuid = fields.CharField(max_length=100, null=True, description="游戏日志UUID")
     battle_type = fields.CharField(max_length=50, default="standard", description="对战类型")
     is_elo_exempt = fields.BooleanField(default=False, description="是否ELO豁免")
+    tournament_id = fields.IntField(null=True, description="锦标赛ID", index=True)
+    pairing_key = fields.CharField(max_length=64, null=True, description="锦标赛对局键")
     
     class Meta:
         table = "battle"
+        unique_together = (("tournament_id", "pairing_key"),)
+
+
+class Tournament(BaseModel, TimestampMixin):
+    """锦标赛模型 - 同名锦标赛续跑时复用，对局通过 Battle.tournament_id 关联"""
+    name = fields.CharField(max_length=100, unique=True, description="锦标赛名称")
+    game_type = fields.CharField(max_length=50, description="游戏类型")
+    mode = fields.CharField(max_length=20, description="对阵方式")
+    ranking_id = fields.IntField(default=0, description="排行榜ID")
+
+    class Meta:
+        table = "tournament"
 
 
 class BattlePlayer(BaseModel, TimestampMixin):
@@ -147,6 +161,7 @@ class AICode(BaseModel, TimestampMixin):
     file_name = fields.CharField(max_length=255, description="原始文件名")
     file_size = fields.IntField(description="文件大小（字节）")
     file_hash = fields.CharField(max_length=64, description="文件哈希值", null=True)
+    file_id = fields.CharField(max_length=255, null=True, description="文件映射ID")
     game_type = fields.CharField(max_length=50, description="游戏类型", index=True)
     description = fields.TextField(null=True, description="AI代码描述")
     version = fields.IntField(default=1, description="版本号")
@@ -164,6 +179,11 @@ class AICode(BaseModel, TimestampMixin):
     download_count = fields.IntField(default=0, description="下载次数")
     rating = fields.FloatField(default=0.0, description="评分")
     review_count = fields.IntField(default=0, description="评论数量")
+    processing_status = fields.CharField(
+        max_length=20, default="ready", description="上传后处理状态", index=True
+    )
+    processing_job_id = fields.IntField(null=True, description="处理任务ID")
+    processing_error = fields.TextField(null=True, description="处理失败原因")
     
     class Meta:
         table = "ai_code"
@@ -43,6 +43,7 @@ class FileMappingRepository(
         file_size: int | None,
         user_id: int,
         file_path: str | None = None,
+        file_hash: str | None = None,
     ) -> FileMapping:
         """创建文件映射记录"""
         return await FileMapping.create(
@@ -52,8 +53,38 @@ class FileMappingRepository(
             file_size=file_size,
             upload_user_id=user_id,
             file_path=file_path,
+            file_hash=file_hash,
         )
 
+    async def count_references(self, file_path: str) -> int:
+        """统计引用同一存储文件的映射数"""
+        return await FileMapping.filter(file_path=file_path).count()
+
+    async def delete_reference(
+        self, file_path: str, file_id: str | None = None, user_id: int | None = None
+    ) -> bool:
+        """
+        删除一条指向该存储文件的映射
+
+        Args:
+            file_path: 存储文件路径
+            file_id: 指定要删除的文件ID
+            user_id: 只删除该用户上传的映射，未指定文件ID时删除其中最新的一条
+
+        Returns:
+            bool: 是否删除了映射
+        """
+        query = FileMapping.filter(file_path=file_path)
+        if file_id:
+            query = query.filter(file_id=file_id)
+        if user_id is not None:
+            query = query.filter(upload_user_id=user_id)
+        mapping = await query.order_by("-id").first()
+        if not mapping:
+            return False
+        await mapping.delete()
+        return True
+
     async def get_file_info_by_ids(self, file_ids: list[str]) -> list[FileMapping]:
         """根据文件ID列表获取文件信息"""
         if not file_ids:
@@ -72,9 +103,14 @@ class FileMappingRepository(
                 "file_size": mapping.file_size,
                 "upload_user_id": mapping.upload_user_id,
                 "file_path": mapping.file_path,
+                "file_hash": mapping.file_hash,
             }
         return None
 
+    async def get_image_by_hash(self, file_hash: str) -> FileMapping | None:
+        """根据内容哈希获取图片文件的映射记录"""
+        return await FileMapping.filter(file_hash=file_hash, file_type="image").first()
+
     async def get_latest_by_user(self, user_id: int) -> FileMapping | None:
         """获取用户最新上传的文件映射记录"""
         return await FileMapping.filter(upload_user_id=user_id).order_by('-created_at').first()
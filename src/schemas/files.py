@@ -0,0 +1,17 @@
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+class MultipartUploadInit(BaseModel):
+    """创建分片上传会话"""
+    filename: str = Field(..., description="原始文件名", max_length=255)
+    file_size: int = Field(..., description="文件总大小（字节）", gt=0)
+    part_size: int = Field(8 * 1024 * 1024, description="分片大小（字节）")
+
+
+class MultipartUploadComplete(BaseModel):
+    """完成分片上传"""
+    file_hash: Optional[str] = Field(
+        None, description="整个文件的SHA-256，用于校验合并结果", max_length=64
+    )
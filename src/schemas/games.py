@@ -22,6 +22,7 @@ class AICodeCreate(AICodeBase):
     file_name: str = Field(..., description="原始文件名", max_length=255)
     file_size: int = Field(..., description="文件大小（字节）")
     file_hash: Optional[str] = Field(None, description="文件哈希值", max_length=64)
+    file_id: Optional[str] = Field(None, description="文件映射ID", max_length=255)
 
 
 class AICodeUpdate(BaseModel):
@@ -51,6 +52,9 @@ class AICodeResponse(AICodeBase):
     download_count: int = Field(default=0, description="下载次数")
     rating: float = Field(default=0.0, description="评分")
     review_count: int = Field(default=0, description="评论数量")
+    processing_status: str = Field(default="ready", description="上传后处理状态")
+    processing_job_id: Optional[int] = Field(None, description="处理任务ID")
+    processing_error: Optional[str] = Field(None, description="处理失败原因")
     created_at: datetime = Field(..., description="创建时间")
     updated_at: datetime = Field(..., description="更新时间")
     
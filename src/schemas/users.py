@@ -122,6 +122,7 @@ class UpdatePassword(BaseModel):
 class AvatarUpload(BaseModel):
     """头像上传响应模型"""
     avatar_url: str = Field(description="头像URL")
+    thumbnails: dict[str, str] = Field(default_factory=dict, description="缩略图URL（边长 -> URL）")
     message: str = Field(default="头像上传成功", description="响应消息")
 
 
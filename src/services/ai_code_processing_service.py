@@ -0,0 +1,244 @@
+"""AI代码处理服务层 - 上传后的检查、解压与版本登记（在后台任务队列中执行）"""
+
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Any
+
+from core.jobs import job_queue
+from games.bot_cache import check_archive_members, extract_archive_members
+from log import logger
+from models.games import AICode, AICodeVersion
+from services.file_service import EXTRACTED_DIR
+from utils.storage import storage
+
+JOB_KIND = "ai_code.process"
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# 解压树最后写入的标记对象：存在时说明整棵树已完整存入存储，重复执行的任务直接跳过
+EXTRACTED_MARKER = ".complete"
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _check_python_syntax(source: bytes, filename: str) -> str | None:
+    """只编译不执行，返回语法错误描述"""
+    try:
+        compile(source, filename, "exec", dont_inherit=True)
+    except (SyntaxError, ValueError) as e:
+        line = getattr(e, "lineno", None)
+        return f"{filename}:{line}: {e.msg if isinstance(e, SyntaxError) else e}"
+    return None
+
+
+def _inspect_zip(path: str, extract_root: Path) -> tuple[list[str], list[str]]:
+    """
+    检查并解压zip压缩包
+
+    限制与编译缓存共用 check_archive_members，在解压前校验；
+    已存在相同哈希的解压目录时直接复用。
+
+    Returns:
+        tuple: (成员列表, 错误列表)
+    """
+    with zipfile.ZipFile(path) as archive:
+        infos = [info for info in archive.infolist() if not info.is_dir()]
+        names = [info.filename for info in infos]
+
+        errors = check_archive_members(infos)
+        if errors:
+            return names, errors
+
+        for info in infos:
+            if info.filename.endswith(".py"):
+                error = _check_python_syntax(archive.read(info), info.filename)
+                if error:
+                    errors.append(error)
+        if not errors and not extract_root.exists():
+            extract_archive_members(archive, infos, extract_root)
+
+    return names, errors
+
+
+def inspect_ai_code(
+    file_path: str, file_name: str, file_hash: str | None, extract_dir: Path
+) -> dict[str, Any]:
+    """
+    检查AI代码文件（在线程中执行）
+
+    Args:
+        file_path: 存储文件路径
+        file_name: 原始文件名
+        file_hash: 上传时计算的SHA-256
+        extract_dir: 本地暂存目录，压缩包解压到其下以内容哈希命名的子目录
+
+    Returns:
+        dict: 检查报告，errors 为空表示通过
+    """
+    report: dict[str, Any] = {"file_size": os.path.getsize(file_path), "errors": []}
+
+    digest = _sha256_file(file_path)
+    if file_hash and digest != file_hash:
+        report["errors"].append("文件内容与上传时的哈希不一致")
+        return report
+    report["file_hash"] = digest
+
+    ext = Path(file_name).suffix.lower()
+    if ext == ".py":
+        with open(file_path, "rb") as f:
+            error = _check_python_syntax(f.read(), file_name)
+        if error:
+            report["errors"].append(error)
+    elif ext == ".zip":
+        extract_root = extract_dir / digest
+        try:
+            report["members"], errors = _inspect_zip(file_path, extract_root)
+        except zipfile.BadZipFile:
+            errors = ["压缩包已损坏"]
+        report["errors"].extend(errors)
+        if not errors:
+            report["extracted_path"] = str(extract_root)
+    else:
+        # .rar 等格式与其他语言的源码暂不检查内容
+        report["inspected"] = False
+
+    return report
+
+
+class AICodeProcessingService:
+    """AI代码处理服务类 - 由后台任务队列调用，上传请求只负责入队"""
+
+    def __init__(self):
+        self.logger = logger
+
+    async def enqueue(self, ai_code: AICode) -> int:
+        """
+        为新上传的AI代码添加处理任务
+
+        Args:
+            ai_code: AI代码记录
+
+        Returns:
+            int: 任务ID
+        """
+        job = await job_queue.enqueue(JOB_KIND, {"ai_code_id": ai_code.id})
+        ai_code.processing_status = "pending"
+        ai_code.processing_job_id = job.id
+        await ai_code.save(update_fields=["processing_status", "processing_job_id"])
+        return job.id
+
+    async def process(self, payload: dict) -> dict[str, Any]:
+        """
+        处理上传后的AI代码：校验哈希、检查语法、解压压缩包、登记版本
+
+        压缩包先解压到本地暂存目录，再逐个文件存入存储后端
+        （uploads/extracted/<文件哈希>/），各副本都能读取，不依赖执行任务的副本的本地磁盘。
+        任务可能被重复执行，每一步都是幂等的。
+
+        Args:
+            payload: 任务参数（ai_code_id）
+
+        Returns:
+            dict: 检查报告
+        """
+        from services.file_service import file_service
+
+        ai_code = await AICode.filter(id=payload["ai_code_id"]).first()
+        if not ai_code:
+            return {"skipped": "AI代码已删除"}
+
+        await AICode.filter(id=ai_code.id).update(processing_status="processing")
+        # 以 . 开头的暂存目录在进程崩溃后由孤儿文件回收清理
+        staging = Path(await asyncio.to_thread(
+            tempfile.mkdtemp, prefix=".extracting-", dir=file_service.uploads_dir
+        ))
+        try:
+            report = await asyncio.to_thread(
+                inspect_ai_code,
+                str(await storage.local_path(ai_code.file_path)),
+                ai_code.file_name,
+                ai_code.file_hash,
+                staging,
+            )
+            if not report["errors"] and "extracted_path" in report:
+                prefix = file_service.uploads_dir / EXTRACTED_DIR / report["file_hash"]
+                report["extracted_path"] = await self._store_extracted(
+                    Path(report["extracted_path"]), f"{prefix.as_posix()}/"
+                )
+        finally:
+            await asyncio.to_thread(shutil.rmtree, staging, True)
+
+        if report["errors"]:
+            await AICode.filter(id=ai_code.id).update(
+                processing_status="rejected", processing_error="\n".join(report["errors"])
+            )
+            self.logger.info(f"AI代码 {ai_code.id} 未通过检查: {report['errors']}")
+            return report
+
+        await AICodeVersion.get_or_create(
+            ai_code_id=ai_code.id,
+            version_number=ai_code.version,
+            defaults={
+                "file_path": ai_code.file_path,
+                "file_name": ai_code.file_name,
+                "file_size": report["file_size"],
+                "file_hash": report["file_hash"],
+            },
+        )
+        await AICode.filter(id=ai_code.id).update(processing_status="ready", processing_error=None)
+        self.logger.info(f"AI代码 {ai_code.id} 处理完成")
+        return report
+
+    async def _store_extracted(self, root: Path, prefix: str) -> str:
+        """
+        将本地解压目录存入存储后端
+
+        Args:
+            root: 本地解压目录
+            prefix: 存储键前缀（以 / 结尾）
+
+        Returns:
+            str: 存储键前缀
+        """
+        marker = f"{prefix}{EXTRACTED_MARKER}"
+        if await storage.exists(marker):
+            return prefix
+
+        files = await asyncio.to_thread(
+            lambda: [path for path in root.rglob("*") if path.is_file()]
+        )
+        for path in files:
+            await storage.save(f"{prefix}{path.relative_to(root).as_posix()}", path)
+        (root / EXTRACTED_MARKER).touch()
+        await storage.save(marker, root / EXTRACTED_MARKER)
+        return prefix
+
+    async def fail(self, payload: dict, error: str) -> None:
+        """
+        最后一次重试仍失败时调用，将状态置为终态 failed
+
+        Args:
+            payload: 任务参数（ai_code_id）
+            error: 最后一次执行的错误
+        """
+        await AICode.filter(id=payload["ai_code_id"]).update(
+            processing_status="failed", processing_error=error
+        )
+        self.logger.error(f"AI代码 {payload['ai_code_id']} 处理失败: {error}")
+
+
+# 全局实例
+ai_code_processing_service = AICodeProcessingService()
+job_queue.register(
+    JOB_KIND, ai_code_processing_service.process, on_failure=ai_code_processing_service.fail
+)
@@ -1,19 +1,44 @@
 """文件服务层 - 统一文件处理业务逻辑"""
 
+import hashlib
+import math
+import mimetypes
+import re
 import uuid
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta
 from pathlib import Path
+from urllib.parse import quote
 
+import aiofiles
+import aiofiles.os
 from fastapi import HTTPException, UploadFile
+from fastapi.responses import FileResponse, Response, StreamingResponse
 
 from core.ctx import CTX_USER_ID
 from log import logger
+from models.admin import MultipartUpload
 from repositories.file_mapping import file_mapping_repository
 from repositories.user import user_repository
 from schemas.base import Success
+from settings import settings
+from utils.storage import storage
 
 # 文件安全配置
 MAX_FILE_SIZE = 500 * 1024 * 1024  # 500MB
 UPLOADS_DIR = "uploads"
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 流式上传每次读取1MB
+BLOBS_DIR = "blobs"  # 按内容寻址的存储目录（uploads/blobs/<哈希前两位>/<哈希><扩展名>）
+MULTIPART_DIR = "multipart"  # 分片存储前缀（uploads/multipart/<上传ID>/<分片序号>.part）
+EXTRACTED_DIR = "extracted"  # AI代码压缩包解压目录（uploads/extracted/<文件哈希>/）
+# 不经 /uploads 对外提供的子目录：未完成上传的分片、私有AI代码的解压内容
+PRIVATE_UPLOAD_DIRS = frozenset({MULTIPART_DIR, EXTRACTED_DIR})
+MULTIPART_PART_SIZE = 8 * 1024 * 1024  # 默认分片大小8MB
+MULTIPART_MIN_PART_SIZE = 1024 * 1024  # 最后一片以外的分片不小于1MB
+MULTIPART_MAX_PART_SIZE = 64 * 1024 * 1024
+MULTIPART_EXPIRES = timedelta(hours=24)  # 未完成的上传会话保留时间
+# 合并超过该时间仍未完成视为进程已崩溃，会话可被重新合并或取消
+MULTIPART_ASSEMBLE_TIMEOUT = timedelta(minutes=30)
 
 ALLOWED_EXTENSIONS: set[str] = {
     # 文档类型
@@ -82,7 +107,11 @@ DANGEROUS_EXTENSIONS: set[str] = {
 
 
 class FileService:
-    """文件服务类 - 专门处理文件上传和安全验证逻辑"""
+    """文件服务类 - 专门处理文件上传和安全验证逻辑
+
+    上传内容先流式写入本地临时文件（uploads_dir），校验后交给存储后端
+    （utils.storage，本地磁盘或S3兼容存储）；file_path 即存储键。
+    """
 
     def __init__(self):
         self.logger = logger
@@ -90,16 +119,38 @@ class FileService:
         self.uploads_dir = Path(UPLOADS_DIR)
         self.uploads_dir.mkdir(exist_ok=True)
 
-    async def upload_file(self, file: UploadFile) -> Success:
+    async def upload_file(
+        self, file: UploadFile, max_size: int = MAX_FILE_SIZE
+    ) -> Success:
         """
         通用文件上传
 
         Args:
             file: 上传的文件
+            max_size: 文件大小上限（字节）
 
         Returns:
             Success: 上传结果响应
         """
+        response_data = await self.save_upload(file, max_size)
+        return Success(
+            data=response_data,
+            msg="文件上传成功",
+        )
+
+    async def save_upload(
+        self, file: UploadFile, max_size: int = MAX_FILE_SIZE
+    ) -> dict:
+        """
+        保存上传文件并返回文件信息
+
+        Args:
+            file: 上传的文件
+            max_size: 文件大小上限（字节）
+
+        Returns:
+            dict: 文件信息（file_id、file_path、file_size、file_hash 等）
+        """
         try:
             # 用户身份验证
             user = await self._authenticate_user()
@@ -107,53 +158,297 @@ class FileService:
             # 文件安全验证
             self._validate_file_security(file)
 
-            # 在读取文件之前保存文件信息，避免文件指针问题
-            original_filename = file.filename
-            original_size = file.size if hasattr(file, 'size') else None
+            # 分块写入临时文件，同时计算哈希并校验大小
+            tmp_path, file_size, file_hash = await self._stream_to_temp(file, max_size)
+            return await self._commit_upload(
+                tmp_path, file_size, file_hash, file.filename, user.id
+            )
 
-            # 生成安全文件名
-            safe_filename = self._generate_safe_filename(original_filename)
+        except HTTPException:
+            raise
+        except Exception as e:
+            self.logger.error(f"文件上传失败: {str(e)}")
+            self.logger.error(f"错误类型: {type(e).__name__}")
+            self.logger.error(f"错误详情: {e}")
+            raise HTTPException(status_code=500, detail="文件上传失败") from e
 
-            # 读取并验证文件内容
-            content = await self._read_and_validate_file(file)
+    async def init_multipart_upload(
+        self,
+        filename: str,
+        file_size: int,
+        part_size: int = MULTIPART_PART_SIZE,
+        max_size: int = MAX_FILE_SIZE,
+    ) -> dict:
+        """
+        创建分片上传会话
 
-            # 生成文件ID和保存路径
-            file_id = str(uuid.uuid4())
-            file_path = self.uploads_dir / f"{file_id}_{safe_filename}"
+        文件按 part_size 切分为编号从1开始的分片，除最后一片外大小必须等于 part_size。
 
-            # 保存文件到本地
-            with open(file_path, "wb") as f:
-                f.write(content)
+        Args:
+            filename: 原始文件名
+            file_size: 文件总大小（字节）
+            part_size: 分片大小（字节）
+            max_size: 文件大小上限（字节）
 
-            self.logger.info(f"文件已保存: {file_path}")
+        Returns:
+            dict: 上传会话信息（upload_id、part_count 等）
+        """
+        user = await self._authenticate_user()
+        self._validate_filename(filename)
 
-            # 保存文件映射信息
-            await self._save_file_mapping(
-                {"file_id": file_id, "file_path": str(file_path)}, file, user.id
+        if file_size <= 0:
+            raise HTTPException(status_code=400, detail="文件不能为空")
+        if file_size > max_size:
+            raise HTTPException(
+                status_code=400,
+                detail=f"文件大小超过限制 {max_size // (1024 * 1024)}MB",
+            )
+        if not MULTIPART_MIN_PART_SIZE <= part_size <= MULTIPART_MAX_PART_SIZE:
+            raise HTTPException(
+                status_code=400,
+                detail=f"分片大小需在 {MULTIPART_MIN_PART_SIZE} 到 {MULTIPART_MAX_PART_SIZE} 字节之间",
             )
 
-            # 返回文件信息
-            response_data = {
-                "file_id": file_id,
-                "original_filename": original_filename,
-                "file_type": self._determine_file_type(original_filename),
-                "file_size": len(content),
-                "file_path": str(file_path),
-            }
-
-            return Success(
-                data=response_data,
-                msg="文件上传成功",
+        session = await MultipartUpload.create(
+            upload_id=uuid.uuid4().hex,
+            user_id=user.id,
+            original_filename=filename,
+            file_size=file_size,
+            part_size=part_size,
+            part_count=math.ceil(file_size / part_size),
+            expires_at=datetime.now() + MULTIPART_EXPIRES,
+        )
+        self.logger.info(
+            f"已创建分片上传: {session.upload_id} -> {filename} ({session.part_count} 片)"
+        )
+        return self._multipart_info(session, [])
+
+    async def upload_part(
+        self,
+        upload_id: str,
+        part_number: int,
+        chunks: AsyncIterator[bytes],
+        checksum: str,
+    ) -> dict:
+        """
+        上传一个分片
+
+        分片流式写入临时文件，大小与SHA-256校验通过后才原子替换为正式分片，
+        因此磁盘上存在的分片总是完整的；同一分片可重复上传。
+
+        Args:
+            upload_id: 上传会话ID
+            part_number: 分片序号（从1开始）
+            chunks: 分片内容的数据块
+            checksum: 分片内容的SHA-256（十六进制）
+
+        Returns:
+            dict: 分片信息
+        """
+        user = await self._authenticate_user()
+        session = await self._get_multipart(upload_id, user.id)
+        if session.status != "uploading":
+            raise HTTPException(status_code=409, detail="上传会话不接受新的分片")
+        if not 1 <= part_number <= session.part_count:
+            raise HTTPException(
+                status_code=400,
+                detail=f"分片序号需在 1 到 {session.part_count} 之间",
             )
 
-        except HTTPException:
-            raise
+        expected_size = self._expected_part_size(session, part_number)
+        tmp_path, size, digest = await self._write_chunks(chunks, expected_size)
+        try:
+            if size != expected_size:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"分片大小不正确：应为 {expected_size} 字节，实际 {size} 字节",
+                )
+            if digest != checksum.strip().lower():
+                raise HTTPException(status_code=400, detail="分片校验失败，请重新上传")
+            await storage.save(self._part_key(session.upload_id, part_number), tmp_path)
+        finally:
+            await self._remove_quietly(tmp_path)
+
+        return {
+            "upload_id": session.upload_id,
+            "part_number": part_number,
+            "size": size,
+            "sha256": digest,
+        }
+
+    async def get_multipart_upload(self, upload_id: str) -> dict:
+        """
+        查询分片上传进度，客户端据此只重传缺失的分片
+
+        Args:
+            upload_id: 上传会话ID
+
+        Returns:
+            dict: 上传会话信息，包含已上传与缺失的分片序号
+        """
+        user = await self._authenticate_user()
+        session = await self._get_multipart(upload_id, user.id)
+        parts = await self._list_parts(session) if session.status != "completed" else []
+        return self._multipart_info(session, parts)
+
+    async def complete_multipart_upload(
+        self, upload_id: str, file_hash: str | None = None
+    ) -> dict:
+        """
+        合并全部分片并保存文件
+
+        分片按序号流式拼接到临时文件并计算整体SHA-256，
+        之后与普通上传一样存入内容寻址存储并登记文件映射。
+        重复调用返回同一文件信息。
+
+        Args:
+            upload_id: 上传会话ID
+            file_hash: 客户端计算的整个文件的SHA-256，可选
+
+        Returns:
+            dict: 文件信息（file_id、file_path、file_size、file_hash 等）
+        """
+        user = await self._authenticate_user()
+        session = await self._get_multipart(upload_id, user.id)
+
+        if session.status == "completed":
+            mapping = await file_mapping_repository.get_file_mapping_by_file_id(
+                session.file_id
+            )
+            if not mapping:
+                raise HTTPException(status_code=404, detail="文件不存在")
+            mapping.pop("upload_user_id")
+            return mapping
+        if session.status == "assembling" and not self._assembling_stale(session):
+            raise HTTPException(status_code=409, detail="分片正在合并，请稍后查询")
+
+        missing = self._missing_parts(session, await self._list_parts(session))
+        if missing:
+            raise HTTPException(
+                status_code=400, detail=f"缺少分片: {', '.join(map(str, missing[:20]))}"
+            )
+
+        # 以状态迁移作为锁，避免并发合并同一会话；合并超时的会话按开始时间比较后接管
+        claimed = await MultipartUpload.filter(
+            id=session.id, status=session.status, assembling_at=session.assembling_at
+        ).update(status="assembling", assembling_at=datetime.now())
+        if not claimed:
+            raise HTTPException(status_code=409, detail="分片正在合并，请稍后查询")
+
+        try:
+            tmp_path, size, digest = await self._write_chunks(
+                self._read_parts(session), session.file_size
+            )
+            if file_hash and digest != file_hash.strip().lower():
+                await self._remove_quietly(tmp_path)
+                raise HTTPException(status_code=400, detail="文件校验失败，请检查分片内容")
+            file_info = await self._commit_upload(
+                tmp_path, size, digest, session.original_filename, user.id
+            )
         except Exception as e:
-            self.logger.error(f"文件上传失败: {str(e)}")
-            self.logger.error(f"错误类型: {type(e).__name__}")
-            self.logger.error(f"错误详情: {e}")
+            await MultipartUpload.filter(id=session.id).update(
+                status="uploading", assembling_at=None
+            )
+            if isinstance(e, HTTPException):
+                raise
+            self.logger.error(f"合并分片失败: {str(e)}")
             raise HTTPException(status_code=500, detail="文件上传失败") from e
 
+        session.status = "completed"
+        session.file_id = file_info["file_id"]
+        await session.save(update_fields=["status", "file_id", "updated_at"])
+        await storage.delete_prefix(self._multipart_prefix(session.upload_id))
+        self.logger.info(f"分片上传完成: {session.upload_id} -> {file_info['file_id']}")
+        return file_info
+
+    async def abort_multipart_upload(self, upload_id: str) -> None:
+        """
+        取消分片上传并删除已上传的分片
+
+        Args:
+            upload_id: 上传会话ID
+        """
+        user = await self._authenticate_user()
+        session = await self._get_multipart(upload_id, user.id, check_expired=False)
+        if session.status == "assembling" and not self._assembling_stale(session):
+            raise HTTPException(status_code=409, detail="分片正在合并，无法取消")
+
+        await session.delete()
+        await storage.delete_prefix(self._multipart_prefix(session.upload_id))
+
+    async def _get_multipart(
+        self, upload_id: str, user_id: int, check_expired: bool = True
+    ) -> MultipartUpload:
+        """获取当前用户的上传会话"""
+        session = await MultipartUpload.filter(upload_id=upload_id).first()
+        if not session or session.user_id != user_id:
+            raise HTTPException(status_code=404, detail="上传会话不存在")
+        if (
+            check_expired
+            and session.status == "uploading"
+            and session.expires_at < datetime.now()
+        ):
+            raise HTTPException(status_code=410, detail="上传会话已过期")
+        return session
+
+    @staticmethod
+    def _assembling_stale(session: MultipartUpload) -> bool:
+        """合并是否已超时（合并进程崩溃后会话停留在 assembling）"""
+        return (
+            session.assembling_at is None
+            or session.assembling_at < datetime.now() - MULTIPART_ASSEMBLE_TIMEOUT
+        )
+
+    def _multipart_prefix(self, upload_id: str) -> str:
+        return f"{self.uploads_dir / MULTIPART_DIR / upload_id}/"
+
+    def _part_key(self, upload_id: str, part_number: int) -> str:
+        return f"{self._multipart_prefix(upload_id)}{part_number:05d}.part"
+
+    @staticmethod
+    def _expected_part_size(session: MultipartUpload, part_number: int) -> int:
+        if part_number < session.part_count:
+            return session.part_size
+        return session.file_size - session.part_size * (session.part_count - 1)
+
+    async def _list_parts(self, session: MultipartUpload) -> list[int]:
+        """列出存储中已完整上传的分片序号"""
+        prefix = self._multipart_prefix(session.upload_id)
+        names = [key[len(prefix):] for key in await storage.list(prefix)]
+        return sorted(
+            int(name[:-5])
+            for name in names
+            if name.endswith(".part") and name[:-5].isdigit()
+        )
+
+    @staticmethod
+    def _missing_parts(session: MultipartUpload, parts: list[int]) -> list[int]:
+        uploaded = set(parts)
+        return [n for n in range(1, session.part_count + 1) if n not in uploaded]
+
+    async def _read_parts(self, session: MultipartUpload) -> AsyncIterator[bytes]:
+        """按序号依次读取全部分片"""
+        for part_number in range(1, session.part_count + 1):
+            async for chunk in storage.open(self._part_key(session.upload_id, part_number)):
+                yield chunk
+
+    def _multipart_info(self, session: MultipartUpload, parts: list[int]) -> dict:
+        return {
+            "upload_id": session.upload_id,
+            "original_filename": session.original_filename,
+            "file_size": session.file_size,
+            "part_size": session.part_size,
+            "part_count": session.part_count,
+            "status": session.status,
+            "uploaded_parts": parts,
+            "missing_parts": (
+                [] if session.status == "completed"
+                else self._missing_parts(session, parts)
+            ),
+            "file_id": session.file_id,
+            "expires_at": session.expires_at.strftime(settings.DATETIME_FORMAT),
+        }
+
     async def _authenticate_user(self):
         """验证用户身份"""
         user_id = CTX_USER_ID.get()
@@ -168,11 +463,15 @@ class FileService:
 
     def _validate_file_security(self, file: UploadFile) -> None:
         """验证文件安全性"""
-        if not file.filename:
+        self._validate_filename(file.filename)
+
+    def _validate_filename(self, filename: str | None) -> None:
+        """按文件名校验文件类型"""
+        if not filename:
             raise HTTPException(status_code=400, detail="文件名不能为空")
 
         # 获取文件扩展名
-        file_ext = Path(file.filename).suffix.lower()
+        file_ext = Path(filename).suffix.lower()
 
         # 检查危险文件类型
         if file_ext in DANGEROUS_EXTENSIONS:
@@ -187,104 +486,371 @@ class FileService:
                 detail=f"不支持的文件类型: {file_ext}，允许的类型: {', '.join(sorted(ALLOWED_EXTENSIONS))}",
             )
 
-    def _generate_safe_filename(self, original_filename: str) -> str:
-        """生成安全的文件名（防止路径遍历攻击）"""
-        file_ext = Path(original_filename).suffix.lower()
-        return f"{uuid.uuid4().hex}{file_ext}"
+    async def _stream_to_temp(
+        self, file: UploadFile, max_size: int = MAX_FILE_SIZE
+    ) -> tuple[Path, int, str]:
+        """
+        流式保存上传文件到临时文件
 
-    async def _read_and_validate_file(self, file: UploadFile) -> bytes:
-        """读取并验证文件内容"""
-        try:
-            content = await file.read()
+        按固定大小分块读取，逐块累计SHA-256与大小，超出限制立即中止，
+        内存占用与文件大小无关。
 
-            # 验证文件大小
-            if len(content) > MAX_FILE_SIZE:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"文件大小超过限制 {MAX_FILE_SIZE // (1024 * 1024)}MB",
-                )
+        Args:
+            file: 上传的文件
+            max_size: 文件大小上限
 
-            return content
+        Returns:
+            tuple[Path, int, str]: (临时文件路径, 文件大小, SHA-256)
+        """
+
+        async def read_chunks() -> AsyncIterator[bytes]:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                yield chunk
+
+        return await self._write_chunks(read_chunks(), max_size)
+
+    async def _write_chunks(
+        self,
+        chunks: AsyncIterator[bytes],
+        max_size: int,
+        tmp_path: Path | None = None,
+    ) -> tuple[Path, int, str]:
+        """
+        将数据块依次写入临时文件，同时计算SHA-256与大小
+
+        Args:
+            chunks: 数据块异步迭代器
+            max_size: 大小上限，超出时中止并删除临时文件
+            tmp_path: 临时文件路径，默认在上传目录下生成
+
+        Returns:
+            tuple[Path, int, str]: (临时文件路径, 文件大小, SHA-256)
+        """
+        digest = hashlib.sha256()
+        size = 0
+        if tmp_path is None:
+            tmp_path = self.uploads_dir / f".{uuid.uuid4().hex}.uploading"
+        try:
+            async with aiofiles.open(tmp_path, "wb") as out:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > max_size:
+                        raise HTTPException(
+                            status_code=400,
+                            detail=f"文件大小超过限制 {max_size // (1024 * 1024)}MB",
+                        )
+                    digest.update(chunk)
+                    await out.write(chunk)
+        except HTTPException:
+            await self._remove_quietly(tmp_path)
+            raise
         except Exception as e:
+            await self._remove_quietly(tmp_path)
             self.logger.error(f"读取文件失败: {str(e)}")
-            raise HTTPException(status_code=400, detail="文件读取失败，请检查文件是否损坏")
+            raise HTTPException(
+                status_code=400, detail="文件读取失败，请检查文件是否损坏"
+            ) from e
 
-    async def _save_file_mapping(
+        return tmp_path, size, digest.hexdigest()
+
+    async def _commit_upload(
         self,
-        response_data: dict,
-        file: UploadFile,
+        tmp_path: Path,
+        file_size: int,
+        file_hash: str,
+        filename: str,
         user_id: int,
-    ) -> None:
-        """保存文件映射信息"""
+    ) -> dict:
+        """
+        将写好的临时文件存入内容寻址存储并登记文件映射
+
+        Returns:
+            dict: 文件信息（file_id、file_path、file_size、file_hash 等）
+        """
+        file_id = str(uuid.uuid4())
         try:
-            # 从响应中获取文件ID
-            file_id = response_data.get("file_id")
-            if not file_id:
-                self.logger.warning("无法从响应中获取文件ID")
-                return
-
-            # 确定文件类型
-            file_type = self._determine_file_type(file.filename)
-
-            # 获取文件大小
-            file_size = file.size if hasattr(file, "size") else None
-
-            # 保存文件映射
-            await file_mapping_repository.create_file_mapping(
-                file_id=file_id,
-                original_name=file.filename,
-                file_type=file_type,
-                file_size=file_size,
-                user_id=user_id,
-                file_path=response_data.get("file_path"),  # 存储本地文件路径
+            file_path = await self._store_blob(
+                tmp_path, file_hash, Path(filename).suffix.lower()
+            )
+
+            # 保存文件映射信息（每条映射即一次对存储文件的引用）
+            await self._save_file_mapping(
+                {
+                    "file_id": file_id,
+                    "file_path": str(file_path),
+                    "file_size": file_size,
+                    "file_hash": file_hash,
+                },
+                filename,
+                user_id,
             )
 
-            self.logger.info(f"已保存文件映射: {file_id} -> {file.filename}")
+            # 并发删除可能在登记引用前移走了同内容的文件，用本次上传的内容补回
+            if not await storage.exists(file_path) and await aiofiles.os.path.exists(
+                tmp_path
+            ):
+                await storage.save(file_path, tmp_path)
+        finally:
+            await self._remove_quietly(tmp_path)
+
+        return {
+            "file_id": file_id,
+            "original_filename": filename,
+            "file_type": self._determine_file_type(filename),
+            "file_size": file_size,
+            "file_path": str(file_path),
+            "file_hash": file_hash,
+        }
+
+    def _blob_path(self, file_hash: str, file_ext: str) -> str:
+        """按内容哈希确定存储键（扩展名决定响应的Content-Type）"""
+        return str(self.uploads_dir / BLOBS_DIR / file_hash[:2] / f"{file_hash}{file_ext}")
+
+    async def _store_blob(self, tmp_path: Path, file_hash: str, file_ext: str) -> str:
+        """
+        将临时文件放入内容寻址存储
 
-        except Exception as e:
-            # 文件映射保存失败不应该影响上传流程
-            self.logger.warning(f"保存文件映射失败: {str(e)}")
+        相同内容已存在时不再写入，临时文件由调用方清理。
 
-    async def download_file(self, file_path: str) -> bytes:
+        Returns:
+            str: 存储键
         """
-        下载文件
-        
+        blob_path = self._blob_path(file_hash, file_ext)
+        if await storage.exists(blob_path):
+            self.logger.info(f"文件内容已存在，复用: {blob_path}")
+            return blob_path
+
+        await storage.save(blob_path, tmp_path)
+        self.logger.info(f"文件已保存: {blob_path}")
+        return blob_path
+
+    async def _remove_quietly(self, path: Path) -> None:
+        try:
+            await aiofiles.os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    async def _save_file_mapping(
+        self,
+        response_data: dict,
+        filename: str,
+        user_id: int,
+    ) -> None:
+        """
+        保存文件映射信息
+
+        映射同时是存储文件的引用计数，保存失败时上传整体失败，
+        否则其他引用删除时可能误删仍在使用的文件。
+        """
+        file_id = response_data["file_id"]
+
+        # 保存文件映射
+        await file_mapping_repository.create_file_mapping(
+            file_id=file_id,
+            original_name=filename,
+            file_type=self._determine_file_type(filename),
+            file_size=response_data.get("file_size"),
+            user_id=user_id,
+            file_path=response_data.get("file_path"),  # 存储本地文件路径
+            file_hash=response_data.get("file_hash"),
+        )
+
+        self.logger.info(f"已保存文件映射: {file_id} -> {filename}")
+
+    async def file_response(
+        self,
+        file_path: str,
+        filename: str | None = None,
+        file_hash: str | None = None,
+        if_none_match: str | None = None,
+        cache_control: str = "private, no-cache",
+        range_header: str | None = None,
+    ) -> Response:
+        """
+        生成文件下载响应
+
+        文件内容不经过Python内存：本地存储由 FileResponse 分块发送（服务器支持时
+        使用sendfile），并原生处理 Range / If-Range 请求；远程存储按块流式转发，
+        单区间 Range 请求转为对存储的区间读取。
+        已知内容哈希时以其作为强ETag，客户端缓存命中（If-None-Match）时返回304。
+
         Args:
-            file_path: 文件路径
-            
+            file_path: 存储键
+            filename: 下载文件名
+            file_hash: 文件内容哈希
+            if_none_match: 请求头 If-None-Match
+            cache_control: Cache-Control 响应头
+            range_header: 请求头 Range（仅远程存储使用）
+
         Returns:
-            bytes: 文件内容
+            Response: 文件响应或304响应
         """
-        try:
-            file_path_obj = Path(file_path)
-            if not file_path_obj.exists():
+        local_file = storage.local_file(file_path)
+        if local_file is not None:
+            if not await aiofiles.os.path.isfile(local_file):
                 raise HTTPException(status_code=404, detail="文件不存在")
-            
-            with open(file_path_obj, "rb") as f:
-                return f.read()
-                
-        except Exception as e:
-            self.logger.error(f"下载文件失败: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"下载文件失败: {str(e)}")
-    
-    async def delete_file(self, file_path: str) -> bool:
+            size = None
+        else:
+            size = await storage.stat(file_path)
+            if size is None:
+                raise HTTPException(status_code=404, detail="文件不存在")
+
+        headers = {"Cache-Control": cache_control}
+        if file_hash:
+            etag = f'"{file_hash}"'
+            headers["ETag"] = etag
+            if if_none_match and self._etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers=headers)
+
+        if local_file is not None:
+            return FileResponse(
+                local_file,
+                filename=filename,
+                headers=headers,
+                content_disposition_type="attachment",
+            )
+
+        if filename:
+            headers["Content-Disposition"] = f"attachment; filename*=utf-8''{quote(filename)}"
+        headers["Accept-Ranges"] = "bytes"
+        media_type = mimetypes.guess_type(filename or file_path)[0] or "application/octet-stream"
+        byte_range = self._parse_range(range_header, size)
+        if byte_range is None:
+            headers["Content-Length"] = str(size)
+            return StreamingResponse(
+                storage.open(file_path), media_type=media_type, headers=headers
+            )
+
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            storage.open(file_path, start, end),
+            status_code=206,
+            media_type=media_type,
+            headers=headers,
+        )
+
+    @staticmethod
+    def _parse_range(range_header: str | None, size: int) -> tuple[int, int] | None:
+        """解析单区间 Range 请求头，无法满足或多区间时返回None（返回完整内容）"""
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", (range_header or "").strip())
+        if not match or match.groups() == ("", "") or size == 0:
+            return None
+        first, last = match.groups()
+        if first:
+            start, end = int(first), int(last) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1
+        if start > end or start >= size:
+            return None
+        return start, min(end, size - 1)
+
+    async def upload_response(
+        self, path: str, if_none_match: str | None = None, range_header: str | None = None
+    ) -> Response:
+        """
+        按相对路径返回上传目录中的文件（替代 /uploads 静态目录）
+
+        内容寻址的文件（blobs/）内容不会改变，可被长期缓存。
+
+        Args:
+            path: 相对上传目录的路径
+            if_none_match: 请求头 If-None-Match
+            range_header: 请求头 Range
+
+        Returns:
+            Response: 文件响应
+        """
+        relative = Path(path)
+        parts = relative.parts
+        # 绝对路径（如 //etc/passwd）与 joinpath 拼接时会丢弃上传目录，必须拒绝
+        if (
+            not parts
+            or relative.is_absolute()
+            or parts[0] in PRIVATE_UPLOAD_DIRS
+            or any(p in ("..", "", "/") or p.startswith((".", "/", "\\")) for p in parts)
+        ):
+            raise HTTPException(status_code=404, detail="文件不存在")
+        root = self.uploads_dir.resolve()
+        target = self.uploads_dir.joinpath(*parts)
+        if not target.resolve().is_relative_to(root):
+            raise HTTPException(status_code=404, detail="文件不存在")
+
+        if parts[0] == BLOBS_DIR:
+            file_hash = Path(parts[-1]).name.split(".")[0]
+            cache_control = "public, max-age=31536000, immutable"
+        else:
+            file_hash, cache_control = None, "public, no-cache"
+        # 不传文件名，图片等内容在浏览器中直接显示而不是作为附件下载
+        return await self.file_response(
+            str(target),
+            file_hash=file_hash,
+            if_none_match=if_none_match,
+            cache_control=cache_control,
+            range_header=range_header,
+        )
+
+    @staticmethod
+    def _etag_matches(if_none_match: str, etag: str) -> bool:
+        """按弱比较规则判断 If-None-Match 是否命中"""
+        if if_none_match.strip() == "*":
+            return True
+        candidates = (tag.strip() for tag in if_none_match.split(","))
+        return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+    async def delete_file(
+        self, file_path: str, file_id: str | None = None, user_id: int | None = None
+    ) -> bool:
         """
-        删除文件
-        
+        删除对文件的一次引用，最后一个引用删除时才删除存储文件
+
+        相同内容的文件共用一个存储文件，映射可能属于其他用户，
+        因此必须指定文件ID或所属用户，不会删除任意一条映射。
+
         Args:
             file_path: 文件路径
-            
+            file_id: 要删除的文件ID
+            user_id: 所属用户ID，未指定文件ID时删除该用户对此路径最新的一条映射
+
         Returns:
             bool: 是否删除成功
         """
+        if file_id is None and user_id is None:
+            self.logger.error(f"删除文件需指定文件ID或所属用户: {file_path}")
+            return False
         try:
+            if not await file_mapping_repository.delete_reference(
+                file_path, file_id, user_id
+            ):
+                self.logger.warning(f"未找到可删除的文件引用: {file_path}")
+                return False
+            remaining = await file_mapping_repository.count_references(file_path)
+            if remaining:
+                self.logger.info(f"文件仍有 {remaining} 个引用，保留: {file_path}")
+                return True
+
             file_path_obj = Path(file_path)
-            if file_path_obj.exists():
-                file_path_obj.unlink()
-                self.logger.info(f"已删除文件: {file_path}")
+            # 先移走再复查引用，避免与同内容的并发上传竞争
+            tombstone = str(file_path_obj.with_name(f".{file_path_obj.name}.deleting"))
+            try:
+                await storage.move(file_path, tombstone)
+            except FileNotFoundError:
+                return False
+
+            if await file_mapping_repository.count_references(file_path):
+                await storage.move(tombstone, file_path)
                 return True
-            return False
-            
+
+            await storage.delete(tombstone)
+            # 同目录下由该文件生成的缩略图（<哈希>_<尺寸>.webp）
+            variant_prefix = str(file_path_obj.with_name(f"{file_path_obj.stem}_"))
+            for variant in await storage.list(variant_prefix):
+                if variant.endswith(".webp"):
+                    await storage.delete(variant)
+            self.logger.info(f"已删除文件: {file_path}")
+            return True
+
         except Exception as e:
             self.logger.error(f"删除文件失败: {str(e)}")
             return False
@@ -0,0 +1,126 @@
+"""图片服务层 - 头像缩略图生成"""
+
+import asyncio
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from log import logger
+from settings import settings
+from utils.storage import storage
+
+THUMBNAIL_SIZES = (32, 64, 128)  # 头像缩略图边长（像素）
+THUMBNAIL_QUALITY = 80
+MAX_IMAGE_PIXELS = 40_000_000  # 解码前拒绝超大尺寸的图片
+
+
+def thumbnail_path(source: str | Path, size: int) -> Path:
+    """缩略图与原图放在同一目录：<哈希>.png -> <哈希>_64.webp"""
+    source = Path(source)
+    return source.with_name(f"{source.stem}_{size}.webp")
+
+
+def avatar_url(file_hash: str, size: int | None = None) -> str:
+    """头像地址，内容不变，可被长期缓存"""
+    url = f"/api/v1/avatars/{file_hash}"
+    return f"{url}?size={size}" if size else url
+
+
+def render_thumbnails(source: str, sizes: tuple[int, ...]) -> list[str]:
+    """
+    生成正方形WebP缩略图（在进程池中执行）
+
+    JPEG 以 draft 模式按目标尺寸缩小解码，大图的解码开销随之下降；
+    先按 EXIF 方向旋转，再居中裁剪为正方形。已存在的缩略图不重复生成。
+
+    Args:
+        source: 原图路径
+        sizes: 缩略图边长
+
+    Returns:
+        list[str]: 缩略图路径
+    """
+    from PIL import Image, ImageOps
+
+    targets = {size: thumbnail_path(source, size) for size in sizes}
+    pending = sorted((s for s, p in targets.items() if not p.exists()), reverse=True)
+    if not pending:
+        return [str(p) for p in targets.values()]
+
+    with Image.open(source) as image:
+        if image.width * image.height > MAX_IMAGE_PIXELS:
+            raise ValueError(f"图片尺寸过大: {image.width}x{image.height}")
+        image.draft("RGB", (pending[0], pending[0]))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+        for size in pending:
+            thumb = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            tmp_path = targets[size].with_name(f".{uuid.uuid4().hex}.webp")
+            try:
+                thumb.save(tmp_path, "WEBP", quality=THUMBNAIL_QUALITY, method=4)
+                os.replace(tmp_path, targets[size])
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+
+    return [str(p) for p in targets.values()]
+
+
+class ImageService:
+    """图片服务类 - 在独立的进程池中生成缩略图，不占用事件循环"""
+
+    def __init__(self):
+        self.logger = logger
+        self._executor: ProcessPoolExecutor | None = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+        return self._executor
+
+    async def generate_thumbnails(
+        self, file_path: str, sizes: tuple[int, ...] = THUMBNAIL_SIZES
+    ) -> dict[int, str]:
+        """
+        为图片生成全部尺寸的缩略图
+
+        Args:
+            file_path: 原图存储键
+            sizes: 缩略图边长
+
+        Returns:
+            dict[int, str]: 边长 -> 缩略图存储键
+        """
+        source = await storage.local_path(file_path)
+        loop = asyncio.get_running_loop()
+        rendered = await loop.run_in_executor(
+            self._get_executor(), render_thumbnails, str(source), tuple(sizes)
+        )
+
+        # 本地存储下缩略图已在原图旁；远程存储则把本地缓存中的缩略图上传
+        keys = {}
+        for size, path in zip(sizes, rendered):
+            keys[size] = str(thumbnail_path(file_path, size))
+            if Path(path) != Path(keys[size]):
+                await storage.save(keys[size], Path(path))
+        self.logger.info(f"已生成缩略图: {file_path}")
+        return keys
+
+    async def ensure_thumbnail(self, file_path: str, size: int) -> str:
+        """获取缩略图存储键，不存在时（如历史头像）先生成"""
+        key = str(thumbnail_path(file_path, size))
+        if not await storage.exists(key):
+            await self.generate_thumbnails(file_path)
+        return key
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+# 全局实例
+image_service = ImageService()
@@ -0,0 +1,301 @@
+"""排行榜服务层 - 基于Redis有序集合的排名查询"""
+
+from collections.abc import Iterable
+from typing import Any
+
+from redis.exceptions import WatchError
+from tortoise.expressions import Q
+
+from log import logger
+from models.admin import User
+from models.games import GameStats
+from utils.cache import cache_manager, cached_many, user_tag
+
+LEADERBOARD_KEY_PREFIX = "leaderboard"
+LEADERBOARD_TTL = 24 * 3600  # 排行榜及其就绪标记的过期时间（秒），每次同步时刷新
+REBUILD_PAGE_SIZE = 5000
+REBUILD_LOCK_TTL = 60  # 重建锁过期时间（秒）
+REBUILD_MERGE_RETRIES = 5  # 合并重建期间的写入时因并发写入而重试的次数
+
+# 有序集合的分数 = ELO * 2^32 + (2^32 - 1 - 用户ID)：同分时用户ID小的排在前面，
+# 与数据库查询的排序 (-elo_score, user_id) 一致
+_TIE_BREAK_SPAN = 2**32
+
+
+def board_score(elo_score: int, user_id: int) -> int:
+    """排行榜有序集合中的分数"""
+    return elo_score * _TIE_BREAK_SPAN + (_TIE_BREAK_SPAN - 1 - user_id)
+
+
+def board_elo(score: float) -> int:
+    """由有序集合中的分数还原ELO"""
+    return int(score) // _TIE_BREAK_SPAN
+
+
+@cached_many("user_card", ttl=300, tags=lambda user_id: [user_tag(user_id)])
+async def _user_cards(user_ids: list[int]) -> dict[int, dict[str, Any]]:
+    """排行榜展示的用户信息，按用户缓存，未命中的用户合并为一次查询"""
+    return {
+        u["id"]: u
+        for u in await User.filter(id__in=user_ids).values(
+            "id", "username", "nickname", "avatar"
+        )
+    }
+
+
+class LeaderboardService:
+    """排行榜服务类 - 将 GameStats 排名镜像到Redis有序集合
+
+    每个 (game_type, ranking_id) 对应一个有序集合，成员为用户ID、分数为 board_score。
+    名次、前N名和上下邻近查询均为 O(log n)，同分时按用户ID排序，
+    与退化的数据库查询给出相同的名次；
+    Redis不可用（含熔断）时退化为数据库查询，排行榜未加载时从数据库重建。
+
+    评分变化总是写入有序集合，带有 <键>:ready 标记的排行榜才视为已加载；
+    重建完成时把重建期间写入的成员合并到新排行榜，这些更新不会丢失。
+    """
+
+    def __init__(self):
+        self.logger = logger
+
+    @staticmethod
+    def board_key(game_type: str, ranking_id: int = 0) -> str:
+        return f"{LEADERBOARD_KEY_PREFIX}:{game_type}:{ranking_id}"
+
+    @staticmethod
+    def ready_key(key: str) -> str:
+        """排行榜已完整加载的标记"""
+        return f"{key}:ready"
+
+    async def sync_stats(self, stats: Iterable[GameStats]) -> None:
+        """
+        将评分变化通过pipeline批量写入排行榜
+
+        未加载或正在重建的排行榜同样写入，重建完成时合并，不需要先判断是否已加载。
+        """
+        redis = cache_manager.client()
+        stats = list(stats)
+        if not redis or not stats:
+            return
+
+        try:
+            pipe = redis.pipeline(transaction=False)
+            keys = set()
+            for stat in stats:
+                key = self.board_key(stat.game_type, stat.ranking_id)
+                pipe.zadd(key, {str(stat.user_id): board_score(stat.elo_score, stat.user_id)})
+                keys.add(key)
+            for key in keys:
+                pipe.expire(key, LEADERBOARD_TTL)
+                pipe.expire(self.ready_key(key), LEADERBOARD_TTL)
+            await pipe.execute()
+        except Exception as e:
+            cache_manager.report_failure("同步排行榜失败", e)
+        else:
+            cache_manager.report_success()
+
+    async def rebuild(self, game_type: str, ranking_id: int = 0) -> int:
+        """
+        从数据库重建排行榜
+
+        先写入临时键，完成后合并重建期间同步写入的成员并通过 RENAME 原子替换，
+        重建期间读请求退化为数据库查询。
+
+        Returns:
+            int: 写入的成员数；其他进程正在重建（未获得锁）时返回 -1
+        """
+        redis = cache_manager.client()
+        if not redis:
+            return 0
+
+        key = self.board_key(game_type, ranking_id)
+        lock_name = f"{key}:rebuild_lock"
+        token = await cache_manager.acquire_lock(lock_name, REBUILD_LOCK_TTL)
+        if token is None:
+            return -1
+
+        staging_key = f"{key}:rebuilding"
+        total = 0
+        try:
+            await redis.delete(staging_key)
+            last_id = 0
+            while True:
+                rows = (
+                    await GameStats.filter(
+                        game_type=game_type, ranking_id=ranking_id, id__gt=last_id
+                    )
+                    .order_by("id")
+                    .limit(REBUILD_PAGE_SIZE)
+                    .values_list("id", "user_id", "elo_score")
+                )
+                if not rows:
+                    break
+                await redis.zadd(
+                    staging_key,
+                    {str(user_id): board_score(elo, user_id) for _, user_id, elo in rows},
+                )
+                total += len(rows)
+                last_id = rows[-1][0]
+
+            if total:
+                await self._publish(redis, key, staging_key)
+            self.logger.info(f"排行榜已重建: {key}, 共{total}名")
+            return total
+        finally:
+            await cache_manager.release_lock(lock_name, token)
+
+    async def _publish(self, redis, key: str, staging_key: str) -> None:
+        """
+        合并重建期间写入 key 的成员（比数据库分页读取的值更新）后替换排行榜
+
+        WATCH key：读取与替换之间有新的写入时放弃本次替换并重新合并。
+        """
+        async with redis.pipeline(transaction=True) as pipe:
+            for _ in range(REBUILD_MERGE_RETRIES):
+                try:
+                    await pipe.watch(key)
+                    updates = await pipe.zrange(key, 0, -1, withscores=True)
+                    pipe.multi()
+                    if updates:
+                        pipe.zadd(staging_key, dict(updates))
+                    pipe.rename(staging_key, key)
+                    pipe.expire(key, LEADERBOARD_TTL)
+                    pipe.set(self.ready_key(key), "1", ex=LEADERBOARD_TTL)
+                    await pipe.execute()
+                    return
+                except WatchError:
+                    continue
+        raise WatchError(f"排行榜写入频繁，合并重建结果失败: {key}")
+
+    async def _ensure_board(self, game_type: str, ranking_id: int) -> bool:
+        """
+        确保排行榜已加载；返回是否可以从Redis读取
+
+        其他进程正在重建时排行榜尚不存在，本次查询退化为数据库查询。
+        """
+        redis = cache_manager.client()
+        if not redis:
+            return False
+        key = self.board_key(game_type, ranking_id)
+        try:
+            if await redis.exists(key, self.ready_key(key)) == 2:
+                return True
+            return await self.rebuild(game_type, ranking_id) > 0
+        except Exception as e:
+            cache_manager.report_failure("排行榜加载失败，退化为数据库查询", e)
+            return False
+
+    async def _board_range(
+        self, game_type: str, ranking_id: int, start: int, stop: int
+    ) -> list | None:
+        """从Redis读取名次区间 [start, stop]（从0开始）；不可用时返回None"""
+        if not await self._ensure_board(game_type, ranking_id):
+            return None
+        redis = cache_manager.client()
+        if not redis:
+            return None
+        try:
+            entries = await redis.zrevrange(
+                self.board_key(game_type, ranking_id), start, stop, withscores=True
+            )
+        except Exception as e:
+            cache_manager.report_failure("读取排行榜失败，退化为数据库查询", e)
+            return None
+        cache_manager.report_success()
+        return [(member, board_elo(score)) for member, score in entries]
+
+    async def top(
+        self, game_type: str, ranking_id: int = 0, limit: int = 10
+    ) -> list[dict[str, Any]]:
+        """获取前N名"""
+        entries = await self._board_range(game_type, ranking_id, 0, limit - 1)
+        if entries is not None:
+            return await self._with_users(entries, start_rank=1)
+
+        rows = (
+            await GameStats.filter(game_type=game_type, ranking_id=ranking_id)
+            .order_by("-elo_score", "user_id")
+            .limit(limit)
+            .values_list("user_id", "elo_score")
+        )
+        return await self._with_users(rows, start_rank=1)
+
+    async def get_rank(
+        self, user_id: int, game_type: str, ranking_id: int = 0
+    ) -> dict[str, Any] | None:
+        """获取用户名次（从1开始，同分时用户ID小的在前）"""
+        redis = None
+        if await self._ensure_board(game_type, ranking_id):
+            redis = cache_manager.client()
+        if redis:
+            key = self.board_key(game_type, ranking_id)
+            try:
+                pipe = redis.pipeline(transaction=False)
+                pipe.zrevrank(key, str(user_id))
+                pipe.zscore(key, str(user_id))
+                rank, score = await pipe.execute()
+            except Exception as e:
+                cache_manager.report_failure("读取排行榜失败，退化为数据库查询", e)
+            else:
+                cache_manager.report_success()
+                if rank is None:
+                    return None
+                return {"user_id": user_id, "rank": rank + 1, "elo_score": board_elo(score)}
+
+        stat = await GameStats.filter(
+            user_id=user_id, game_type=game_type, ranking_id=ranking_id
+        ).first()
+        if not stat:
+            return None
+        higher = await GameStats.filter(
+            Q(elo_score__gt=stat.elo_score)
+            | Q(elo_score=stat.elo_score, user_id__lt=user_id),
+            game_type=game_type,
+            ranking_id=ranking_id,
+        ).count()
+        return {"user_id": user_id, "rank": higher + 1, "elo_score": stat.elo_score}
+
+    async def around(
+        self, user_id: int, game_type: str, ranking_id: int = 0, radius: int = 5
+    ) -> list[dict[str, Any]]:
+        """获取用户上下各 radius 名的邻近排名"""
+        me = await self.get_rank(user_id, game_type, ranking_id)
+        if not me:
+            return []
+
+        start = max(me["rank"] - 1 - radius, 0)
+        stop = me["rank"] - 1 + radius
+        entries = await self._board_range(game_type, ranking_id, start, stop)
+        if entries is not None:
+            return await self._with_users(entries, start_rank=start + 1)
+
+        rows = (
+            await GameStats.filter(game_type=game_type, ranking_id=ranking_id)
+            .order_by("-elo_score", "user_id")
+            .offset(start)
+            .limit(stop - start + 1)
+            .values_list("user_id", "elo_score")
+        )
+        return await self._with_users(rows, start_rank=start + 1)
+
+    async def _with_users(
+        self, entries: list, start_rank: int
+    ) -> list[dict[str, Any]]:
+        """补充用户名等展示信息（批量读取缓存，未命中的用户单次查询）"""
+        user_ids = [int(member) for member, _ in entries]
+        users = await _user_cards(user_ids)
+        return [
+            {
+                "rank": start_rank + offset,
+                "user_id": user_id,
+                "username": users.get(user_id, {}).get("username"),
+                "nickname": users.get(user_id, {}).get("nickname"),
+                "avatar": users.get(user_id, {}).get("avatar"),
+                "elo_score": int(score),
+            }
+            for offset, (user_id, (_, score)) in enumerate(zip(user_ids, entries))
+        ]
+
+
+# 全局实例
+leaderboard_service = LeaderboardService()
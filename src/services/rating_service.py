@@ -0,0 +1,358 @@
+"""评分服务层 - 批量ELO计算与回写"""
+
+from collections import defaultdict
+from collections.abc import Hashable, Sequence
+
+import numpy as np
+from tortoise.expressions import Subquery
+from tortoise.transactions import in_transaction
+
+from log import logger
+from models.games import AICode, Battle, BattlePlayer, GameStats
+from schemas.games import BattleOutcome, BattleStatus
+from services.leaderboard_service import leaderboard_service
+
+DEFAULT_ELO = 1200
+DEFAULT_K_FACTOR = 32.0
+
+_OUTCOME_SCORES = {
+    BattleOutcome.WIN.value: 1.0,
+    BattleOutcome.DRAW.value: 0.5,
+    BattleOutcome.LOSS.value: 0.0,
+}
+
+
+def elo_pair_deltas(
+    ratings_i: np.ndarray,
+    ratings_j: np.ndarray,
+    scores_i: np.ndarray,
+    k_factors: np.ndarray | float,
+) -> np.ndarray:
+    """
+    向量化计算每个对局对中选手i的ELO变化（选手j的变化为其相反数）
+
+    Args:
+        ratings_i: 选手i的赛前评分
+        ratings_j: 选手j的赛前评分
+        scores_i: 选手i的得分（1=胜, 0.5=平, 0=负）
+        k_factors: K因子（标量或逐对数组）
+
+    Returns:
+        np.ndarray: 选手i的评分变化
+    """
+    expected_i = 1.0 / (1.0 + np.power(10.0, (ratings_j - ratings_i) / 400.0))
+    return k_factors * (scores_i - expected_i)
+
+
+def battle_elo_changes(
+    battles: Sequence[Sequence[tuple[Hashable, str]]],
+    ratings: dict[Hashable, float],
+    k_factor: float = DEFAULT_K_FACTOR,
+) -> list[list[int]]:
+    """
+    计算一批对战中每个参与者的ELO变化
+
+    一批对战视为一个评分周期：所有变化都基于批次开始前的评分，
+    与对战在批内的顺序无关，因此可以一次性向量化计算。
+    多人对战拆分为两两对局，K因子按 1/(人数-1) 缩放。
+
+    Args:
+        battles: 每场对战的 (评分主体, 结果) 列表
+        ratings: 评分主体的当前评分
+        k_factor: K因子
+
+    Returns:
+        list[list[int]]: 与 battles 结构对应的整数评分变化
+    """
+    slots_i: list[int] = []
+    slots_j: list[int] = []
+    subjects_i: list[Hashable] = []
+    subjects_j: list[Hashable] = []
+    scores_i: list[float] = []
+    weights: list[float] = []
+
+    offsets = []
+    slot = 0
+    for participants in battles:
+        offsets.append(slot)
+        n = len(participants)
+        for a in range(n):
+            for b in range(a + 1, n):
+                subject_a, outcome_a = participants[a]
+                subject_b, outcome_b = participants[b]
+                score_a = _OUTCOME_SCORES.get(outcome_a)
+                score_b = _OUTCOME_SCORES.get(outcome_b)
+                if score_a is None or score_b is None:
+                    continue
+                slots_i.append(slot + a)
+                slots_j.append(slot + b)
+                subjects_i.append(subject_a)
+                subjects_j.append(subject_b)
+                # 两两比较：得分高者视为胜，相同视为平
+                scores_i.append(0.5 + 0.5 * np.sign(score_a - score_b))
+                weights.append(k_factor / (n - 1))
+        slot += n
+
+    slot_deltas = np.zeros(slot, dtype=np.float64)
+    if slots_i:
+        deltas = elo_pair_deltas(
+            np.array([ratings[s] for s in subjects_i], dtype=np.float64),
+            np.array([ratings[s] for s in subjects_j], dtype=np.float64),
+            np.array(scores_i, dtype=np.float64),
+            np.array(weights, dtype=np.float64),
+        )
+        np.add.at(slot_deltas, np.array(slots_i), deltas)
+        np.subtract.at(slot_deltas, np.array(slots_j), deltas)
+
+    rounded = np.rint(slot_deltas).astype(np.int64).tolist()
+    return [
+        rounded[offset : offset + len(participants)]
+        for offset, participants in zip(offsets, battles)
+    ]
+
+
+class RatingService:
+    """评分服务类 - 按批消费已结束的对战并批量回写ELO
+
+    尚未计算评分的对战以 BattlePlayer.initial_elo 为空作为标记。
+    每批的评分变化在内存中计算，回写时每张表只执行一次批量UPDATE。
+    """
+
+    def __init__(self, k_factor: float = DEFAULT_K_FACTOR):
+        self.k_factor = k_factor
+        self.logger = logger
+
+    async def process_pending(
+        self, batch_size: int = 1000, max_batches: int | None = None
+    ) -> dict[str, int]:
+        """
+        处理所有待计算评分的对战
+
+        Args:
+            batch_size: 每批对战数
+            max_batches: 最多处理的批次数
+
+        Returns:
+            dict: 处理的批次数和对战数
+        """
+        batches = battles = 0
+        while max_batches is None or batches < max_batches:
+            processed = await self.process_batch(batch_size)
+            if not processed:
+                break
+            batches += 1
+            battles += processed
+
+        if battles:
+            self.logger.info(f"ELO计算完成: {batches} 批, {battles} 场对战")
+        return {"batches": batches, "battles": battles}
+
+    async def process_batch(self, batch_size: int = 1000) -> int:
+        """
+        处理一批待计算评分的对战，返回认领的对战数
+
+        整批在一个事务中完成：对战行以 SKIP LOCKED 认领，并发的批次取到不同的对战；
+        参与者的 GameStats / AICode 行加锁后才读取评分，并发批次对同一选手的
+        读取和回写依次进行，不会互相覆盖。
+        """
+        async with in_transaction():
+            battles = (
+                await Battle.filter(
+                    status=BattleStatus.FINISHED.value,
+                    id__in=Subquery(
+                        BattlePlayer.filter(initial_elo__isnull=True).values("battle_id")
+                    ),
+                )
+                .order_by("id")
+                .limit(batch_size)
+                .select_for_update(skip_locked=True)
+            )
+            if not battles:
+                return 0
+            claimed = len(battles)
+
+            players_by_battle: dict[int, list[BattlePlayer]] = defaultdict(list)
+            for player in await BattlePlayer.filter(
+                battle_id__in=[b.id for b in battles]
+            ).order_by("battle_id", "position"):
+                players_by_battle[player.battle_id].append(player)
+            # 认领前已被其他批次计算并提交的对战
+            battles = [
+                b
+                for b in battles
+                if any(p.initial_elo is None for p in players_by_battle[b.id])
+            ]
+            if not battles:
+                return claimed
+
+            ai_codes = {
+                code.id: code
+                for code in await AICode.filter(
+                    id__in={
+                        p.selected_ai_code_id
+                        for b in battles
+                        for p in players_by_battle[b.id]
+                        if p.selected_ai_code_id
+                    }
+                )
+                .order_by("id")
+                .select_for_update()
+            }
+
+            # 确定每场对战的游戏类型，用于定位 GameStats
+            battle_game_types: dict[int, str | None] = {}
+            for battle in battles:
+                game_type = (battle.results or {}).get("game_type")
+                if not game_type:
+                    game_type = next(
+                        (
+                            ai_codes[p.selected_ai_code_id].game_type
+                            for p in players_by_battle[battle.id]
+                            if p.selected_ai_code_id in ai_codes
+                        ),
+                        None,
+                    )
+                battle_game_types[battle.id] = game_type
+
+            stats = await self._load_game_stats(battles, players_by_battle, battle_game_types)
+
+            rated = [
+                b
+                for b in battles
+                if not b.is_elo_exempt and battle_game_types[b.id] is not None
+            ]
+            rated_ids = {b.id for b in rated}
+
+            # 玩家（GameStats）评分
+            player_changes = battle_elo_changes(
+                [
+                    [
+                        (self._stats_key(b, p, battle_game_types), p.outcome)
+                        for p in players_by_battle[b.id]
+                    ]
+                    for b in rated
+                ],
+                {key: s.elo_score for key, s in stats.items()},
+                self.k_factor,
+            )
+            # AI代码评分
+            code_changes = battle_elo_changes(
+                [
+                    [
+                        (p.selected_ai_code_id, p.outcome)
+                        for p in players_by_battle[b.id]
+                        if p.selected_ai_code_id in ai_codes
+                    ]
+                    for b in rated
+                ],
+                {code_id: code.elo_score for code_id, code in ai_codes.items()},
+                self.k_factor,
+            )
+
+            changed_players: list[BattlePlayer] = []
+            stats_deltas: dict[tuple, int] = defaultdict(int)
+            code_deltas: dict[int, int] = defaultdict(int)
+
+            for battle, changes, codes in zip(rated, player_changes, code_changes):
+                coded = [
+                    p for p in players_by_battle[battle.id] if p.selected_ai_code_id in ai_codes
+                ]
+                for player, change in zip(players_by_battle[battle.id], changes):
+                    key = self._stats_key(battle, player, battle_game_types)
+                    player.initial_elo = stats[key].elo_score
+                    player.elo_change = change
+                    stats_deltas[key] += change
+                for player, change in zip(coded, codes):
+                    code_deltas[player.selected_ai_code_id] += change
+
+            # 豁免或无法确定游戏类型的对战：记录赛前评分，变化为0
+            for battle in battles:
+                if battle.id in rated_ids:
+                    continue
+                for player in players_by_battle[battle.id]:
+                    key = self._stats_key(battle, player, battle_game_types)
+                    player.initial_elo = stats[key].elo_score if key in stats else DEFAULT_ELO
+                    player.elo_change = 0
+
+            for battle in battles:
+                changed_players.extend(players_by_battle[battle.id])
+
+            changed_stats = []
+            for key, delta in stats_deltas.items():
+                stat = stats[key]
+                stat.elo_score += delta
+                stat.best_elo = max(stat.best_elo, stat.elo_score)
+                changed_stats.append(stat)
+
+            changed_codes = []
+            for code_id, delta in code_deltas.items():
+                ai_codes[code_id].elo_score += delta
+                changed_codes.append(ai_codes[code_id])
+
+            await BattlePlayer.bulk_update(
+                changed_players, fields=["initial_elo", "elo_change"]
+            )
+            if changed_stats:
+                await GameStats.bulk_update(changed_stats, fields=["elo_score", "best_elo"])
+            if changed_codes:
+                await AICode.bulk_update(changed_codes, fields=["elo_score"])
+
+
+        await leaderboard_service.sync_stats(changed_stats)
+        return claimed
+
+    @staticmethod
+    def _stats_key(
+        battle: Battle, player: BattlePlayer, battle_game_types: dict[int, str | None]
+    ) -> tuple:
+        return (player.user_id, battle_game_types[battle.id], battle.ranking_id)
+
+    async def _load_game_stats(
+        self,
+        battles: list[Battle],
+        players_by_battle: dict[int, list[BattlePlayer]],
+        battle_game_types: dict[int, str | None],
+    ) -> dict[tuple, GameStats]:
+        """批量读取并锁定参与者的 GameStats（按ID顺序加锁），不存在的批量创建"""
+        keys = {
+            self._stats_key(b, p, battle_game_types)
+            for b in battles
+            if battle_game_types[b.id] is not None
+            for p in players_by_battle[b.id]
+        }
+        if not keys:
+            return {}
+
+        async def fetch() -> dict[tuple, GameStats]:
+            rows = (
+                await GameStats.filter(
+                    user_id__in={k[0] for k in keys},
+                    game_type__in={k[1] for k in keys},
+                    ranking_id__in={k[2] for k in keys},
+                )
+                .order_by("id")
+                .select_for_update()
+            )
+            return {
+                key: row
+                for row in rows
+                if (key := (row.user_id, row.game_type, row.ranking_id)) in keys
+            }
+
+        stats = await fetch()
+        missing = keys - stats.keys()
+        if missing:
+            await GameStats.bulk_create(
+                [
+                    GameStats(user_id=user_id, game_type=game_type, ranking_id=ranking_id)
+                    for user_id, game_type, ranking_id in missing
+                ],
+                ignore_conflicts=True,
+            )
+            stats = await fetch()
+        return stats
+
+
+# 全局实例
+rating_service = RatingService()
+
@@ -0,0 +1,246 @@
+"""模拟服务层 - 并行蒙特卡洛自对弈与强度估计"""
+
+import asyncio
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+from tortoise.transactions import in_transaction
+
+from log import logger
+from models.games import AICode
+from utils.storage import storage
+
+DEFAULT_CHUNK_SIZE = 20  # 每个进程任务包含的对局数
+DEFAULT_Z = 1.96  # 95% 置信水平
+
+
+def wilson_interval(
+    score: float, games: int, z: float = DEFAULT_Z
+) -> tuple[float, float]:
+    """
+    计算得分率的Wilson置信区间
+
+    Args:
+        score: 累计得分（胜=1, 平=0.5, 负=0）
+        games: 对局数
+        z: 正态分位数
+
+    Returns:
+        tuple: (下限, 上限)
+    """
+    if games <= 0:
+        return 0.0, 1.0
+    p = score / games
+    denominator = 1 + z * z / games
+    center = (p + z * z / (2 * games)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games))
+    margin /= denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def _open_bot(bot: dict):
+    from games.sandbox import BaselineBotPool, BotWorkerPool
+
+    if bot.get("baseline"):
+        return BaselineBotPool(bot["baseline"])
+    return BotWorkerPool(bot["file_path"], size=1, file_hash=bot["file_hash"])
+
+
+def _simulate_rps_chunk(
+    bot1: dict, bot2: dict, seeds: list[int], rounds: int
+) -> dict[str, int]:
+    """
+    在进程池中运行一组石头剪刀布对局
+
+    每个种子对应一局；开局前由种子为双方派生种子，分别重置基线AI所在进程
+    和AI代码工作进程的随机数，上传的AI代码使用 random 时结果同样可复现。
+    """
+    from games.sandbox import play_rps_match
+
+    wins = losses = draws = 0
+    with _open_bot(bot1) as pool1, _open_bot(bot2) as pool2:
+        for seed in seeds:
+            result = play_rps_match(pool1, pool2, rounds=rounds, seed=seed)
+            if result["player1_wins"] > result["player2_wins"]:
+                wins += 1
+            elif result["player1_wins"] < result["player2_wins"]:
+                losses += 1
+            else:
+                draws += 1
+    return {"wins": wins, "losses": losses, "draws": draws}
+
+
+# 各游戏的批量模拟函数（需为模块级函数以便跨进程调用）
+SIMULATION_RUNNERS = {
+    "rock_paper_scissors": _simulate_rps_chunk,
+}
+
+
+class SimulationService:
+    """模拟服务类 - 在多核上并行运行两个AI之间的种子对局
+
+    对局按块提交到进程池，并按提交顺序汇总：
+    得分率置信区间收窄到目标精度时提前停止，
+    因此相同的种子和参数总会在同一局数处停止，结果可复现。
+    """
+
+    def __init__(self):
+        self.logger = logger
+
+    async def simulate(
+        self,
+        bot1: int | str,
+        bot2: int | str,
+        game_type: str = "rock_paper_scissors",
+        games: int = 1000,
+        rounds_per_game: int = 100,
+        precision: float = 0.02,
+        min_games: int = 100,
+        seed: int = 0,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_workers: int | None = None,
+        write_back: bool = True,
+    ) -> dict[str, Any]:
+        """
+        模拟 bot1 与 bot2 之间最多 games 局对局
+
+        Args:
+            bot1: AI代码ID，或基线AI名称（如 "random"）
+            bot2: AI代码ID，或基线AI名称
+            game_type: 游戏类型
+            games: 最多对局数
+            rounds_per_game: 每局回合数
+            precision: 置信区间半宽达到该值时提前停止
+            min_games: 提前停止前至少完成的对局数
+            seed: 起始种子，第 i 局使用 seed + i
+            chunk_size: 每个进程任务的对局数
+            max_workers: 并发进程数上限
+            write_back: 是否将胜/负/平写回 AICode
+
+        Returns:
+            dict: 以 bot1 视角的胜/负/平、得分率及置信区间
+        """
+        if game_type not in SIMULATION_RUNNERS:
+            raise ValueError(f"不支持的游戏类型: {game_type}")
+        if games <= 0 or chunk_size <= 0:
+            raise ValueError("对局数和块大小必须为正数")
+
+        payload1, code1 = await self._resolve_bot(bot1, game_type)
+        payload2, code2 = await self._resolve_bot(bot2, game_type)
+
+        runner = SIMULATION_RUNNERS[game_type]
+        chunks = [
+            list(range(seed + start, seed + min(start + chunk_size, games)))
+            for start in range(0, games, chunk_size)
+        ]
+
+        totals = {"wins": 0, "losses": 0, "draws": 0}
+        played = 0
+        stopped_early = False
+        loop = asyncio.get_running_loop()
+        limit = max_workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=limit) as executor:
+            futures = [
+                loop.run_in_executor(
+                    executor, runner, payload1, payload2, chunk, rounds_per_game
+                )
+                for chunk in chunks
+            ]
+            try:
+                for future, chunk in zip(futures, chunks):
+                    counts = await future
+                    for key in totals:
+                        totals[key] += counts[key]
+                    played += len(chunk)
+                    if played >= min_games and played < games:
+                        low, high = self._interval(totals, played)
+                        if (high - low) / 2 <= precision:
+                            stopped_early = True
+                            break
+            finally:
+                # 取消尚未开始的块，并等待已在运行的块结束后再关闭进程池
+                for future in futures:
+                    future.cancel()
+                await asyncio.gather(*futures, return_exceptions=True)
+
+        low, high = self._interval(totals, played)
+        summary = {
+            "game_type": game_type,
+            "bot1": bot1,
+            "bot2": bot2,
+            "games": played,
+            **totals,
+            "score_rate": (totals["wins"] + 0.5 * totals["draws"]) / played,
+            "confidence_interval": [low, high],
+            "stopped_early": stopped_early,
+            "seed": seed,
+        }
+
+        if write_back:
+            await self._write_back(code1, code2, totals)
+
+        self.logger.info(
+            f"模拟完成: {bot1} vs {bot2}, {played} 局, "
+            f"得分率 {summary['score_rate']:.3f} [{low:.3f}, {high:.3f}]"
+        )
+        return summary
+
+    @staticmethod
+    def _interval(totals: dict[str, int], played: int) -> tuple[float, float]:
+        return wilson_interval(totals["wins"] + 0.5 * totals["draws"], played)
+
+    async def _resolve_bot(
+        self, bot: int | str, game_type: str
+    ) -> tuple[dict, AICode | None]:
+        """将AI代码ID或基线名称解析为可跨进程传递的描述"""
+        from games.sandbox import BASELINE_BOTS
+
+        if isinstance(bot, str):
+            if bot not in BASELINE_BOTS:
+                raise ValueError(f"未知的基线AI: {bot}")
+            return {"baseline": bot}, None
+
+        code = await AICode.filter(id=bot).first()
+        if not code:
+            raise ValueError(f"AI代码不存在: {bot}")
+        if code.game_type != game_type:
+            raise ValueError(f"AI代码 {bot} 不属于游戏 {game_type}")
+        local_path = await storage.local_path(code.file_path)
+        return {"file_path": str(local_path), "file_hash": code.file_hash}, code
+
+    async def _write_back(
+        self, code1: AICode | None, code2: AICode | None, totals: dict[str, int]
+    ) -> None:
+        """在同一事务中累加双方的胜/负/平"""
+        deltas: dict[int, list[int]] = {}
+        if code1 is not None:
+            deltas[code1.id] = [totals["wins"], totals["losses"], totals["draws"]]
+        if code2 is not None:
+            mirrored = [totals["losses"], totals["wins"], totals["draws"]]
+            if code2.id in deltas:
+                # 自对弈：同一AI代码同时记入双方视角的结果
+                deltas[code2.id] = [a + b for a, b in zip(deltas[code2.id], mirrored)]
+            else:
+                deltas[code2.id] = mirrored
+        if not deltas:
+            return
+
+        async with in_transaction():
+            codes = await AICode.filter(id__in=list(deltas)).select_for_update()
+            for code in codes:
+                wins, losses, draws = deltas[code.id]
+                code.win_count += wins
+                code.loss_count += losses
+                code.draw_count += draws
+                code.total_games += wins + losses + draws
+                code.update_win_rate()
+            await AICode.bulk_update(
+                codes,
+                fields=["win_count", "loss_count", "draw_count", "total_games", "win_rate"],
+            )
+
+
+# 全局实例
+simulation_service = SimulationService()
@@ -0,0 +1,266 @@
+"""存储回收服务层 - 扫描上传目录，隔离或删除没有任何记录引用的孤儿文件"""
+
+import asyncio
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from pathlib import PurePosixPath
+from typing import Any
+
+from tortoise.expressions import Q
+
+from core.jobs import job_queue
+from log import logger
+from models.admin import FileMapping, MultipartUpload, User
+from models.games import AICode, AICodeVersion
+from settings import settings
+from utils.storage import StoredObject, storage
+
+JOB_KIND = "storage.reap"
+REAP_MODES = ("report", "quarantine", "delete")
+QUARANTINE_DIR = ".quarantine"  # 隔离区（uploads/.quarantine/<日期>/<原相对路径>）
+QUARANTINE_DATE_FORMAT = "%Y%m%d"
+SCAN_BATCH_SIZE = 1000
+REPORT_LIMIT = 100  # 报告中最多列出的孤儿文件数
+
+# 由原图生成的缩略图：<哈希>_<尺寸>.webp
+THUMBNAIL_PATTERN = re.compile(r"^([0-9a-f]{64})_\d+\.webp$")
+
+
+class StorageReaperService:
+    """存储回收服务类
+
+    上传失败的临时文件、被替换的头像、写入映射失败的文件等都会留在上传目录中。
+    回收时分批遍历目录，每批存储键一次性与 FileMapping / AICode / User.avatar
+    做集合比对，内存占用与目录大小无关。
+    """
+
+    def __init__(self):
+        self.logger = logger
+
+    @property
+    def prefix(self) -> str:
+        from services.file_service import file_service
+
+        return f"{file_service.uploads_dir}/"
+
+    async def reap(
+        self,
+        mode: str = "report",
+        grace_seconds: int | None = None,
+        report_limit: int = REPORT_LIMIT,
+    ) -> dict[str, Any]:
+        """
+        扫描上传目录并处理孤儿文件
+
+        Args:
+            mode: report 只生成报告；quarantine 移入隔离区；delete 直接删除
+            grace_seconds: 修改时间在该秒数内的文件不处理，默认 REAPER_GRACE_SECONDS
+            report_limit: 报告中最多列出的孤儿文件数
+
+        Returns:
+            dict: 回收报告
+        """
+        if mode not in REAP_MODES:
+            raise ValueError(f"不支持的回收模式: {mode}")
+        if grace_seconds is None:
+            grace_seconds = settings.REAPER_GRACE_SECONDS
+
+        now = time.time()
+        purge_before = (
+            datetime.now() - timedelta(days=settings.REAPER_QUARANTINE_DAYS)
+        ).strftime(QUARANTINE_DATE_FORMAT)
+        report: dict[str, Any] = {
+            "mode": mode,
+            "scanned": 0,
+            "orphans": 0,
+            "orphan_bytes": 0,
+            "quarantined": 0,
+            "deleted": 0,
+            "restored": 0,
+            "purged": 0,
+            "expired_sessions": await self._expire_multipart_sessions(mode),
+            "items": [],
+        }
+
+        async for batch in storage.scan(self.prefix, SCAN_BATCH_SIZE):
+            report["scanned"] += len(batch)
+            candidates = []
+            for obj in batch:
+                if now - obj.modified < grace_seconds:
+                    continue
+                parts = self._relative(obj.key)
+                if parts[0] != QUARANTINE_DIR:
+                    candidates.append(obj)
+                elif mode != "report" and len(parts) > 2 and parts[1] < purge_before:
+                    # 按移入隔离区的日期清理（移动不会改变本地文件的修改时间）
+                    await storage.delete(obj.key)
+                    report["purged"] += 1
+
+            for obj in await self._find_orphans(candidates):
+                report["orphans"] += 1
+                report["orphan_bytes"] += obj.size
+                if len(report["items"]) < report_limit:
+                    report["items"].append({"key": obj.key, "size": obj.size})
+                if mode != "report" and (outcome := await self._dispose(obj, mode)):
+                    report[outcome] += 1
+
+        if mode != "report":
+            await self._prune_empty_dirs()
+        self.logger.info(
+            f"存储回收完成({mode}): 扫描 {report['scanned']} 个文件，"
+            f"孤儿 {report['orphans']} 个共 {report['orphan_bytes']} 字节"
+        )
+        return report
+
+    async def run_job(self, payload: dict) -> dict[str, Any]:
+        """后台任务入口，报告中的文件列表不写入任务结果"""
+        report = await self.reap(
+            mode=payload.get("mode", settings.REAPER_MODE),
+            grace_seconds=payload.get("grace_seconds"),
+            report_limit=0,
+        )
+        report.pop("items")
+        return report
+
+    def _relative(self, key: str) -> tuple[str, ...]:
+        return PurePosixPath(key.replace("\\", "/")[len(self.prefix):]).parts or ("",)
+
+    async def _expire_multipart_sessions(self, mode: str) -> int:
+        """
+        过期未完成的分片上传会话：删除记录后其分片成为孤儿，在扫描中一并回收
+
+        合并超时（进程崩溃）的会话同样按过期时间回收，未过期前可由用户重新合并或取消。
+        """
+        from services.file_service import MULTIPART_ASSEMBLE_TIMEOUT
+
+        now = datetime.now()
+        expired = MultipartUpload.filter(
+            Q(status="uploading")
+            | Q(status="assembling", assembling_at__lt=now - MULTIPART_ASSEMBLE_TIMEOUT)
+            | Q(status="assembling", assembling_at=None),
+            expires_at__lt=now,
+        )
+        if mode == "report":
+            return await expired.count()
+        return await expired.delete()
+
+    async def _find_orphans(self, objects: list[StoredObject]) -> list[StoredObject]:
+        """
+        找出一批对象中的孤儿文件
+
+        按类型收集待查的存储键、哈希和上传ID，每类只查询一次数据库。
+        """
+        keys: dict[str, list[str]] = {}
+        thumbnails: dict[str, str] = {}
+        extracted: dict[str, str] = {}
+        multipart: dict[str, str] = {}
+        orphans: list[StoredObject] = []
+
+        from services.file_service import EXTRACTED_DIR, MULTIPART_DIR
+
+        for obj in objects:
+            parts = self._relative(obj.key)
+            name = parts[-1]
+            if len(parts) > 1 and parts[0] == MULTIPART_DIR:
+                multipart[obj.key] = parts[1]
+            elif len(parts) > 1 and parts[0] == EXTRACTED_DIR:
+                extracted[obj.key] = parts[1]
+            elif any(part.startswith(".") for part in parts):
+                # 上传临时文件、删除时的墓碑文件、缩略图临时文件
+                orphans.append(obj)
+            elif match := THUMBNAIL_PATTERN.match(name):
+                thumbnails[obj.key] = match.group(1)
+            else:
+                posix = obj.key.replace("\\", "/")
+                keys[obj.key] = [posix, posix.replace("/", "\\"), f"/{posix}"]
+
+        live_keys = await self._referenced_paths([k for ks in keys.values() for k in ks])
+        live_images = set(
+            await FileMapping.filter(file_hash__in=set(thumbnails.values()))
+            .values_list("file_hash", flat=True)
+        ) if thumbnails else set()
+        live_codes = set(
+            await AICode.filter(file_hash__in=set(extracted.values()))
+            .values_list("file_hash", flat=True)
+        ) if extracted else set()
+        live_sessions = set(
+            await MultipartUpload.filter(
+                upload_id__in=set(multipart.values()), status__in=["uploading", "assembling"]
+            ).values_list("upload_id", flat=True)
+        ) if multipart else set()
+
+        for obj in objects:
+            if obj.key in keys:
+                live = not live_keys.isdisjoint(keys[obj.key])
+            elif obj.key in thumbnails:
+                live = thumbnails[obj.key] in live_images
+            elif obj.key in extracted:
+                live = extracted[obj.key] in live_codes
+            elif obj.key in multipart:
+                live = multipart[obj.key] in live_sessions
+            else:
+                continue
+            if not live:
+                orphans.append(obj)
+        return orphans
+
+    async def _referenced_paths(self, paths: list[str]) -> set[str]:
+        """返回被任意记录引用的路径（头像可能带前导 / 或使用反斜杠）"""
+        if not paths:
+            return set()
+        found: set[str] = set()
+        for model, field in (
+            (FileMapping, "file_path"),
+            (AICode, "file_path"),
+            (AICodeVersion, "file_path"),
+            (User, "avatar"),
+        ):
+            found.update(
+                await model.filter(**{f"{field}__in": paths}).values_list(field, flat=True)
+            )
+        return found
+
+    async def _dispose(self, obj: StoredObject, mode: str) -> str | None:
+        """
+        隔离或删除孤儿文件
+
+        先移入隔离区再复查引用：扫描与移动之间若有新记录引用了该文件则移回原处。
+        """
+        day = datetime.now().strftime(QUARANTINE_DATE_FORMAT)
+        target = f"{self.prefix}{QUARANTINE_DIR}/{day}/{'/'.join(self._relative(obj.key))}"
+        try:
+            await storage.move(obj.key, target)
+        except FileNotFoundError:
+            return None
+
+        if not await self._find_orphans([obj]):
+            await storage.move(target, obj.key)
+            return "restored"
+
+        if mode == "delete":
+            await storage.delete(target)
+            return "deleted"
+        return "quarantined"
+
+    async def _prune_empty_dirs(self) -> None:
+        """本地存储删除文件后留下的空目录同样会增加遍历开销"""
+        root = storage.local_file(self.prefix)
+        if root is None:
+            return
+
+        def prune() -> None:
+            for dirpath, _, _ in os.walk(root, topdown=False):
+                if os.path.abspath(dirpath) != os.path.abspath(root):
+                    try:
+                        os.rmdir(dirpath)  # 非空目录会抛出 OSError
+                    except OSError:
+                        pass
+
+        await asyncio.to_thread(prune)
+
+
+# 全局实例
+storage_reaper_service = StorageReaperService()
+job_queue.register(JOB_KIND, storage_reaper_service.run_job)
@@ -0,0 +1,497 @@
+"""锦标赛服务层 - 对战编排、并发执行与断点续跑"""
+
+import asyncio
+import math
+import os
+from collections.abc import AsyncIterator, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import combinations
+from typing import Any
+
+from tortoise.expressions import Subquery
+from tortoise.functions import Count
+from tortoise.transactions import in_transaction
+
+from log import logger
+from models.games import AICode, Battle, BattlePlayer, Tournament
+from schemas.games import BattleOutcome, BattleStatus
+from utils.storage import storage
+
+TOURNAMENT_BATTLE_TYPE = "tournament"
+ROUND_ROBIN = "round_robin"
+SWISS = "swiss"
+
+
+def _run_rps_pairing(bot1: dict, bot2: dict, rounds: int) -> dict:
+    """在进程池中运行一场石头剪刀布对局，并写入回放日志"""
+    from games.replay_log import open_game_log
+    from games.sandbox import BotWorkerPool, play_rps_match
+
+    game_log_uuid, log_writer = open_game_log()
+    with log_writer, BotWorkerPool(
+        bot1["file_path"], size=1, file_hash=bot1["file_hash"]
+    ) as pool1, BotWorkerPool(
+        bot2["file_path"], size=1, file_hash=bot2["file_hash"]
+    ) as pool2:
+        result = play_rps_match(pool1, pool2, rounds=rounds, log_writer=log_writer)
+    result["game_log_uuid"] = game_log_uuid
+    return result
+
+
+# 各游戏的双人对局执行函数（需为模块级函数以便跨进程调用）
+MATCH_RUNNERS = {
+    "rock_paper_scissors": _run_rps_pairing,
+}
+
+
+def pairing_key(round_no: int, bot1_id: int, bot2_id: int) -> str:
+    """生成对局的唯一键（与选手顺序无关）"""
+    low, high = sorted((bot1_id, bot2_id))
+    return f"{round_no}:{low}-{high}"
+
+
+def round_robin_pairings(bot_ids: Iterable[int]) -> Iterator[tuple[int, int]]:
+    """单循环赛对阵：每两名选手对战一次（惰性生成，1万名选手约5千万场）"""
+    return combinations(sorted(bot_ids), 2)
+
+
+async def _iterate(items) -> AsyncIterator:
+    """同时支持同步和异步的可迭代对象"""
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+def swiss_pairings(
+    bot_ids: Iterable[int],
+    scores: dict[int, float],
+    played: set[tuple[int, int]],
+    byes: set[int],
+) -> tuple[list[tuple[int, int]], int | None]:
+    """
+    瑞士轮对阵：按积分排序，依次与尚未交手的最近对手配对
+
+    Args:
+        bot_ids: 选手ID
+        scores: 当前积分
+        played: 已交手的 (小ID, 大ID) 集合
+        byes: 已轮空过的选手
+
+    Returns:
+        tuple: (对阵列表, 本轮轮空选手)
+    """
+    ranked = sorted(bot_ids, key=lambda b: (-scores.get(b, 0.0), b))
+
+    bye = None
+    if len(ranked) % 2 == 1:
+        # 由排名最低且未轮空过的选手轮空
+        bye = next((b for b in reversed(ranked) if b not in byes), ranked[-1])
+        ranked.remove(bye)
+
+    pairs = []
+    unpaired = ranked
+    while unpaired:
+        first = unpaired.pop(0)
+        opponent_index = next(
+            (
+                i
+                for i, other in enumerate(unpaired)
+                if tuple(sorted((first, other))) not in played
+            ),
+            0,
+        )
+        pairs.append((first, unpaired.pop(opponent_index)))
+    return pairs, bye
+
+
+class TournamentService:
+    """锦标赛服务类 - 生成对阵、并发运行对局并写入对战记录
+
+    每场对局完成后立即写入 Battle/BattlePlayer（tournament_id + pairing_key），
+    这些记录同时作为断点：重新运行同名锦标赛时跳过已完成的对局。
+    运行失败的对局同样记录（状态为 error），续跑时不重新运行，
+    保证瑞士轮按相同的积分生成后续对阵。
+
+    单循环的对局数随选手数平方增长，续跑时按每名选手分批查询已完成的对局键，
+    汇总积分在数据库中聚合，内存占用与已完成的对局数无关。
+    """
+
+    def __init__(self):
+        self.logger = logger
+
+    async def run_tournament(
+        self,
+        name: str,
+        game_type: str,
+        mode: str = ROUND_ROBIN,
+        rounds_per_match: int = 100,
+        swiss_rounds: int | None = None,
+        max_workers: int | None = None,
+        ranking_id: int = 0,
+    ) -> dict[str, Any]:
+        """
+        运行（或续跑）一场锦标赛
+
+        Args:
+            name: 锦标赛名称，同名锦标赛共享断点
+            game_type: 游戏类型
+            mode: 对阵方式 round_robin / swiss
+            rounds_per_match: 每场对局的回合数
+            swiss_rounds: 瑞士轮轮数，默认 ceil(log2(选手数))
+            max_workers: 并发进程数上限
+            ranking_id: 排行榜ID
+
+        Returns:
+            dict: 锦标赛汇总
+        """
+        if game_type not in MATCH_RUNNERS:
+            raise ValueError(f"不支持的游戏类型: {game_type}")
+        if mode not in (ROUND_ROBIN, SWISS):
+            raise ValueError(f"不支持的对阵方式: {mode}")
+
+        if len(name) > 100:
+            raise ValueError("锦标赛名称过长")
+        bots = {
+            bot.id: bot
+            for bot in await AICode.filter(
+                game_type=game_type, is_active=True
+            ).order_by("id")
+        }
+        if len(bots) < 2:
+            raise ValueError("参赛AI代码不足两个")
+
+        tournament, _ = await Tournament.get_or_create(
+            name=name,
+            defaults={"game_type": game_type, "mode": mode, "ranking_id": ranking_id},
+        )
+        if (tournament.game_type, tournament.mode, tournament.ranking_id) != (
+            game_type,
+            mode,
+            ranking_id,
+        ):
+            raise ValueError("同名锦标赛的游戏类型、对阵方式或排行榜不一致")
+
+        # 对局进程读取本地文件，远程存储时先下载到本地缓存
+        local_paths = {
+            bot_id: str(await storage.local_path(bot.file_path))
+            for bot_id, bot in bots.items()
+        }
+
+        self.logger.info(
+            f"锦标赛 {name} 开始: {len(bots)} 个AI代码, "
+            f"已完成 {await Battle.filter(tournament_id=tournament.id).count()} 场"
+        )
+
+        context = {
+            "tournament_id": tournament.id,
+            "game_type": game_type,
+            "rounds_per_match": rounds_per_match,
+            "ranking_id": ranking_id,
+            "local_paths": local_paths,
+        }
+        limit = max_workers or os.cpu_count() or 1
+        byes: list[int] = []
+        with ProcessPoolExecutor(max_workers=limit) as executor:
+            if mode == ROUND_ROBIN:
+                pairings = self._round_robin_backlog(tournament.id, bots)
+                await self._run_pairings(executor, limit, pairings, bots, context)
+            else:
+                rounds = swiss_rounds or math.ceil(math.log2(len(bots)))
+                finished = await self._load_checkpoint(tournament.id)
+                byes = await self._run_swiss(
+                    executor, limit, rounds, bots, finished, context
+                )
+
+        scores, battles, failed = await self._tally(tournament.id, bots, byes)
+        return {
+            "name": name,
+            "game_type": game_type,
+            "mode": mode,
+            "players": len(bots),
+            "battles": battles,
+            "failed_battles": failed,
+            "standings": self._standings(bots, scores),
+        }
+
+    async def _round_robin_backlog(
+        self, tournament_id: int, bot_ids: Iterable[int]
+    ) -> AsyncIterator[tuple[int, int, int]]:
+        """
+        单循环中尚未完成的对局
+
+        与 round_robin_pairings 顺序相同；每名选手作为较小ID一方的已完成对局
+        通过一次按键前缀的查询取出，同一时刻只保留一名选手的断点。
+        """
+        ids = sorted(bot_ids)
+        for index, low in enumerate(ids[:-1]):
+            done = set(
+                await Battle.filter(
+                    tournament_id=tournament_id, pairing_key__startswith=f"0:{low}-"
+                ).values_list("pairing_key", flat=True)
+            )
+            for high in ids[index + 1 :]:
+                if pairing_key(0, low, high) not in done:
+                    yield 0, low, high
+
+    async def _run_swiss(
+        self,
+        executor: ProcessPoolExecutor,
+        limit: int,
+        rounds: int,
+        bots: dict[int, AICode],
+        finished: dict[str, dict],
+        context: dict,
+    ) -> list[int]:
+        """
+        逐轮生成瑞士轮对阵；积分与轮空均由已完成对局确定性重建
+
+        Returns:
+            list[int]: 各轮轮空的选手（每次轮空计1分）
+        """
+        scores: dict[int, float] = dict.fromkeys(bots, 0.0)
+        played: set[tuple[int, int]] = set()
+        byes: list[int] = []
+
+        for round_no in range(1, rounds + 1):
+            pairs, bye = swiss_pairings(bots, scores, played, set(byes))
+            if bye is not None:
+                byes.append(bye)
+                scores[bye] += 1.0
+
+            await self._run_pairings(
+                executor,
+                limit,
+                [(round_no, a, b) for a, b in pairs],
+                bots,
+                context,
+                finished,
+            )
+
+            for a, b in pairs:
+                result = finished.get(pairing_key(round_no, a, b))
+                if result is None:
+                    continue
+                played.add(tuple(sorted((a, b))))
+                for bot_id, points in self._points(result).items():
+                    scores[bot_id] += points
+        return byes
+
+    async def _run_pairings(
+        self,
+        executor: ProcessPoolExecutor,
+        limit: int,
+        pairings: Iterable[tuple[int, int, int]] | AsyncIterator[tuple[int, int, int]],
+        bots: dict[int, AICode],
+        context: dict,
+        finished: dict[str, dict] | None = None,
+    ) -> None:
+        """
+        并发运行尚未完成的对局，完成一场写入一场
+
+        对阵惰性消费，同时在途的任务不超过 limit 个，完成的任务立即释放。
+
+        Args:
+            finished: 已完成对局的结果（按对局键），传入时跳过其中的对局并记录新结果；
+                不传时由 pairings 自行排除已完成的对局
+        """
+        loop = asyncio.get_running_loop()
+        runner = MATCH_RUNNERS[context["game_type"]]
+        semaphore = asyncio.Semaphore(limit)
+
+        async def run_one(round_no: int, bot1_id: int, bot2_id: int) -> None:
+            key = pairing_key(round_no, bot1_id, bot2_id)
+            started_at = datetime.now()
+            try:
+                result = await loop.run_in_executor(
+                    executor,
+                    runner,
+                    self._bot_payload(bots[bot1_id], context["local_paths"]),
+                    self._bot_payload(bots[bot2_id], context["local_paths"]),
+                    context["rounds_per_match"],
+                )
+            except Exception as e:
+                self.logger.error(f"对局 {key} 运行失败: {str(e)}")
+                result = {"error": f"{type(e).__name__}: {e}"}
+            finally:
+                semaphore.release()
+
+            results = {
+                "pairing_key": key,
+                "round": round_no,
+                "game_type": context["game_type"],
+                "player1_ai_code_id": bot1_id,
+                "player2_ai_code_id": bot2_id,
+            }
+            if "error" in result:
+                results.update(failed=True, error=result["error"])
+            else:
+                results.update(
+                    player1_wins=result["player1_wins"],
+                    player2_wins=result["player2_wins"],
+                    draws=result["draws"],
+                )
+            await self._save_battle(
+                context,
+                bots[bot1_id],
+                bots[bot2_id],
+                results,
+                started_at,
+                result.get("game_log_uuid"),
+            )
+            if finished is not None:
+                finished[key] = results
+
+        pending: set[asyncio.Task] = set()
+        errors: list[BaseException] = []
+
+        def on_done(task: asyncio.Task) -> None:
+            pending.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                errors.append(task.exception())
+
+        async for round_no, bot1_id, bot2_id in _iterate(pairings):
+            if errors:
+                break
+            if finished is not None and pairing_key(round_no, bot1_id, bot2_id) in finished:
+                continue
+            # 限制同时在途的对局数，避免一次性提交海量任务
+            await semaphore.acquire()
+            task = asyncio.create_task(run_one(round_no, bot1_id, bot2_id))
+            pending.add(task)
+            task.add_done_callback(on_done)
+        if pending:
+            await asyncio.wait(pending)
+        if errors:
+            raise errors[0]
+
+    async def _save_battle(
+        self,
+        context: dict,
+        bot1: AICode,
+        bot2: AICode,
+        results: dict,
+        started_at: datetime,
+        game_log_uuid: str | None = None,
+    ) -> None:
+        """写入对战及参与者记录；运行失败的对局以 error 状态记录，双方均无结果"""
+        failed = results.get("failed", False)
+        outcomes = (None, None) if failed else self._outcomes(results)
+        async with in_transaction():
+            battle = await Battle.create(
+                status=BattleStatus.ERROR.value if failed else BattleStatus.FINISHED.value,
+                ranking_id=context["ranking_id"],
+                started_at=started_at,
+                ended_at=datetime.now(),
+                results=results,
+                game_log_uuid=game_log_uuid,
+                battle_type=TOURNAMENT_BATTLE_TYPE,
+                tournament_id=context["tournament_id"],
+                pairing_key=results["pairing_key"],
+            )
+            await BattlePlayer.bulk_create(
+                [
+                    BattlePlayer(
+                        battle_id=battle.id,
+                        user_id=bot.user_id,
+                        selected_ai_code_id=bot.id,
+                        position=position,
+                        outcome=outcome,
+                    )
+                    for position, (bot, outcome) in enumerate(
+                        zip((bot1, bot2), outcomes), start=1
+                    )
+                ]
+            )
+
+    async def _load_checkpoint(self, tournament_id: int) -> dict[str, dict]:
+        """读取瑞士轮已完成和已记录失败的对局（每轮约 选手数/2 场）"""
+        rows = await Battle.filter(tournament_id=tournament_id).values_list(
+            "results", flat=True
+        )
+        return {
+            results["pairing_key"]: results
+            for results in rows
+            if results and "pairing_key" in results
+        }
+
+    async def _tally(
+        self, tournament_id: int, bots: Iterable[int], byes: Iterable[int] = ()
+    ) -> tuple[dict[int, float], int, int]:
+        """
+        在数据库中按选手和结果聚合积分
+
+        Returns:
+            tuple: (积分, 完成的对局数, 运行失败的对局数)
+        """
+        counts = {
+            row["status"]: row["count"]
+            for row in await Battle.filter(tournament_id=tournament_id)
+            .annotate(count=Count("id"))
+            .group_by("status")
+            .values("status", "count")
+        }
+        rows = (
+            await BattlePlayer.filter(
+                battle_id__in=Subquery(
+                    Battle.filter(
+                        tournament_id=tournament_id, status=BattleStatus.FINISHED.value
+                    ).values("id")
+                )
+            )
+            .annotate(count=Count("id"))
+            .group_by("selected_ai_code_id", "outcome")
+            .values("selected_ai_code_id", "outcome", "count")
+        )
+        points = {"win": 1.0, "draw": 0.5, "loss": 0.0}
+        scores: dict[int, float] = dict.fromkeys(bots, 0.0)
+        for bot_id in byes:
+            scores[bot_id] += 1.0
+        for row in rows:
+            if row["selected_ai_code_id"] in scores:
+                scores[row["selected_ai_code_id"]] += points[row["outcome"]] * row["count"]
+        return (
+            scores,
+            counts.get(BattleStatus.FINISHED.value, 0),
+            counts.get(BattleStatus.ERROR.value, 0),
+        )
+
+    @staticmethod
+    def _bot_payload(bot: AICode, local_paths: dict[int, str]) -> dict:
+        return {"id": bot.id, "file_path": local_paths[bot.id], "file_hash": bot.file_hash}
+
+    @staticmethod
+    def _outcomes(results: dict) -> tuple[str, str]:
+        if results["player1_wins"] > results["player2_wins"]:
+            return BattleOutcome.WIN.value, BattleOutcome.LOSS.value
+        if results["player1_wins"] < results["player2_wins"]:
+            return BattleOutcome.LOSS.value, BattleOutcome.WIN.value
+        return BattleOutcome.DRAW.value, BattleOutcome.DRAW.value
+
+    @classmethod
+    def _points(cls, results: dict) -> dict[int, float]:
+        """对局积分，运行失败的对局双方都不得分"""
+        if results.get("failed"):
+            return {}
+        points = {"win": 1.0, "draw": 0.5, "loss": 0.0}
+        outcome1, outcome2 = cls._outcomes(results)
+        return {
+            results["player1_ai_code_id"]: points[outcome1],
+            results["player2_ai_code_id"]: points[outcome2],
+        }
+
+    @staticmethod
+    def _standings(
+        bots: dict[int, AICode], scores: dict[int, float]
+    ) -> list[dict[str, Any]]:
+        return [
+            {"ai_code_id": bot_id, "name": bots[bot_id].name, "score": score}
+            for bot_id, score in sorted(scores.items(), key=lambda s: (-s[1], s[0]))
+        ]
+
+
+# 全局实例
+tournament_service = TournamentService()
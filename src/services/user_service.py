@@ -7,7 +7,8 @@ from repositories.user import user_repository
 from schemas.base import Fail, Success, SuccessExtra
 from schemas.users import UserCreate, UserUpdate, ProfileUpdate
 from services.base_service import BaseService
-from utils.cache import cached, clear_user_cache
+from services.file_service import file_service
+from utils.cache import cached, clear_user_cache, user_tag
 
 
 class UserService(BaseService):
@@ -48,20 +49,13 @@ class UserService(BaseService):
             self.logger.error(f"获取用户列表失败: {str(e)}")
             return Fail(msg="获取用户列表失败")
 
-    @cached("user_detail", ttl=300)
-    async def get_user_detail(self, user_id: int) -> Success:
-        """获取用户详情 - 带缓存"""
-        try:
-            user_obj = await user_repository.get(id=user_id)
-            if not user_obj:
-                return Fail(msg="用户不存在")
-
-            user_dict = await user_obj.to_dict(m2m=True, exclude_fields=["password"])
-            return Success(data=user_dict)
-
-        except Exception as e:
-            self.logger.error(f"获取用户详情失败: {str(e)}")
-            return Fail(msg="获取用户详情失败")
+    @cached("user_detail", ttl=300, tags=lambda self, user_id: [user_tag(user_id)])
+    async def get_user_detail(self, user_id: int) -> dict | None:
+        """获取用户详情 - 带缓存，用户不存在时返回None（按较短的过期时间缓存）"""
+        user_obj = await user_repository.model.filter(id=user_id).first()
+        if not user_obj:
+            return None
+        return await user_obj.to_dict(m2m=True, exclude_fields=["password"])
 
     async def create_user(self, user_in: UserCreate) -> Success:
         """创建用户 - 包含邮箱唯一性检查和角色分配"""
@@ -80,6 +74,9 @@ class UserService(BaseService):
             # 更新用户角色
             await user_repository.update_roles(new_user, user_in.role_ids)
 
+            # 清除该ID此前缓存的“用户不存在”
+            await clear_user_cache(new_user.id)
+
             return Success(msg="Created Successfully")
 
         except Exception as e:
@@ -191,6 +188,10 @@ class UserService(BaseService):
             
             # 清除相关缓存
             await clear_user_cache(user_id)
+
+            # 释放旧头像的上传引用，最后一个引用释放时删除文件
+            if user.avatar and user.avatar != avatar_url:
+                await file_service.delete_file(user.avatar, user_id=user_id)
             
             self.logger.info(f"用户 {user_id} 头像已更新为: {avatar_url}")
             
@@ -223,10 +224,15 @@ class UserService(BaseService):
     async def delete_user_avatar(self, user_id: int) -> Success:
         """删除用户头像"""
         try:
+            user = await user_repository.get(id=user_id)
             await user_repository.update(id=user_id, obj_in={"avatar": None})
             
             # 清除相关缓存
             await clear_user_cache(user_id)
+
+            # 释放头像的上传引用
+            if user and user.avatar:
+                await file_service.delete_file(user.avatar, user_id=user_id)
             
             return Success(msg="头像删除成功")
             
@@ -137,7 +137,56 @@ class Settings(BaseSettings):
 
     # Redis配置
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    REDIS_MAX_CONNECTIONS: int = 20  # 每个连接池的最大连接数
+    REDIS_SOCKET_TIMEOUT: float = 0.5  # 命令读写超时（秒）
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 0.5  # 建立连接超时（秒）
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30  # 空闲连接复用前PING检查的间隔（秒）
+    # 熔断：连续失败达到阈值后在冷却时间内不访问Redis，之后放行一个探测请求
+    REDIS_BREAKER_FAILURES: int = 5
+    REDIS_BREAKER_RESET_TIMEOUT: float = 5.0
+    # 连接失败或熔断期间后台重连的退避间隔（秒），每次失败翻倍
+    REDIS_RECONNECT_MIN_DELAY: float = 1.0
+    REDIS_RECONNECT_MAX_DELAY: float = 30.0
     CACHE_TTL: int = 300  # 默认缓存过期时间（秒）
+    CACHE_NEGATIVE_TTL: int = 30  # “记录不存在”的缓存过期时间（秒）
+    # 进程内L1缓存：启用的键前缀及其L1过期时间（秒），多副本间通过Redis发布订阅失效
+    CACHE_LOCAL_PREFIXES: dict[str, int] = {
+        "userinfo": 30,
+        "user_roles": 30,
+        "user_permissions": 30,
+        "role_permissions": 30,
+        "role_menus": 30,
+        "user_detail": 30,
+    }
+    CACHE_LOCAL_MAX_ENTRIES: int = 10000
+    CACHE_LOCAL_MAX_BYTES: int = 64 * 1024 * 1024
+    # 缓存值编码：msgpack 保留日期时间类型，未安装时依次退化为 orjson、json
+    CACHE_CODEC: str = "msgpack"
+    CACHE_CODECS: dict[str, str] = {}  # 按键前缀指定编码，如 {"leaderboard_page": "orjson"}
+    CACHE_COMPRESS_MIN_BYTES: int = 4096  # 序列化后达到该大小时用zstd压缩，0 表示不压缩
+
+    # 后台任务队列配置
+    JOB_WORKER_CONCURRENCY: int = 2  # 同时处理的任务数
+    JOB_POLL_INTERVAL: float = 1.0  # 空闲时轮询任务表的间隔（秒）
+    JOB_LEASE_SECONDS: int = 600  # 任务租约，超时未完成的任务会被重新领取
+
+    # 图片处理进程数（头像缩略图）
+    IMAGE_WORKERS: int = 2
+
+    # 文件存储配置：local 为本地 uploads 目录，s3 为S3兼容对象存储（如 MinIO）
+    STORAGE_BACKEND: str = "local"
+    STORAGE_CACHE_DIR: str = "cache/storage"  # 远程存储文件的本地缓存目录
+    S3_ENDPOINT_URL: str = "http://localhost:9000"
+    S3_BUCKET: str = "evoai"
+    S3_ACCESS_KEY: str = ""
+    S3_SECRET_KEY: str = ""
+    S3_REGION: str = "us-east-1"
+
+    # 上传目录孤儿文件回收：report 只生成报告，quarantine 移入隔离区，delete 直接删除
+    REAPER_INTERVAL_SECONDS: int = 6 * 3600  # 0 表示不定期执行
+    REAPER_MODE: str = "quarantine"
+    REAPER_GRACE_SECONDS: int = 3600  # 新于该时间的文件可能仍在写入，不处理
+    REAPER_QUARANTINE_DAYS: int = 7  # 隔离区中的文件保留天数
 
     @field_validator("COMPANY_ROLE_MAPPING", mode="before")
     @classmethod
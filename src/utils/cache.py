@@ -1,111 +1,865 @@
+import asyncio
+import fnmatch
 import json
-from collections.abc import Callable
+import math
+import random
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from collections.abc import Awaitable, Callable, Iterable, Mapping
+from datetime import date, datetime
 from functools import wraps
 from typing import Any
 
 import redis.asyncio as redis
+from redis.exceptions import WatchError
 
 from log import logger
 from settings.config import settings
 
+try:
+    import orjson
+except ImportError:  # 未安装时退化为标准库json
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # 未安装时退化为orjson/json
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # 未安装时不压缩
+    zstandard = None
+
+TAG_KEY_PREFIX = "tag"  # 标签集合键：tag:<标签>，成员为登记到该标签的缓存键
+TAG_TTL = 24 * 3600  # 标签集合的过期时间（秒），每次登记时刷新
+SCAN_COUNT = 500  # 按模式清除时每次SCAN的数量提示
+UNLINK_BATCH = 500  # 每条UNLINK命令删除的键数
+INVALIDATION_CHANNEL = "cache:invalidate"  # L1失效消息频道
+RESUBSCRIBE_DELAY = 1.0  # 订阅断开后重新订阅的间隔（秒）
+# 等待失效消息的单次超时（秒）：空闲时按显式超时返回None，
+# 不受连接的 socket_timeout 影响（redis-py 8 之前 listen() 空闲超时会抛出异常）
+PUBSUB_POLL_TIMEOUT = 1.0
+LOCK_KEY_PREFIX = "lock"  # 缓存重建锁：lock:<缓存键>
+LOCK_TTL = 10  # 缓存重建锁的过期时间（秒），也是等待其他副本重建的最长时间
+LOCK_POLL_INTERVAL = 0.05  # 等待其他副本重建时轮询缓存的间隔（秒）
+EARLY_EXPIRATION_BETA = 1.0  # 提前过期系数，越大越早开始后台刷新
+
+# 缓存值首字节：低7位为编码方式，最高位表示数据经过zstd压缩；
+# 旧版本写入的JSON文本以可见字符开头，不会与之冲突
+CODEC_JSON = 0x01
+CODEC_ORJSON = 0x02
+CODEC_MSGPACK = 0x03
+FLAG_ZSTD = 0x80
+CODECS = {"json": CODEC_JSON, "orjson": CODEC_ORJSON, "msgpack": CODEC_MSGPACK}
+_CODEC_FALLBACK = {CODEC_MSGPACK: CODEC_ORJSON, CODEC_ORJSON: CODEC_JSON}
+
+# msgpack扩展类型，保留日期时间类型
+_EXT_DATETIME = 1
+_EXT_DATE = 2
+
+# 以 <前缀>:<ID> 开头的键写入时自动登记到对应的用户/角色标签
+IMPLICIT_TAG_PREFIXES = {
+    "user": "user",
+    "userinfo": "user",
+    "user_roles": "user",
+    "user_permissions": "user",
+    "role": "role",
+    "role_permissions": "role",
+    "role_menus": "role",
+}
+
+
+def user_tag(user_id: int) -> str:
+    """用户相关缓存的标签"""
+    return f"user:{user_id}"
+
+
+def role_tag(role_id: int) -> str:
+    """角色相关缓存的标签"""
+    return f"role:{role_id}"
+
+
+class _Missing:
+    """未缓存的标记，与缓存了 None（记录不存在）区分"""
+
+    def __repr__(self) -> str:
+        return "MISSING"
+
+    def __bool__(self) -> bool:
+        return False
+
+
+MISSING = _Missing()
+
+
+def _codec_available(codec: int) -> bool:
+    if codec == CODEC_ORJSON:
+        return orjson is not None
+    if codec == CODEC_MSGPACK:
+        return msgpack is not None
+    return codec == CODEC_JSON
+
+
+def resolve_codec(name: str) -> int:
+    """按名称选择编码方式，所需的库未安装时依次退化为 orjson、json"""
+    if name not in CODECS:
+        raise ValueError(f"不支持的缓存编码: {name}")
+    codec = CODECS[name]
+    while not _codec_available(codec):
+        codec = _CODEC_FALLBACK[codec]
+    return codec
+
+
+def _msgpack_default(obj: Any) -> Any:
+    if isinstance(obj, datetime):
+        return msgpack.ExtType(_EXT_DATETIME, obj.isoformat().encode())
+    if isinstance(obj, date):
+        return msgpack.ExtType(_EXT_DATE, obj.isoformat().encode())
+    return str(obj)
+
+
+def _msgpack_ext_hook(code: int, data: bytes) -> Any:
+    if code == _EXT_DATETIME:
+        return datetime.fromisoformat(data.decode())
+    if code == _EXT_DATE:
+        return date.fromisoformat(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+def encode_value(value: Any, codec: int = CODEC_JSON, compress_min_bytes: int = 0) -> bytes:
+    """
+    序列化缓存值并加上编码头
+
+    Args:
+        value: 缓存值
+        codec: 编码方式（CODEC_*）
+        compress_min_bytes: 序列化后达到该字节数时用zstd压缩，0 表示不压缩
+
+    Returns:
+        bytes: 首字节为编码头的数据
+    """
+    if codec == CODEC_MSGPACK:
+        payload = msgpack.packb(value, default=_msgpack_default, use_bin_type=True)
+    elif codec == CODEC_ORJSON:
+        payload = orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+    else:
+        payload = json.dumps(value, ensure_ascii=False, default=str).encode()
+
+    if zstandard is not None and 0 < compress_min_bytes <= len(payload):
+        compressed = zstandard.ZstdCompressor(level=3).compress(payload)
+        if len(compressed) < len(payload):
+            return bytes((codec | FLAG_ZSTD,)) + compressed
+    return bytes((codec,)) + payload
+
+
+def decode_value(data: bytes) -> Any:
+    """反序列化缓存值；没有编码头的数据按旧版本的JSON文本读取"""
+    header = data[0]
+    codec = header & ~FLAG_ZSTD
+    if codec not in CODECS.values():
+        return json.loads(data)
+
+    payload = data[1:]
+    if header & FLAG_ZSTD:
+        if zstandard is None:
+            raise ValueError("读取该缓存需要安装 zstandard")
+        payload = zstandard.ZstdDecompressor().decompress(payload)
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise ValueError("读取该缓存需要安装 msgpack")
+        return msgpack.unpackb(
+            payload, raw=False, strict_map_key=False, ext_hook=_msgpack_ext_hook
+        )
+    if codec == CODEC_ORJSON and orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+class LocalCache:
+    """进程内LRU缓存（L1）
+
+    保存序列化后的数据，命中时反序列化，调用方拿到的始终是独立的对象。
+    按条目数和数据字节数限制容量，每个条目有自己的过期时间。
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.generation = 0  # 每次失效递增，用于丢弃失效前发起的回填
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at <= time.monotonic():
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return data
+
+    def set(self, key: str, data: bytes, ttl: float) -> None:
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        self._pop(key)
+        self._entries[key] = (time.monotonic() + ttl, data)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes -= len(evicted)
+
+    def delete(self, *keys: str) -> None:
+        self.generation += 1
+        for key in keys:
+            self._pop(key)
+
+    def delete_matching(self, pattern: str) -> None:
+        self.delete(*[key for key in self._entries if fnmatch.fnmatchcase(key, pattern)])
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+        self.bytes = 0
+
+    def _pop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= len(entry[1])
+
+
+class CircuitBreaker:
+    """Redis熔断器
+
+    连续失败 failure_threshold 次后打开，打开期间的调用不访问Redis、直接退化；
+    reset_timeout 秒后进入半开状态，只放行一个探测调用，成功则关闭，失败则重新打开。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0  # 打开或放行上一个探测调用的时间
+
+    def allow(self) -> bool:
+        """本次调用是否可以访问Redis"""
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at < self.reset_timeout:
+            return False
+        # 冷却结束，或上一个探测调用迟迟没有结果时，再放行一个探测调用
+        self.state = self.HALF_OPEN
+        self.opened_at = now
+        return True
+
+    def record_success(self) -> bool:
+        """记录一次成功；返回熔断器是否因此关闭"""
+        recovered = self.state != self.CLOSED
+        self.state = self.CLOSED
+        self.failures = 0
+        return recovered
+
+    def record_failure(self) -> bool:
+        """记录一次失败；返回熔断器是否因此打开"""
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (
+            self.state == self.CLOSED and self.failures >= self.failure_threshold
+        ):
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
 
 class CacheManager:
-    """Redis缓存管理器"""
+    """Redis缓存管理器
+
+    缓存写入时可以登记到若干标签（如某个用户），失效时按标签取出键集合后
+    直接 UNLINK，不需要 KEYS 这类会阻塞Redis的全库遍历。
+
+    settings.CACHE_LOCAL_PREFIXES 中的前缀额外使用进程内L1缓存：写入和删除时
+    通过Redis发布订阅通知其他副本丢弃各自的L1条目；订阅未建立时不使用L1。
+
+    缓存值带编码头，按键前缀选择编码方式（settings.CACHE_CODECS），
+    通过不解码响应的 self.binary 连接读写；self.redis 供标签、锁等文本命令使用。
+
+    Redis出错时由熔断器记录，连续失败后在冷却时间内直接退化（读不命中、写跳过），
+    不再让每个请求等待超时；后台按退避间隔重连或PING，恢复后关闭熔断器。
+    """
 
     def __init__(self):
         self.redis: redis.Redis | None = None
+        self.binary: redis.Redis | None = None
         self._connection_pool = None
+        self.default_codec = resolve_codec(settings.CACHE_CODEC)
+        self.codecs = {
+            prefix: resolve_codec(name) for prefix, name in settings.CACHE_CODECS.items()
+        }
+        self.local = LocalCache(
+            settings.CACHE_LOCAL_MAX_ENTRIES, settings.CACHE_LOCAL_MAX_BYTES
+        )
+        self.local_prefixes: dict[str, int] = dict(settings.CACHE_LOCAL_PREFIXES)
+        self.stats: defaultdict[str, dict[str, int]] = defaultdict(
+            lambda: {"local_hits": 0, "hits": 0, "misses": 0}
+        )
+        self._instance_id = uuid.uuid4().hex
+        self._subscribed = False
+        self._listener: asyncio.Task | None = None
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._background: set[asyncio.Task] = set()
+        self.breaker = CircuitBreaker(
+            settings.REDIS_BREAKER_FAILURES, settings.REDIS_BREAKER_RESET_TIMEOUT
+        )
+        self._reconnector: asyncio.Task | None = None
 
     async def connect(self):
-        """连接Redis"""
-        if self.redis is None:
-            try:
-                self.redis = redis.from_url(
-                    settings.REDIS_URL,
-                    encoding="utf-8",
-                    decode_responses=True,
-                    max_connections=20,
-                    retry_on_timeout=True,
-                )
-                # 测试连接
-                await self.redis.ping()
-                logger.info("Redis连接成功")
-            except Exception as e:
-                logger.warning(f"Redis连接失败: {str(e)}，缓存功能将被禁用")
-                self.redis = None
+        """连接Redis；失败时缓存功能暂时禁用，并在后台按退避间隔重连"""
+        if self.redis is not None or self._reconnector is not None:
+            return
+        if not await self._open():
+            self._start_reconnect()
+
+    def _client(self, decode_responses: bool) -> redis.Redis:
+        # 不在超时后重试：Redis故障时由熔断器快速退化，而不是让请求等待两次超时
+        return redis.from_url(
+            settings.REDIS_URL,
+            decode_responses=decode_responses,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        )
+
+    async def _open(self) -> bool:
+        """创建连接并PING，成功后才替换 self.redis / self.binary"""
+        text = self._client(decode_responses=True)
+        binary = self._client(decode_responses=False)
+        try:
+            await text.ping()
+        except Exception as e:
+            logger.warning(f"Redis连接失败: {str(e)}，缓存功能暂时禁用")
+            await text.close()
+            await binary.close()
+            return False
+
+        self.redis, self.binary = text, binary
+        self.breaker.record_success()
+        logger.info("Redis连接成功")
+        self._start_listener()
+        return True
+
+    def _start_reconnect(self) -> None:
+        if self._reconnector is None:
+            self._reconnector = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        """未连接时重新建立连接，熔断期间PING；间隔按指数退避并加随机抖动"""
+        delay = settings.REDIS_RECONNECT_MIN_DELAY
+        try:
+            while True:
+                await asyncio.sleep(random.uniform(delay / 2, delay))
+                if self.redis is None:
+                    if await self._open():
+                        return
+                elif self.breaker.state == CircuitBreaker.CLOSED:
+                    return
+                else:
+                    try:
+                        await self.redis.ping()
+                    except Exception as e:
+                        logger.debug(f"Redis仍不可用: {str(e)}")
+                    else:
+                        self._succeeded()
+                        return
+                delay = min(delay * 2, settings.REDIS_RECONNECT_MAX_DELAY)
+        finally:
+            self._reconnector = None
+
+    def _available(self, client: redis.Redis | None) -> bool:
+        """已连接且熔断器放行"""
+        return client is not None and self.breaker.allow()
+
+    def _succeeded(self) -> None:
+        if self.breaker.record_success():
+            logger.info("Redis已恢复，熔断器关闭")
+
+    def _failed(self, message: str, error: Exception) -> None:
+        logger.error(f"{message}: {str(error)}")
+        if self.breaker.record_failure():
+            logger.warning(
+                f"Redis连续失败，熔断器打开，{self.breaker.reset_timeout}秒内直接退化"
+            )
+            self._start_reconnect()
+
+    def client(self) -> redis.Redis | None:
+        """供排行榜等直接使用Redis命令的模块：未连接或熔断未关闭时返回None
+
+        调用方应通过 report_success / report_failure 反馈结果，使这些命令同样计入熔断。
+        """
+        if self.breaker.state != CircuitBreaker.CLOSED:
+            return None
+        return self.redis
+
+    def report_success(self) -> None:
+        """通过 client() 执行的命令成功"""
+        self._succeeded()
+
+    def report_failure(self, message: str, error: Exception) -> None:
+        """通过 client() 执行的命令失败：记录日志并计入熔断"""
+        self._failed(message, error)
 
     async def disconnect(self):
         """断开Redis连接"""
+        if self._reconnector is not None:
+            self._reconnector.cancel()
+            await asyncio.gather(self._reconnector, return_exceptions=True)
+            self._reconnector = None
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self.binary:
+            await self.binary.close()
+            self.binary = None
         if self.redis:
             await self.redis.close()
             self.redis = None
             logger.info("Redis连接已断开")
 
-    async def get(self, key: str) -> Any | None:
-        """获取缓存值"""
-        if not self.redis:
-            return None
+    async def get(self, key: str, default: Any = None) -> Any:
+        """获取缓存值（启用L1的前缀先查进程内缓存）
+
+        Args:
+            key: 缓存键
+            default: 未缓存时的返回值；传入 MISSING 可区分未缓存与缓存的 None
+
+        Returns:
+            Any: 缓存值
+        """
+        if not self.binary:
+            return default
+
+        prefix = key.split(":", 1)[0]
+        local_ttl = self._local_ttl(prefix)
+        if local_ttl:
+            data = self.local.get(key)
+            if data is not None:
+                self.stats[prefix]["local_hits"] += 1
+                return decode_value(data)
+            generation = self.local.generation
+        if not self.breaker.allow():
+            self.stats[prefix]["misses"] += 1
+            return default
 
         try:
-            data = await self.redis.get(key)
-            if data:
-                return json.loads(data)
-            return None
+            data = await self.binary.get(key)
         except Exception as e:
-            logger.error(f"获取缓存失败 key={key}: {str(e)}")
-            return None
+            self._failed(f"获取缓存失败 key={key}", e)
+            return default
+        self._succeeded()
+        if data:
+            self.stats[prefix]["hits"] += 1
+            if local_ttl and generation == self.local.generation:
+                self.local.set(key, data, local_ttl)
+            return decode_value(data)
+        self.stats[prefix]["misses"] += 1
+        return default
 
-    async def set(self, key: str, value: Any, ttl: int | None = None) -> bool:
-        """设置缓存值"""
-        if not self.redis:
+    async def get_many(self, keys: Iterable[str]) -> dict[str, Any]:
+        """批量获取缓存值（L1之外的键合并为一次 MGET）
+
+        Args:
+            keys: 缓存键
+
+        Returns:
+            dict[str, Any]: 已缓存的键及其值（含缓存的 None），未缓存的键不在其中
+        """
+        keys = list(dict.fromkeys(keys))
+        if not self.binary or not keys:
+            return {}
+
+        found: dict[str, Any] = {}
+        remote: list[str] = []
+        for key in keys:
+            prefix = key.split(":", 1)[0]
+            data = self.local.get(key) if self._local_ttl(prefix) else None
+            if data is not None:
+                self.stats[prefix]["local_hits"] += 1
+                found[key] = decode_value(data)
+            else:
+                remote.append(key)
+        if not remote or not self.breaker.allow():
+            return found
+
+        generation = self.local.generation
+        try:
+            values = await self.binary.mget(remote)
+        except Exception as e:
+            self._failed(f"批量获取缓存失败 keys={len(remote)}", e)
+            return found
+        self._succeeded()
+        for key, data in zip(remote, values):
+            prefix = key.split(":", 1)[0]
+            if not data:
+                self.stats[prefix]["misses"] += 1
+                continue
+            self.stats[prefix]["hits"] += 1
+            local_ttl = self._local_ttl(prefix)
+            if local_ttl and generation == self.local.generation:
+                self.local.set(key, data, local_ttl)
+            found[key] = decode_value(data)
+        return found
+
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: int | None = None,
+        tags: Iterable[str] = (),
+    ) -> bool:
+        """设置缓存值
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 过期时间（秒）
+            tags: 登记的标签，invalidate_tags 时一并删除
+        """
+        return await self.set_many({key: value}, ttl, {key: tags})
+
+    async def set_many(
+        self,
+        items: Mapping[str, Any],
+        ttl: int | Mapping[str, int] | None = None,
+        tags: Mapping[str, Iterable[str]] | None = None,
+    ) -> bool:
+        """批量设置缓存值（一次pipeline）
+
+        Args:
+            items: 缓存键到缓存值的映射
+            ttl: 过期时间（秒），可按键分别指定
+            tags: 每个键登记的标签
+        """
+        if not items or not self._available(self.binary):
             return False
 
         try:
-            ttl = ttl or settings.CACHE_TTL
-            serialized_value = json.dumps(value, ensure_ascii=False, default=str)
-            await self.redis.setex(key, ttl, serialized_value)
-            return True
+            pipe = self.binary.pipeline(transaction=False)
+            local_entries: list[tuple[str, bytes, int]] = []
+            for key, value in items.items():
+                key_ttl = (ttl.get(key) if isinstance(ttl, Mapping) else ttl) or settings.CACHE_TTL
+                prefix = key.split(":", 1)[0]
+                data = encode_value(
+                    value,
+                    self.codecs.get(prefix, self.default_codec),
+                    settings.CACHE_COMPRESS_MIN_BYTES,
+                )
+                pipe.setex(key, key_ttl, data)
+                for tag in {*(tags or {}).get(key, ()), *self._implicit_tags(key)}:
+                    tag_key = self.tag_key(tag)
+                    pipe.sadd(tag_key, key)
+                    pipe.expire(tag_key, max(key_ttl, TAG_TTL))
+                if prefix in self.local_prefixes:
+                    local_entries.append((key, data, key_ttl))
+
+            if local_entries:
+                published = [key for key, _, _ in local_entries]
+                self.local.delete(*published)
+                self._publish(pipe, keys=published)
+            generation = self.local.generation
+            await pipe.execute()
         except Exception as e:
-            logger.error(f"设置缓存失败 key={key}: {str(e)}")
+            self._failed(f"设置缓存失败 keys={list(items)[:10]}", e)
             return False
+        self._succeeded()
+
+        # 写入期间收到其他副本的失效时不写L1，避免用旧值覆盖
+        if generation != self.local.generation:
+            return True
+        for key, data, key_ttl in local_entries:
+            if local_ttl := self._local_ttl(key.split(":", 1)[0]):
+                self.local.set(key, data, min(local_ttl, key_ttl))
+        return True
+
+    async def set_negative(
+        self, key: str, ttl: int | None = None, tags: Iterable[str] = ()
+    ) -> bool:
+        """缓存“记录不存在”，get 时返回 None 而不是未缓存的默认值
+
+        Args:
+            key: 缓存键
+            ttl: 过期时间（秒），默认 settings.CACHE_NEGATIVE_TTL
+            tags: 登记的标签，与正常缓存一样随标签失效
+        """
+        return await self.set(key, None, ttl or settings.CACHE_NEGATIVE_TTL, tags)
 
     async def delete(self, key: str) -> bool:
         """删除缓存"""
-        if not self.redis:
-            return False
+        return bool(await self.delete_many([key]))
+
+    async def delete_many(self, keys: Iterable[str]) -> int:
+        """批量删除缓存（一次pipeline）
 
+        Returns:
+            int: 删除的键数量
+        """
+        keys = list(dict.fromkeys(keys))
+        if not self.redis or not keys:
+            return 0
+
+        self.local.delete(*keys)
+        if not self.breaker.allow():
+            return 0
         try:
-            result = await self.redis.delete(key)
-            return bool(result)
+            pipe = self.redis.pipeline(transaction=False)
+            batches = range(0, len(keys), UNLINK_BATCH)
+            for start in batches:
+                pipe.unlink(*keys[start : start + UNLINK_BATCH])
+            published = [key for key in keys if key.split(":", 1)[0] in self.local_prefixes]
+            if published:
+                self._publish(pipe, keys=published)
+            results = await pipe.execute()
         except Exception as e:
-            logger.error(f"删除缓存失败 key={key}: {str(e)}")
-            return False
+            self._failed(f"删除缓存失败 keys={keys[:10]}", e)
+            return 0
+        self._succeeded()
+        return sum(results[: len(batches)])
 
     async def exists(self, key: str) -> bool:
         """检查键是否存在"""
-        if not self.redis:
+        if not self._available(self.redis):
             return False
 
         try:
             result = await self.redis.exists(key)
-            return bool(result)
         except Exception as e:
-            logger.error(f"检查缓存存在性失败 key={key}: {str(e)}")
+            self._failed(f"检查缓存存在性失败 key={key}", e)
             return False
+        self._succeeded()
+        return bool(result)
 
     async def clear_pattern(self, pattern: str) -> int:
-        """根据模式清除缓存"""
+        """根据模式清除缓存
+
+        使用增量的 SCAN 遍历并分批 UNLINK，不会长时间阻塞其他客户端；
+        已知归属的缓存应优先使用 invalidate_tags。
+        """
         if not self.redis:
             return 0
 
+        self.local.delete_matching(pattern)
+        if not self.breaker.allow():
+            return 0
         try:
-            keys = await self.redis.keys(pattern)
-            if keys:
-                return await self.redis.delete(*keys)
+            if self.local_prefixes:
+                pipe = self.redis.pipeline(transaction=False)
+                self._publish(pipe, pattern=pattern)
+                await pipe.execute()
+            total = 0
+            batch: list[str] = []
+            async for key in self.redis.scan_iter(match=pattern, count=SCAN_COUNT):
+                batch.append(key)
+                if len(batch) >= UNLINK_BATCH:
+                    total += await self.redis.unlink(*batch)
+                    batch = []
+            if batch:
+                total += await self.redis.unlink(*batch)
+        except Exception as e:
+            self._failed(f"批量删除缓存失败 pattern={pattern}", e)
+            return 0
+        self._succeeded()
+        return total
+
+    async def invalidate_tags(self, *tags: str) -> int:
+        """删除登记到任一标签的全部缓存
+
+        Returns:
+            int: 删除的缓存键数量
+        """
+        if not tags or not self._available(self.redis):
             return 0
+
+        try:
+            tag_keys = [self.tag_key(tag) for tag in tags]
+            pipe = self.redis.pipeline(transaction=False)
+            for tag_key in tag_keys:
+                pipe.smembers(tag_key)
+            keys = sorted(set().union(*await pipe.execute()))
+
+            self.local.delete(*keys)
+            pipe = self.redis.pipeline(transaction=False)
+            batches = range(0, len(keys), UNLINK_BATCH)
+            for start in batches:
+                pipe.unlink(*keys[start : start + UNLINK_BATCH])
+            pipe.unlink(*tag_keys)
+            if keys and self.local_prefixes:
+                self._publish(pipe, keys=keys)
+            results = await pipe.execute()
         except Exception as e:
-            logger.error(f"批量删除缓存失败 pattern={pattern}: {str(e)}")
+            self._failed(f"按标签删除缓存失败 tags={tags}", e)
             return 0
+        self._succeeded()
+        return sum(results[: len(batches)])
+
+    async def acquire_lock(self, name: str, ttl: int = LOCK_TTL) -> str | None:
+        """获取短时锁
+
+        Returns:
+            str | None: 锁令牌；锁已被占用时返回None。Redis不可用时不加锁，直接返回令牌
+        """
+        token = uuid.uuid4().hex
+        if not self._available(self.redis):
+            return token
+        try:
+            acquired = await self.redis.set(name, token, nx=True, ex=ttl)
+        except Exception as e:
+            self._failed(f"获取缓存锁失败 name={name}", e)
+            return token
+        self._succeeded()
+        return token if acquired else None
+
+    async def release_lock(self, name: str, token: str) -> None:
+        """释放自己持有的锁（锁已过期并被他人获得时不删除）"""
+        if not self._available(self.redis):
+            return
+        try:
+            # WATCH 保证比较与删除之间锁没有被他人获得
+            async with self.redis.pipeline(transaction=True) as pipe:
+                await pipe.watch(name)
+                if await pipe.get(name) == token:
+                    pipe.multi()
+                    pipe.delete(name)
+                    await pipe.execute()
+        except WatchError:
+            self._succeeded()
+        except Exception as e:
+            self._failed(f"释放缓存锁失败 name={name}", e)
+        else:
+            self._succeeded()
+
+    async def single_flight(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """同一进程内对同一键的并发调用只执行一次 compute，其余调用等待其结果"""
+        future = self._inflight.get(key)
+        if future is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # 执行 compute 的调用被取消，由本调用重新执行
+                return await self.single_flight(key, compute)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # 没有等待者时不产生告警
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def spawn(self, coro: Awaitable[Any]) -> None:
+        """在后台执行协程并保留任务引用直至完成"""
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background_done)
+
+    def _background_done(self, task: asyncio.Task) -> None:
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"后台缓存任务失败: {task.exception()!r}")
+
+    def get_stats(self) -> dict[str, Any]:
+        """按键前缀统计的命中情况及L1占用"""
+        return {
+            "prefixes": {prefix: dict(counts) for prefix, counts in self.stats.items()},
+            "local_entries": len(self.local),
+            "local_bytes": self.local.bytes,
+        }
+
+    def _local_ttl(self, prefix: str) -> int | None:
+        """该前缀的L1过期时间；未启用或失效订阅未建立时返回None"""
+        if not self._subscribed:
+            return None
+        return self.local_prefixes.get(prefix)
+
+    def _publish(
+        self, pipe, keys: list[str] | None = None, pattern: str | None = None
+    ) -> None:
+        message = {"origin": self._instance_id, "keys": keys, "pattern": pattern}
+        pipe.publish(INVALIDATION_CHANNEL, json.dumps(message, ensure_ascii=False))
+
+    def _start_listener(self) -> None:
+        if self.local_prefixes and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        """订阅失效消息；订阅断开期间清空并停用L1，避免读到其他副本已更新的旧值"""
+        while self.redis is not None:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                self._subscribed = True
+                while True:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=PUBSUB_POLL_TIMEOUT
+                    )
+                    if message is not None:
+                        self._apply_invalidation(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"缓存失效订阅中断: {str(e)}")
+            finally:
+                self._subscribed = False
+                self.local.clear()
+                await pubsub.reset()
+            await asyncio.sleep(RESUBSCRIBE_DELAY)
+
+    def _apply_invalidation(self, data: str) -> None:
+        try:
+            message = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        if message.get("origin") == self._instance_id:
+            return
+        if message.get("pattern"):
+            self.local.delete_matching(message["pattern"])
+        self.local.delete(*message.get("keys") or ())
+
+    @staticmethod
+    def tag_key(tag: str) -> str:
+        """标签集合的键"""
+        return f"{TAG_KEY_PREFIX}:{tag}"
+
+    @staticmethod
+    def _implicit_tags(key: str) -> list[str]:
+        parts = key.split(":", 2)
+        namespace = IMPLICIT_TAG_PREFIXES.get(parts[0])
+        if namespace and len(parts) > 1 and parts[1]:
+            return [f"{namespace}:{parts[1]}"]
+        return []
 
     def cache_key(self, prefix: str, *args, **kwargs) -> str:
         """生成缓存键"""
@@ -127,13 +881,72 @@ class CacheManager:
 cache_manager = CacheManager()
 
 
-def cached(prefix: str, ttl: int | None = None, key_func: Callable | None = None):
+def _is_entry(value: Any) -> bool:
+    return isinstance(value, dict) and value.keys() == {"v", "exp", "delta"}
+
+
+def _should_refresh(entry: dict, beta: float) -> bool:
+    """已过期，或按重建耗时随机提前判定过期（XFetch），让刷新分散在过期之前"""
+    jitter = -entry["delta"] * beta * math.log(1.0 - random.random())
+    return time.time() + jitter >= entry["exp"]
+
+
+async def _load_locked(
+    cache_key: str, load: Callable[[], Awaitable[Any]], lock_ttl: int, wait: bool
+) -> Any:
+    """
+    持有重建锁时执行 load；其他副本正在重建时等待其写入缓存
+
+    Args:
+        wait: 锁被占用时是否等待；后台刷新不等待，直接放弃
+    """
+    lock_name = f"{LOCK_KEY_PREFIX}:{cache_key}"
+    token = await cache_manager.acquire_lock(lock_name, lock_ttl)
+    if token is None:
+        if not wait:
+            return None
+        deadline = time.monotonic() + lock_ttl
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            entry = await cache_manager.get(cache_key)
+            if _is_entry(entry):
+                return entry["v"]
+        logger.warning(f"等待缓存重建超时，自行重建: {cache_key}")
+        return await load()
+
+    try:
+        return await load()
+    finally:
+        await cache_manager.release_lock(lock_name, token)
+
+
+def cached(
+    prefix: str,
+    ttl: int | None = None,
+    key_func: Callable | None = None,
+    tags: Callable[..., Iterable[str]] | None = None,
+    stale_ttl: int = 0,
+    beta: float = EARLY_EXPIRATION_BETA,
+    lock_ttl: int = LOCK_TTL,
+    negative_ttl: int | None = None,
+):
     """缓存装饰器
 
+    同一键的并发未命中只执行一次原函数（进程内合并，跨副本通过短时锁）；
+    临近过期时按重建耗时随机提前在后台刷新，过期后的 stale_ttl 秒内先返回旧值，
+    由一个调用在后台刷新。原函数返回 None（记录不存在）时同样缓存，
+    使用较短的 negative_ttl 且不返回过期值，并随同样的标签失效。
+
     Args:
         prefix: 缓存键前缀
         ttl: 过期时间（秒）
         key_func: 自定义键生成函数
+        tags: 根据调用参数返回标签的函数，用于按标签失效
+        stale_ttl: 过期后仍可返回旧值的时间（秒），0 表示不返回过期值
+        beta: 提前过期系数，0 表示不提前刷新
+        lock_ttl: 重建锁的过期时间（秒）
+        negative_ttl: 结果为 None 时的过期时间（秒），默认 settings.CACHE_NEGATIVE_TTL，
+            0 表示不缓存 None
     """
 
     def decorator(func):
@@ -144,22 +957,109 @@ def cached(prefix: str, ttl: int | None = None, key_func: Callable | None = None
                 cache_key = key_func(*args, **kwargs)
             else:
                 cache_key = cache_manager.cache_key(prefix, *args, **kwargs)
+            entry_ttl = ttl or settings.CACHE_TTL
+            absent_ttl = (
+                settings.CACHE_NEGATIVE_TTL if negative_ttl is None else negative_ttl
+            )
+
+            async def load():
+                start = time.perf_counter()
+                result = await func(*args, **kwargs)
+                if result is not None:
+                    fresh_ttl, redis_ttl = entry_ttl, entry_ttl + stale_ttl
+                elif absent_ttl:
+                    fresh_ttl = redis_ttl = absent_ttl
+                else:
+                    return result
+
+                entry = {
+                    "v": result,
+                    "exp": time.time() + fresh_ttl,
+                    "delta": time.perf_counter() - start,
+                }
+                entry_tags = tags(*args, **kwargs) if tags else ()
+                await cache_manager.set(cache_key, entry, redis_ttl, entry_tags)
+                logger.debug(f"缓存设置: {cache_key}")
+                return result
 
             # 尝试从缓存获取
-            cached_result = await cache_manager.get(cache_key)
-            if cached_result is not None:
+            cached_entry = await cache_manager.get(cache_key)
+            if _is_entry(cached_entry):
                 logger.debug(f"缓存命中: {cache_key}")
-                return cached_result
+                if _should_refresh(cached_entry, beta):
+                    cache_manager.spawn(
+                        cache_manager.single_flight(
+                            f"{cache_key}#refresh",
+                            lambda: _load_locked(cache_key, load, lock_ttl, wait=False),
+                        )
+                    )
+                return cached_entry["v"]
 
-            # 执行原函数
-            result = await func(*args, **kwargs)
+            return await cache_manager.single_flight(
+                cache_key, lambda: _load_locked(cache_key, load, lock_ttl, wait=True)
+            )
 
-            # 设置缓存
-            if result is not None:
-                await cache_manager.set(cache_key, result, ttl)
-                logger.debug(f"缓存设置: {cache_key}")
+        return wrapper
 
-            return result
+    return decorator
+
+
+def cached_many(
+    prefix: str,
+    ttl: int | None = None,
+    negative_ttl: int | None = None,
+    tags: Callable[[Any], Iterable[str]] | None = None,
+):
+    """批量缓存装饰器
+
+    被装饰的函数第一个参数为ID列表，返回 {ID: 值}，缓存按ID分别保存在
+    <前缀>:<ID> 下。调用时一次 MGET 取出已缓存的ID，只把未命中的ID交给原函数
+    一次性查询，再通过一次pipeline回填；原函数结果中缺少的ID按“记录不存在”缓存。
+
+    Args:
+        prefix: 缓存键前缀
+        ttl: 过期时间（秒）
+        negative_ttl: 不存在的ID的过期时间（秒），默认 settings.CACHE_NEGATIVE_TTL，
+            0 表示不缓存
+        tags: 根据ID返回标签的函数，用于按标签失效
+
+    Returns:
+        按传入顺序排列、只包含存在的ID的 {ID: 值}
+    """
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(ids: Iterable[Any], *args, **kwargs):
+            ids = list(dict.fromkeys(ids))
+            keys = {
+                item_id: cache_manager.cache_key(prefix, item_id, *args, **kwargs)
+                for item_id in ids
+            }
+            found = await cache_manager.get_many(keys.values())
+            values = {item_id: found[key] for item_id, key in keys.items() if key in found}
+
+            missing = [item_id for item_id in ids if item_id not in values]
+            if missing:
+                loaded = await func(missing, *args, **kwargs)
+                absent_ttl = (
+                    settings.CACHE_NEGATIVE_TTL if negative_ttl is None else negative_ttl
+                )
+                items: dict[str, Any] = {}
+                ttls: dict[str, int] = {}
+                entry_tags: dict[str, Iterable[str]] = {}
+                for item_id in missing:
+                    value = values[item_id] = loaded.get(item_id)
+                    if value is None and not absent_ttl:
+                        continue
+                    key = keys[item_id]
+                    items[key] = value
+                    ttls[key] = absent_ttl if value is None else ttl or settings.CACHE_TTL
+                    if tags:
+                        entry_tags[key] = tags(item_id)
+                await cache_manager.set_many(items, ttls, entry_tags)
+                logger.debug(f"批量缓存回填: {prefix} {len(items)}个")
+
+            return {item_id: values[item_id] for item_id in ids if values[item_id] is not None}
 
         return wrapper
 
@@ -168,35 +1068,14 @@ def cached(prefix: str, ttl: int | None = None, key_func: Callable | None = None
 
 # 缓存清理工具函数
 async def clear_user_cache(user_id: int):
-    """清除用户相关缓存"""
-    patterns = [
-        f"user:{user_id}:*",
-        f"userinfo:{user_id}",
-        f"user_roles:{user_id}",
-        f"user_permissions:{user_id}",
-    ]
-
-    total_cleared = 0
-    for pattern in patterns:
-        cleared = await cache_manager.clear_pattern(pattern)
-        total_cleared += cleared
-
+    """清除用户相关缓存（userinfo:<ID>、user:<ID>:* 等键写入时已登记到用户标签）"""
+    total_cleared = await cache_manager.invalidate_tags(user_tag(user_id))
     logger.info(f"清除用户{user_id}相关缓存，共{total_cleared}个键")
     return total_cleared
 
 
 async def clear_role_cache(role_id: int):
-    """清除角色相关缓存"""
-    patterns = [
-        f"role:{role_id}:*",
-        f"role_permissions:{role_id}",
-        f"role_menus:{role_id}",
-    ]
-
-    total_cleared = 0
-    for pattern in patterns:
-        cleared = await cache_manager.clear_pattern(pattern)
-        total_cleared += cleared
-
+    """清除角色相关缓存（role_permissions:<ID>、role:<ID>:* 等键写入时已登记到角色标签）"""
+    total_cleared = await cache_manager.invalidate_tags(role_tag(role_id))
     logger.info(f"清除角色{role_id}相关缓存，共{total_cleared}个键")
     return total_cleared
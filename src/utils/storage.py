@@ -0,0 +1,454 @@
+"""文件存储后端 - 本地磁盘或S3兼容对象存储（由 settings.STORAGE_BACKEND 选择）
+
+存储键即数据库中保存的 file_path（如 ``uploads/blobs/ab/<哈希>.py``），
+本地后端下存储键就是相对工作目录的文件路径，与历史数据保持一致。
+"""
+
+import asyncio
+import hashlib
+import hmac
+import itertools
+import os
+import shutil
+import uuid
+import xml.etree.ElementTree as ET
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import NamedTuple
+from urllib.parse import quote
+
+import aiofiles
+import aiofiles.os
+import httpx
+
+from log import logger
+from settings.config import settings
+
+READ_CHUNK_SIZE = 1024 * 1024
+S3_PART_SIZE = 8 * 1024 * 1024  # 超过该大小的文件按分片上传
+S3_NAMESPACE = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+
+
+class StorageError(Exception):
+    """存储后端请求失败"""
+
+
+class StoredObject(NamedTuple):
+    """存储中的一个对象"""
+
+    key: str
+    size: int
+    modified: float  # 最后修改时间（Unix时间戳）
+
+
+ObjectBatch = list[StoredObject]  # 类中的 list 方法会遮蔽内置 list，注解统一用该别名
+
+
+class StorageBackend(ABC):
+    """存储后端接口，所有读写都以流的方式进行"""
+
+    @abstractmethod
+    async def save(self, key: str, source: Path) -> None:
+        """将本地临时文件存入存储，完成后源文件不再存在"""
+
+    @abstractmethod
+    async def stat(self, key: str) -> int | None:
+        """返回对象大小，不存在时返回None"""
+
+    async def exists(self, key: str) -> bool:
+        return await self.stat(key) is not None
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """删除对象，不存在时忽略"""
+
+    @abstractmethod
+    async def move(self, src: str, dst: str) -> None:
+        """移动对象，源对象不存在时抛出 FileNotFoundError"""
+
+    @abstractmethod
+    def open(
+        self, key: str, start: int = 0, end: int | None = None
+    ) -> AsyncIterator[bytes]:
+        """按块读取对象的 [start, end] 字节区间（end 为闭区间，None 表示到末尾）"""
+
+    @abstractmethod
+    async def list(self, prefix: str) -> list[str]:
+        """列出以 prefix 开头的全部存储键"""
+
+    @abstractmethod
+    def scan(
+        self, directory: str, batch_size: int = 1000
+    ) -> AsyncIterator[ObjectBatch]:
+        """
+        分批遍历目录（以 / 结尾的前缀）下的全部对象
+
+        逐批返回，不会一次性把整个目录读入内存。
+        """
+
+    async def delete_prefix(self, prefix: str) -> None:
+        """删除以 prefix 开头的全部对象"""
+        for key in await self.list(prefix):
+            await self.delete(key)
+
+    @abstractmethod
+    async def local_path(self, key: str) -> Path:
+        """获取可直接读取的本地文件路径（远程存储会下载到本地缓存）"""
+
+    def local_file(self, key: str) -> Path | None:
+        """对象直接保存在本地磁盘时返回其路径，可用于 sendfile"""
+        return None
+
+    async def close(self) -> None:
+        """释放连接等资源"""
+
+
+class LocalStorage(StorageBackend):
+    """本地磁盘存储"""
+
+    def __init__(self, root: str | Path = "."):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    async def save(self, key: str, source: Path) -> None:
+        path = self._path(key)
+        await aiofiles.os.makedirs(path.parent, exist_ok=True)
+        await aiofiles.os.replace(source, path)
+
+    async def stat(self, key: str) -> int | None:
+        try:
+            result = await aiofiles.os.stat(self._path(key))
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return result.st_size
+
+    async def delete(self, key: str) -> None:
+        try:
+            await aiofiles.os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    async def move(self, src: str, dst: str) -> None:
+        path = self._path(dst)
+        await aiofiles.os.makedirs(path.parent, exist_ok=True)
+        await aiofiles.os.replace(self._path(src), path)
+
+    async def open(
+        self, key: str, start: int = 0, end: int | None = None
+    ) -> AsyncIterator[bytes]:
+        remaining = None if end is None else end - start + 1
+        async with aiofiles.open(self._path(key), "rb") as f:
+            await f.seek(start)
+            while remaining is None or remaining > 0:
+                size = READ_CHUNK_SIZE if remaining is None else min(READ_CHUNK_SIZE, remaining)
+                chunk = await f.read(size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    async def list(self, prefix: str) -> list[str]:
+        def walk() -> list[str]:
+            base = str(self._path(prefix)) + ("/" if prefix.endswith("/") else "")
+            keys = []
+            for dirpath, _, filenames in os.walk(os.path.dirname(base)):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    if path.startswith(base):
+                        keys.append(
+                            path if os.path.isabs(prefix) else os.path.relpath(path, self.root)
+                        )
+            return sorted(keys)
+
+        return await asyncio.to_thread(walk)
+
+    def _walk(self, directory: str):
+        """用 os.scandir 逐个遍历目录树中的文件"""
+        absolute = os.path.isabs(directory)
+        stack = [str(self._path(directory))]
+        while stack:
+            try:
+                it = os.scandir(stack.pop())
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            with it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        key = entry.path if absolute else os.path.relpath(entry.path, self.root)
+                        yield StoredObject(key, stat.st_size, stat.st_mtime)
+
+    async def scan(
+        self, directory: str, batch_size: int = 1000
+    ) -> AsyncIterator[ObjectBatch]:
+        entries = self._walk(directory)
+        while batch := await asyncio.to_thread(
+            lambda: list(itertools.islice(entries, batch_size))
+        ):
+            yield batch
+
+    async def delete_prefix(self, prefix: str) -> None:
+        if prefix.endswith("/"):
+            await asyncio.to_thread(shutil.rmtree, self._path(prefix), True)
+        else:
+            await super().delete_prefix(prefix)
+
+    async def local_path(self, key: str) -> Path:
+        return self._path(key)
+
+    def local_file(self, key: str) -> Path | None:
+        return self._path(key)
+
+
+class S3Storage(StorageBackend):
+    """S3兼容对象存储（AWS S3、MinIO 等），使用路径风格地址与 SigV4 签名
+
+    上传按 S3_PART_SIZE 分片流式读取本地文件，内存占用与文件大小无关；
+    读取时按 Range 请求流式返回。需要本地文件的场景（AI代码沙箱、缩略图）
+    下载到 cache_dir，存储键按内容寻址，缓存无需失效。
+    """
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        region: str = "us-east-1",
+        cache_dir: str | Path = "cache/storage",
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.endpoint_url = endpoint_url.rstrip("/")
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.cache_dir = Path(cache_dir)
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                transport=self._transport, timeout=httpx.Timeout(60.0, connect=10.0)
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _url(self, key: str = "") -> str:
+        return f"{self.endpoint_url}/{self.bucket}/{quote(key, safe='/-_.~')}"
+
+    def _sign(self, request: httpx.Request) -> None:
+        """为请求添加 AWS Signature Version 4 签名头"""
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        scope = f"{now:%Y%m%d}/{self.region}/s3/aws4_request"
+
+        request.headers["x-amz-date"] = amz_date
+        request.headers.setdefault("x-amz-content-sha256", "UNSIGNED-PAYLOAD")
+        signed = {"host": request.url.netloc.decode()}
+        signed.update(
+            (k.lower(), v.strip()) for k, v in request.headers.items()
+            if k.lower().startswith("x-amz-")
+        )
+        names = sorted(signed)
+        query = sorted(
+            (quote(k, safe="-_.~"), quote(v, safe="-_.~"))
+            for k, v in request.url.params.multi_items()
+        )
+        canonical_request = "\n".join([
+            request.method,
+            request.url.raw_path.split(b"?")[0].decode(),
+            "&".join(f"{k}={v}" for k, v in query),
+            "".join(f"{name}:{signed[name]}\n" for name in names),
+            ";".join(names),
+            request.headers["x-amz-content-sha256"],
+        ])
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ])
+
+        key = f"AWS4{self.secret_key}".encode()
+        for part in (f"{now:%Y%m%d}", self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+        request.headers["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={';'.join(names)}, Signature={signature}"
+        )
+
+    async def _request(
+        self, method: str, key: str = "", ok: tuple[int, ...] = (200,), **kwargs
+    ) -> httpx.Response:
+        request = self.client.build_request(method, self._url(key), **kwargs)
+        self._sign(request)
+        response = await self.client.send(request)
+        if response.status_code not in ok:
+            raise StorageError(
+                f"S3 {method} {key} 失败: {response.status_code} {response.text[:200]}"
+            )
+        return response
+
+    async def save(self, key: str, source: Path) -> None:
+        size = (await aiofiles.os.stat(source)).st_size
+        if size <= S3_PART_SIZE:
+            async with aiofiles.open(source, "rb") as f:
+                await self._request("PUT", key, content=await f.read())
+        else:
+            await self._multipart_upload(key, source)
+        await aiofiles.os.remove(source)
+
+    async def _multipart_upload(self, key: str, source: Path) -> None:
+        response = await self._request("POST", key, params={"uploads": ""})
+        upload_id = ET.fromstring(response.content).findtext(f"{S3_NAMESPACE}UploadId")
+        etags = []
+        try:
+            async with aiofiles.open(source, "rb") as f:
+                while chunk := await f.read(S3_PART_SIZE):
+                    response = await self._request(
+                        "PUT",
+                        key,
+                        params={"partNumber": str(len(etags) + 1), "uploadId": upload_id},
+                        content=chunk,
+                    )
+                    etags.append(response.headers["ETag"])
+            body = "".join(
+                f"<Part><PartNumber>{n}</PartNumber><ETag>{etag}</ETag></Part>"
+                for n, etag in enumerate(etags, start=1)
+            )
+            await self._request(
+                "POST",
+                key,
+                params={"uploadId": upload_id},
+                content=f"<CompleteMultipartUpload>{body}</CompleteMultipartUpload>",
+            )
+        except BaseException:
+            await self._request(
+                "DELETE", key, ok=(200, 204, 404), params={"uploadId": upload_id}
+            )
+            raise
+
+    async def stat(self, key: str) -> int | None:
+        response = await self._request("HEAD", key, ok=(200, 404))
+        if response.status_code == 404:
+            return None
+        return int(response.headers.get("Content-Length", 0))
+
+    async def delete(self, key: str) -> None:
+        await self._request("DELETE", key, ok=(200, 204, 404))
+
+    async def move(self, src: str, dst: str) -> None:
+        response = await self._request(
+            "PUT",
+            dst,
+            ok=(200, 404),
+            headers={"x-amz-copy-source": quote(f"/{self.bucket}/{src}", safe="/-_.~")},
+        )
+        if response.status_code == 404:
+            raise FileNotFoundError(src)
+        await self.delete(src)
+
+    async def open(
+        self, key: str, start: int = 0, end: int | None = None
+    ) -> AsyncIterator[bytes]:
+        headers = {}
+        if start or end is not None:
+            headers["Range"] = f"bytes={start}-{'' if end is None else end}"
+        request = self.client.build_request("GET", self._url(key), headers=headers)
+        self._sign(request)
+        response = await self.client.send(request, stream=True)
+        try:
+            if response.status_code == 404:
+                raise FileNotFoundError(key)
+            if response.status_code not in (200, 206):
+                raise StorageError(f"S3 GET {key} 失败: {response.status_code}")
+            async for chunk in response.aiter_bytes(READ_CHUNK_SIZE):
+                yield chunk
+        finally:
+            await response.aclose()
+
+    async def list(self, prefix: str) -> list[str]:
+        return [obj.key async for batch in self._pages(prefix) for obj in batch]
+
+    async def scan(
+        self, directory: str, batch_size: int = 1000
+    ) -> AsyncIterator[ObjectBatch]:
+        async for batch in self._pages(directory, batch_size):
+            yield batch
+
+    async def _pages(
+        self, prefix: str, batch_size: int = 1000
+    ) -> AsyncIterator[ObjectBatch]:
+        """按页列举对象（ListObjectsV2）"""
+        params = {"list-type": "2", "prefix": prefix, "max-keys": str(batch_size)}
+        while True:
+            response = await self._request("GET", params=params)
+            root = ET.fromstring(response.content)
+            batch = []
+            for item in root.iter(f"{S3_NAMESPACE}Contents"):
+                modified = item.findtext(f"{S3_NAMESPACE}LastModified")
+                batch.append(StoredObject(
+                    item.findtext(f"{S3_NAMESPACE}Key"),
+                    int(item.findtext(f"{S3_NAMESPACE}Size") or 0),
+                    datetime.fromisoformat(modified.replace("Z", "+00:00")).timestamp()
+                    if modified else 0.0,
+                ))
+            if batch:
+                yield batch
+            token = root.findtext(f"{S3_NAMESPACE}NextContinuationToken")
+            if root.findtext(f"{S3_NAMESPACE}IsTruncated") != "true" or not token:
+                return
+            params["continuation-token"] = token
+
+    async def local_path(self, key: str) -> Path:
+        path = self.cache_dir / key
+        if await aiofiles.os.path.exists(path):
+            return path
+
+        await aiofiles.os.makedirs(path.parent, exist_ok=True)
+        tmp_path = path.with_name(f".{uuid.uuid4().hex}.downloading")
+        try:
+            async with aiofiles.open(tmp_path, "wb") as out:
+                async for chunk in self.open(key):
+                    await out.write(chunk)
+            await aiofiles.os.replace(tmp_path, path)
+        finally:
+            if await aiofiles.os.path.exists(tmp_path):
+                await aiofiles.os.remove(tmp_path)
+        return path
+
+
+def create_storage() -> StorageBackend:
+    """根据配置创建存储后端"""
+    if settings.STORAGE_BACKEND == "s3":
+        logger.info(f"使用S3存储: {settings.S3_ENDPOINT_URL}/{settings.S3_BUCKET}")
+        return S3Storage(
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            bucket=settings.S3_BUCKET,
+            access_key=settings.S3_ACCESS_KEY,
+            secret_key=settings.S3_SECRET_KEY,
+            region=settings.S3_REGION,
+            cache_dir=settings.STORAGE_CACHE_DIR,
+        )
+    if settings.STORAGE_BACKEND != "local":
+        raise ValueError(f"不支持的存储后端: {settings.STORAGE_BACKEND}")
+    return LocalStorage()
+
+
+# 全局实例
+storage = create_storage()
@@ -0,0 +1,127 @@
+"""阿瓦隆裁判测试"""
+
+import os
+import sys
+
+import pytest
+
+# 添加src到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from games.avalon.referee import (  # noqa: E402
+    AvalonError,
+    Phase,
+    Referee,
+    Role,
+    Side,
+    play_random_game,
+    seats,
+)
+
+
+@pytest.fixture
+def referee():
+    return Referee()
+
+
+def _approve_team(referee, state, team):
+    referee.propose_team(state, state.leader, team)
+    assert referee.vote(state, [True] * 7)
+
+
+def _good_seats(state, count):
+    return [p for p in range(7) if not state.evil_mask >> p & 1][:count]
+
+
+class TestAvalonReferee:
+    """阿瓦隆规则测试"""
+
+    def test_same_seed_is_reproducible(self, referee):
+        """测试相同种子分配相同身份与队长"""
+        a, b = referee.new_game(7), referee.new_game(7)
+
+        assert a.roles == b.roles and a.leader == b.leader
+        assert sorted(a.roles) == sorted([0, 1, 2, 2, 3, 4, 5])
+        assert a.evil_mask.bit_count() == 3
+
+    def test_random_games_are_deterministic(self):
+        """测试随机策略对局可由种子复现"""
+        a, b = play_random_game(123), play_random_game(123)
+
+        assert a.phase == Phase.FINISHED
+        assert (a.winner, a.quests, a.leader) == (b.winner, b.quests, b.leader)
+
+    def test_five_rejections_lose_for_good(self, referee):
+        """测试连续5次否决邪恶方获胜"""
+        state = referee.new_game(1)
+        for _ in range(5):
+            referee.propose_team(state, state.leader, [0, 1])
+            assert not referee.vote(state, [False] * 7)
+
+        assert state.winner == Side.EVIL
+
+    def test_fourth_quest_needs_two_fails(self, referee):
+        """测试七人局第4个任务需要两张失败票"""
+        state = referee.new_game(2)
+        evil = list(seats(state.evil_mask))
+
+        _approve_team(referee, state, _good_seats(state, 2))
+        referee.play_quest(state, {p: True for p in seats(state.team)})
+        team = evil[:1] + _good_seats(state, 2)
+        _approve_team(referee, state, team)
+        assert referee.play_quest(state, {p: p not in evil for p in team}) == 1
+        _approve_team(referee, state, _good_seats(state, 3))
+        referee.play_quest(state, {p: True for p in seats(state.team)})
+        assert (state.quest_no, state.successes, state.failures) == (3, 2, 1)
+
+        team = evil[:1] + _good_seats(state, 3)
+        _approve_team(referee, state, team)
+        referee.play_quest(state, {p: p not in evil for p in team})
+
+        assert state.phase == Phase.ASSASSINATION
+        assert state.successes == 3
+
+    def test_good_player_cannot_fail_quest(self, referee):
+        """测试正义方不能出失败票"""
+        state = referee.new_game(3)
+        team = _good_seats(state, 2)
+        _approve_team(referee, state, team)
+
+        with pytest.raises(AvalonError):
+            referee.play_quest(state, {team[0]: False, team[1]: True})
+        assert state.phase == Phase.QUEST
+
+    def test_assassination_decides_winner(self, referee):
+        """测试刺中梅林邪恶方获胜"""
+        state = referee.new_game(4)
+        state.phase = Phase.ASSASSINATION
+
+        hit = referee.assassinate(
+            state, state.seat_of(Role.ASSASSIN), state.seat_of(Role.MERLIN)
+        )
+
+        assert hit and state.winner == Side.EVIL
+        assert referee.outcomes(state).count("win") == 3
+
+    def test_knowledge(self, referee):
+        """测试夜晚视野"""
+        state = referee.new_game(5)
+        oberon = state.seat_of(Role.OBERON)
+        assassin = state.seat_of(Role.ASSASSIN)
+
+        assert referee.known_players(state, state.seat_of(Role.MERLIN)) == state.evil_mask
+        assert referee.known_players(state, oberon) == 0
+        assert referee.known_players(state, assassin) == 1 << state.seat_of(Role.MORGANA)
+        obs = referee.observation(state, assassin)
+        assert obs["role"] == "assassin" and obs["team_size"] == 2
+
+    def test_rejects_wrong_leader_and_team_size(self, referee):
+        """测试拒绝非队长提议与错误的队伍人数"""
+        state = referee.new_game(6)
+        other = (state.leader + 1) % 7
+
+        with pytest.raises(AvalonError):
+            referee.propose_team(state, other, [0, 1])
+        with pytest.raises(AvalonError):
+            referee.propose_team(state, state.leader, [0, 0])
+        assert state.phase == Phase.TEAM_PROPOSAL
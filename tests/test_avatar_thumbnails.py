@@ -0,0 +1,89 @@
+"""头像缩略图测试"""
+
+import os
+import sys
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+# 添加src到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from api.v1.files.avatars import router as avatars_router  # noqa: E402
+from models.admin import FileMapping  # noqa: E402
+from services.image_service import (  # noqa: E402
+    THUMBNAIL_SIZES,
+    image_service,
+    render_thumbnails,
+    thumbnail_path,
+)
+
+
+@pytest.fixture
+def photo(tmp_path):
+    path = tmp_path / "abcdef.png"
+    Image.new("RGBA", (400, 200), (255, 0, 0, 128)).save(path)
+    return path
+
+
+class TestRenderThumbnails:
+    """缩略图生成测试"""
+
+    def test_generates_square_webp_variants(self, photo):
+        """测试生成各尺寸的正方形WebP缩略图并保留透明通道"""
+        paths = render_thumbnails(str(photo), THUMBNAIL_SIZES)
+
+        assert paths == [str(thumbnail_path(photo, s)) for s in THUMBNAIL_SIZES]
+        for size, path in zip(THUMBNAIL_SIZES, paths):
+            with Image.open(path) as thumb:
+                assert thumb.format == "WEBP"
+                assert thumb.size == (size, size)
+                assert thumb.mode == "RGBA"
+
+    def test_rejects_non_image(self, tmp_path):
+        """测试非图片文件生成失败且不留下临时文件"""
+        path = tmp_path / "fake.png"
+        path.write_bytes(b"not an image")
+
+        with pytest.raises(Exception):
+            render_thumbnails(str(path), THUMBNAIL_SIZES)
+        assert os.listdir(tmp_path) == ["fake.png"]
+
+    async def test_process_pool(self, photo):
+        """测试在进程池中生成缩略图"""
+        try:
+            result = await image_service.generate_thumbnails(str(photo), (32,))
+        finally:
+            image_service.shutdown()
+
+        assert result == {32: str(thumbnail_path(photo, 32))}
+
+
+class TestAvatarEndpoint:
+    """头像接口测试"""
+
+    async def test_serves_variant_with_immutable_cache(self, photo):
+        """测试按尺寸返回缩略图并带长期缓存头"""
+        await FileMapping.create(
+            file_id="avatar-test",
+            original_filename="me.png",
+            file_type="image",
+            upload_user_id=1,
+            file_path=str(photo),
+            file_hash="abcdef",
+        )
+        render_thumbnails(str(photo), THUMBNAIL_SIZES)
+        app = FastAPI()
+        app.include_router(avatars_router, prefix="/avatars")
+        client = TestClient(app)
+
+        response = client.get("/avatars/abcdef", params={"size": 64})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/webp"
+        assert "immutable" in response.headers["cache-control"]
+        assert response.headers["etag"] == '"abcdef-64"'
+        assert client.get("/avatars/abcdef", params={"size": 50}).status_code == 400
+        assert client.get("/avatars/unknown").status_code == 404
@@ -0,0 +1,249 @@
+"""AI代码沙箱测试"""
+
+import os
+import sys
+import zipfile
+
+import pytest
+
+# 添加src到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from games.bot_cache import BotCacheError, CompiledBotCache, file_sha256  # noqa: E402
+from games.sandbox import (  # noqa: E402
+    BotWorkerPool,
+    SandboxLimits,
+    play_rps_match,
+)
+
+CYCLE_BOT = """
+MOVES = ["rock", "paper", "scissors"]
+
+def get_move(state):
+    return MOVES[state["round"] % 3]
+"""
+
+SLOW_BOT = """
+import time
+
+def get_move(state):
+    time.sleep(5)
+    return "rock"
+"""
+
+NETWORK_BOT = """
+import socket
+
+def get_move(state):
+    socket.create_connection(("127.0.0.1", 80), timeout=1)
+    return "rock"
+"""
+
+RAW_SOCKET_BOT = """
+import _socket
+
+def get_move(state):
+    sock = _socket.socket(_socket.AF_INET, _socket.SOCK_STREAM)
+    sock.settimeout(1)
+    sock.connect(("127.0.0.1", 80))
+    return "rock"
+"""
+
+PICKLE_BOT = """
+import os
+
+class Exploit:
+    def __reduce__(self):
+        return (os.system, ("touch " + os.path.join({marker!r}),))
+
+def get_move(state):
+    return Exploit()
+"""
+
+ENV_BOT = """
+import os
+
+def get_move(state):
+    return os.environ.get("SANDBOX_TEST_SECRET", "cleared")
+"""
+
+INHERIT_BOT = """
+import os
+import sys
+
+def get_move(state):
+    fds = len(os.listdir("/proc/self/fd"))
+    return f"{fds}|{'settings' in sys.modules or 'games' in sys.modules}"
+"""
+
+
+def _write_bot(tmp_path, name, source):
+    path = tmp_path / name
+    path.write_text(source)
+    return str(path)
+
+
+def _pool(tmp_path, path, **kwargs):
+    cache = CompiledBotCache(str(tmp_path / "cache"))
+    return BotWorkerPool(path, size=1, cache=cache, **kwargs)
+
+
+class TestBotSandbox:
+    """沙箱执行测试"""
+
+    def test_worker_stays_warm_across_moves(self, tmp_path):
+        """测试同一工作进程连续返回动作"""
+        with _pool(tmp_path, _write_bot(tmp_path, "cycle.py", CYCLE_BOT)) as pool:
+            with pool.checkout() as bot:
+                moves = [bot.request_move({"round": i}).move for i in range(3)]
+
+        assert moves == ["rock", "paper", "scissors"]
+        assert pool.metrics.moves == 3
+
+    def test_move_timeout_restarts_worker(self, tmp_path):
+        """测试超时后工作进程被替换"""
+        limits = SandboxLimits(move_timeout=0.2)
+        with _pool(tmp_path, _write_bot(tmp_path, "slow.py", SLOW_BOT), limits=limits) as pool:
+            with pool.checkout() as bot:
+                result = bot.request_move({"round": 0})
+
+            assert result.timed_out
+            assert pool.metrics.restarts == 1
+            with pool.checkout() as bot:
+                assert bot.worker.is_alive
+
+    def test_network_is_blocked(self, tmp_path):
+        """测试沙箱禁止网络访问"""
+        with _pool(tmp_path, _write_bot(tmp_path, "net.py", NETWORK_BOT)) as pool:
+            with pool.checkout() as bot:
+                result = bot.request_move({"round": 0})
+
+        assert not result.success
+        assert "OSError" in result.error or "PermissionError" in result.error
+
+    def test_raw_socket_module_is_blocked(self, tmp_path):
+        """测试绕过 socket 模块直接使用 _socket 同样无法联网"""
+        with _pool(tmp_path, _write_bot(tmp_path, "raw.py", RAW_SOCKET_BOT)) as pool:
+            with pool.checkout() as bot:
+                result = bot.request_move({"round": 0})
+
+        assert not result.success
+        assert "OSError" in result.error or "PermissionError" in result.error
+
+    def test_returned_objects_are_never_unpickled(self, tmp_path):
+        """测试AI代码返回的对象不会在父进程中反序列化执行"""
+        marker = tmp_path / "pwned"
+        source = PICKLE_BOT.format(marker=str(marker))
+        with _pool(tmp_path, _write_bot(tmp_path, "pickle.py", source)) as pool:
+            with pool.checkout() as bot:
+                result = bot.request_move({"round": 0})
+
+        assert not result.success
+        assert not marker.exists()
+
+    def test_non_string_move_is_rejected(self, tmp_path):
+        """测试非字符串动作视为失败"""
+        source = "def get_move(state):\n    return ['rock']\n"
+        with _pool(tmp_path, _write_bot(tmp_path, "list.py", source)) as pool:
+            with pool.checkout() as bot:
+                result = bot.request_move({"round": 0})
+
+        assert not result.success
+        assert result.error == "动作必须是字符串"
+
+    def test_environment_is_cleared(self, tmp_path, monkeypatch):
+        """测试工作进程中看不到父进程的环境变量"""
+        monkeypatch.setenv("SANDBOX_TEST_SECRET", "leaked")
+        with _pool(tmp_path, _write_bot(tmp_path, "env.py", ENV_BOT)) as pool:
+            with pool.checkout() as bot:
+                assert bot.request_move({"round": 0}).move == "cleared"
+
+    def test_parent_fds_and_modules_not_inherited(self, tmp_path):
+        """测试工作进程拿不到父进程打开的文件和已导入的模块"""
+        leaked = [open(tmp_path / f"secret{i}", "w") for i in range(5)]
+        try:
+            with _pool(tmp_path, _write_bot(tmp_path, "inherit.py", INHERIT_BOT)) as pool:
+                with pool.checkout() as bot:
+                    fds, imported = bot.request_move({"round": 0}).move.split("|")
+        finally:
+            for f in leaked:
+                f.close()
+
+        # 标准输入输出、通信管道以及 listdir 自身打开的目录
+        assert int(fds) <= 5
+        assert imported == "False"
+
+    def test_play_rps_match(self, tmp_path):
+        """测试两个AI代码对局"""
+        path = _write_bot(tmp_path, "cycle.py", CYCLE_BOT)
+        with _pool(tmp_path, path) as pool1, _pool(tmp_path, path) as pool2:
+            result = play_rps_match(pool1, pool2, rounds=6)
+
+        assert result["draws"] == 6
+        assert result["forfeited_rounds"] == 0
+
+
+class TestCompiledBotCache:
+    """编译缓存测试"""
+
+    def test_bytecode_cached_by_content_hash(self, tmp_path):
+        """测试相同内容只编译一次"""
+        cache = CompiledBotCache(str(tmp_path / "cache"))
+        path = _write_bot(tmp_path, "cycle.py", CYCLE_BOT)
+        copy = _write_bot(tmp_path, "copy.py", CYCLE_BOT)
+
+        cache.load_code(path)
+        cache.load_code(copy, file_sha256(copy))
+
+        assert cache.misses == 1
+        assert cache.hits == 1
+
+    def test_zip_archive_bot(self, tmp_path):
+        """测试压缩包AI代码解压后运行"""
+        archive = tmp_path / "bot.zip"
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("main.py", "from helper import MOVE\n\ndef get_move(state):\n    return MOVE\n")
+            zf.writestr("helper.py", "MOVE = 'paper'\n")
+
+        with _pool(tmp_path, str(archive)) as pool:
+            with pool.checkout() as bot:
+                assert bot.request_move({"round": 0}).move == "paper"
+
+    def test_lru_eviction(self, tmp_path):
+        """测试超出容量时淘汰最久未使用的条目"""
+        cache = CompiledBotCache(str(tmp_path / "cache"), max_bytes=1)
+        first = _write_bot(tmp_path, "a.py", "A = 1\n")
+        second = _write_bot(tmp_path, "b.py", "B = 2\n")
+
+        cache.load_code(first)
+        cache.load_code(second)
+
+        assert len(list((tmp_path / "cache").glob("*.bin"))) <= 1
+
+    def test_zip_bomb_rejected(self, tmp_path):
+        """测试压缩比异常的压缩包不会被解压"""
+        cache = CompiledBotCache(str(tmp_path / "cache"))
+        archive = tmp_path / "bomb.zip"
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("main.py", "def get_move(state):\n    return 'rock'\n")
+            zf.writestr("padding.txt", b"\0" * (1024 * 1024))
+
+        with pytest.raises(BotCacheError, match="压缩比异常"):
+            cache.load_bot(str(archive))
+        assert not list((tmp_path / "cache").glob("*/"))
+
+    def test_leased_archive_not_evicted(self, tmp_path):
+        """测试正在使用的解压目录不会被淘汰，归还后才会被淘汰"""
+        cache = CompiledBotCache(str(tmp_path / "cache"), max_bytes=1)
+        archive = tmp_path / "bot.zip"
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("main.py", "def get_move(state):\n    return 'rock'\n")
+
+        lease = cache.lease(str(archive))
+        _, search_path = cache.load_bot(str(archive))
+        cache.load_code(_write_bot(tmp_path, "a.py", "A = 1\n"))
+        assert os.path.isdir(search_path)
+
+        lease.release()
+        cache.load_code(_write_bot(tmp_path, "b.py", "B = 2\n"))
+        assert not os.path.isdir(search_path)
@@ -0,0 +1,572 @@
+"""缓存管理器测试"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+import fakeredis
+import pytest
+
+# 添加src到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils.cache import (  # noqa: E402
+    CODEC_JSON,
+    CODEC_MSGPACK,
+    CODEC_ORJSON,
+    FLAG_ZSTD,
+    MISSING,
+    CacheManager,
+    CircuitBreaker,
+    LocalCache,
+    cached,
+    cached_many,
+    clear_role_cache,
+    clear_user_cache,
+    decode_value,
+    encode_value,
+    resolve_codec,
+    user_tag,
+)
+from utils import cache as cache_module  # noqa: E402
+from settings.config import settings  # noqa: E402
+
+
+@pytest.fixture
+async def manager(monkeypatch):
+    """使用内存Redis的缓存管理器，并替换全局实例"""
+    manager = CacheManager()
+    server = fakeredis.FakeServer()
+    manager.redis = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    manager.binary = fakeredis.FakeAsyncRedis(server=server)
+    monkeypatch.setattr(cache_module, "cache_manager", manager)
+    yield manager
+    await manager.disconnect()
+
+
+async def _replica(server):
+    """连接到同一Redis并已订阅失效消息的缓存管理器"""
+    manager = CacheManager()
+    manager.redis = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    manager.binary = fakeredis.FakeAsyncRedis(server=server)
+    manager._start_listener()
+    for _ in range(100):
+        if manager._subscribed:
+            break
+        await asyncio.sleep(0.01)
+    return manager
+
+
+@pytest.fixture
+async def replicas():
+    server = fakeredis.FakeServer()
+    managers = [await _replica(server), await _replica(server)]
+    yield managers
+    for manager in managers:
+        await manager.disconnect()
+
+
+class TestInvalidation:
+    """缓存失效测试"""
+
+    async def test_tags_invalidate_only_their_entries(self, manager):
+        """测试按标签删除登记的缓存，标签集合本身也被删除"""
+        await manager.set("profile:1", {"name": "a"}, tags=[user_tag(1)])
+        await manager.set("profile:2", {"name": "b"}, tags=[user_tag(2)])
+        await manager.set("userinfo:1", {"id": 1})
+        await manager.set("role_menus:7", [1, 2])
+
+        assert await clear_user_cache(1) == 2
+        assert await manager.get("profile:1") is None
+        assert await manager.get("userinfo:1") is None
+        assert await manager.get("profile:2") == {"name": "b"}
+        assert not await manager.redis.exists(manager.tag_key(user_tag(1)))
+
+        assert await clear_role_cache(7) == 1
+        assert await manager.get("role_menus:7") is None
+
+    async def test_clear_pattern_uses_scan(self, manager, monkeypatch):
+        """测试按模式清除不再调用 KEYS"""
+        monkeypatch.setattr(cache_module, "UNLINK_BATCH", 2)
+
+        async def keys(*args, **kwargs):
+            raise AssertionError("KEYS must not be used")
+
+        monkeypatch.setattr(manager.redis, "keys", keys)
+        for i in range(5):
+            await manager.set(f"pattern_test:{i}", i)
+        await manager.set("other_key", 1)
+
+        assert await manager.clear_pattern("pattern_test:*") == 5
+        assert await manager.get("other_key") == 1
+
+    async def test_decorator_registers_tags(self, manager):
+        """测试装饰器写入的缓存随用户标签失效"""
+        calls = 0
+
+        @cached("detail", ttl=60, tags=lambda user_id: [user_tag(user_id)])
+        async def detail(user_id):
+            nonlocal calls
+            calls += 1
+            return {"id": user_id}
+
+        await detail(5)
+        await detail(5)
+        assert calls == 1
+
+        await clear_user_cache(5)
+        await detail(5)
+        assert calls == 2
+
+
+class TestLocalCache:
+    """进程内L1缓存测试"""
+
+    def test_lru_bounded_by_entries_and_bytes(self):
+        """测试按条目数和字节数淘汰最久未使用的条目"""
+        local = LocalCache(max_entries=2, max_bytes=10)
+        local.set("a", "1234", 60)
+        local.set("b", "1234", 60)
+        local.get("a")
+        local.set("c", "1234", 60)
+
+        assert local.get("b") is None
+        assert local.get("a") == "1234"
+
+        local.set("d", "12345678", 60)
+        assert len(local) == 1 and local.bytes == 8
+
+        local.set("e", "x", 0)
+        assert local.get("e") is None
+
+    async def test_hit_served_without_redis(self, replicas, monkeypatch):
+        """测试L1命中时不访问Redis，并按前缀计数"""
+        manager, _ = replicas
+        await manager.set("userinfo:1", {"id": 1})
+
+        async def get(key):
+            raise AssertionError("L1 hit must not reach Redis")
+
+        monkeypatch.setattr(manager.redis, "get", get)
+        assert await manager.get("userinfo:1") == {"id": 1}
+        assert manager.get_stats()["prefixes"]["userinfo"]["local_hits"] == 1
+
+    async def test_idle_subscription_keeps_local_cache(self, monkeypatch):
+        """测试频道空闲超过等待超时时订阅不中断，L1不被清空"""
+        monkeypatch.setattr(cache_module, "PUBSUB_POLL_TIMEOUT", 0.02)
+        server = fakeredis.FakeServer()
+        first, second = await _replica(server), await _replica(server)
+        try:
+            await second.set("userinfo:1", {"name": "old"})
+            await asyncio.sleep(0.15)
+            assert second._subscribed
+            assert second.local.get("userinfo:1") is not None
+
+            await first.set("userinfo:1", {"name": "new"})
+            for _ in range(100):
+                if second.local.get("userinfo:1") is None:
+                    break
+                await asyncio.sleep(0.01)
+            assert await second.get("userinfo:1") == {"name": "new"}
+        finally:
+            await first.disconnect()
+            await second.disconnect()
+
+    async def test_invalidation_during_write_skips_local_fill(self, replicas, monkeypatch):
+        """测试写入Redis期间收到失效消息时不把旧值写入L1"""
+        manager, _ = replicas
+        pipeline = manager.binary.pipeline
+
+        def racing_pipeline(*args, **kwargs):
+            pipe = pipeline(*args, **kwargs)
+            execute = pipe.execute
+
+            async def execute_then_invalidate():
+                result = await execute()
+                # 其他副本的失效消息在写入返回前到达
+                manager.local.delete("userinfo:1")
+                return result
+
+            pipe.execute = execute_then_invalidate
+            return pipe
+
+        monkeypatch.setattr(manager.binary, "pipeline", racing_pipeline)
+        assert await manager.set_many({"userinfo:1": {"name": "old"}})
+
+        assert manager.local.get("userinfo:1") is None
+
+    async def test_write_invalidates_other_replicas(self, replicas):
+        """测试一个副本写入或删除后，其他副本的L1条目被丢弃"""
+        first, second = replicas
+        await first.set("userinfo:1", {"name": "old"})
+        assert await second.get("userinfo:1") == {"name": "old"}
+        assert second.local.get("userinfo:1") is not None
+
+        await first.set("userinfo:1", {"name": "new"})
+        for _ in range(100):
+            if second.local.get("userinfo:1") is None:
+                break
+            await asyncio.sleep(0.01)
+        assert await second.get("userinfo:1") == {"name": "new"}
+
+        await first.delete("userinfo:1")
+        for _ in range(100):
+            if second.local.get("userinfo:1") is None:
+                break
+            await asyncio.sleep(0.01)
+        assert await second.get("userinfo:1") is None
+
+
+class TestStampedeProtection:
+    """缓存击穿保护测试"""
+
+    async def test_concurrent_misses_call_once(self, manager):
+        """测试同一键的并发未命中只执行一次原函数"""
+        calls = 0
+        release = asyncio.Event()
+
+        @cached("hot", ttl=60)
+        async def hot(key):
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {"key": key}
+
+        tasks = [asyncio.create_task(hot("a")) for _ in range(10)]
+        await asyncio.sleep(0.01)
+        release.set()
+
+        assert await asyncio.gather(*tasks) == [{"key": "a"}] * 10
+        assert calls == 1
+
+    async def test_waits_for_other_replica_holding_lock(self, manager, monkeypatch):
+        """测试其他副本持有重建锁时等待其写入，而不是再查一次数据库"""
+        monkeypatch.setattr(cache_module, "LOCK_POLL_INTERVAL", 0.01)
+        calls = 0
+
+        @cached("remote", ttl=60)
+        async def remote():
+            nonlocal calls
+            calls += 1
+            return "local"
+
+        key = manager.cache_key("remote")
+        assert await manager.acquire_lock(f"lock:{key}") is not None
+
+        async def other_replica():
+            await asyncio.sleep(0.05)
+            await manager.set(key, {"v": "remote", "exp": time.time() + 60, "delta": 0.0})
+
+        writer = asyncio.create_task(other_replica())
+        assert await remote() == "remote"
+        assert calls == 0
+        await writer
+
+    async def test_stale_value_served_while_refreshing(self, manager):
+        """测试过期后先返回旧值，由后台刷新"""
+        version = 0
+
+        @cached("stale", ttl=60, stale_ttl=60)
+        async def stale():
+            nonlocal version
+            version += 1
+            return version
+
+        assert await stale() == 1
+        key = manager.cache_key("stale")
+        await manager.set(key, {"v": 1, "exp": time.time() - 1, "delta": 0.0})
+
+        assert await stale() == 1
+        await asyncio.gather(*manager._background)
+        assert await stale() == 2
+
+    def test_early_expiration_is_probabilistic(self, monkeypatch):
+        """测试临近过期时按重建耗时随机提前刷新"""
+        entry = {"v": 1, "exp": time.time() + 0.5, "delta": 1.0}
+
+        monkeypatch.setattr(cache_module.random, "random", lambda: 0.0)
+        assert not cache_module._should_refresh(entry, beta=1.0)
+        monkeypatch.setattr(cache_module.random, "random", lambda: 0.9)
+        assert cache_module._should_refresh(entry, beta=1.0)
+        assert not cache_module._should_refresh(entry, beta=0.0)
+
+
+class TestCodec:
+    """缓存值编码测试"""
+
+    @pytest.mark.parametrize("codec", [CODEC_JSON, CODEC_ORJSON])
+    def test_roundtrip_with_header_byte(self, codec):
+        """测试各编码写入编码头并可读回"""
+        if not cache_module._codec_available(codec):
+            pytest.skip("codec library not installed")
+        value = {"id": 1, "tags": ["a", "b"], "name": "测试"}
+
+        data = encode_value(value, codec)
+
+        assert data[0] == codec
+        assert decode_value(data) == value
+
+    def test_large_values_are_compressed(self):
+        """测试超过阈值的数据用zstd压缩"""
+        if cache_module.zstandard is None:
+            pytest.skip("zstandard not installed")
+        value = [{"id": i, "name": "user"} for i in range(1000)]
+
+        data = encode_value(value, CODEC_JSON, compress_min_bytes=1024)
+
+        assert data[0] == CODEC_JSON | FLAG_ZSTD
+        assert decode_value(data) == value
+        assert encode_value([1], CODEC_JSON, compress_min_bytes=1024)[0] == CODEC_JSON
+
+    def test_msgpack_preserves_datetime(self):
+        """测试msgpack编码保留日期时间类型"""
+        pytest.importorskip("msgpack")
+        value = {"created_at": datetime(2024, 5, 1, 12, 30), 7: "int key"}
+
+        assert decode_value(encode_value(value, CODEC_MSGPACK)) == value
+
+    def test_missing_library_falls_back(self, monkeypatch):
+        """测试所需库未安装时退化为可用的编码"""
+        monkeypatch.setattr(cache_module, "msgpack", None)
+        monkeypatch.setattr(cache_module, "orjson", None)
+
+        assert resolve_codec("msgpack") == CODEC_JSON
+        with pytest.raises(ValueError):
+            resolve_codec("pickle")
+
+    async def test_legacy_json_entries_remain_readable(self, manager):
+        """测试升级前写入的JSON文本仍可读取"""
+        await manager.redis.set("legacy:1", '{"name": "旧数据"}')
+
+        assert await manager.get("legacy:1") == {"name": "旧数据"}
+
+
+class TestNegativeCaching:
+    """“记录不存在”缓存测试"""
+
+    async def test_sentinel_distinguishes_cached_none(self, manager):
+        """测试未缓存返回 MISSING，缓存的“不存在”返回 None"""
+        assert await manager.get("userinfo:9", MISSING) is MISSING
+
+        await manager.set_negative("userinfo:9")
+
+        assert await manager.get("userinfo:9", MISSING) is None
+        assert 0 < await manager.redis.ttl("userinfo:9") <= 30
+
+        await clear_user_cache(9)
+        assert await manager.get("userinfo:9", MISSING) is MISSING
+
+    async def test_decorator_caches_none_until_invalidated(self, manager):
+        """测试查不到的记录只查询一次数据库，创建后按标签失效"""
+        calls = 0
+
+        @cached("profile", ttl=300, negative_ttl=10, tags=lambda user_id: [user_tag(user_id)])
+        async def profile(user_id):
+            nonlocal calls
+            calls += 1
+            return None
+
+        assert await profile(404) is None
+        assert await profile(404) is None
+        assert calls == 1
+        assert 0 < await manager.redis.ttl(manager.cache_key("profile", 404)) <= 10
+
+        await clear_user_cache(404)
+        await profile(404)
+        assert calls == 2
+
+    async def test_user_detail_caches_missing_user_until_created(self, manager):
+        """测试用户详情对不存在的用户按短时过期缓存，创建用户后失效"""
+        from models.admin import User
+        from schemas.users import UserCreate
+        from services.user_service import user_service
+
+        probe = await User.create(username="negcache_probe", email="probe@example.com")
+        await probe.delete()
+        next_id = probe.id + 1
+
+        assert await user_service.get_user_detail(next_id) is None
+        keys = [key async for key in manager.redis.scan_iter("user_detail*")]
+        assert len(keys) == 1
+        assert 0 < await manager.redis.ttl(keys[0]) <= settings.CACHE_NEGATIVE_TTL
+
+        await user_service.create_user(
+            UserCreate(
+                username="negcache_user", email="negcache@example.com", password="Passw0rd123"
+            )
+        )
+        try:
+            user = await user_service.get_user_detail(next_id)
+            assert user["id"] == next_id and user["username"] == "negcache_user"
+        finally:
+            await User.filter(username="negcache_user").delete()
+
+    async def test_negative_caching_can_be_disabled(self, manager):
+        """测试 negative_ttl=0 时不缓存 None"""
+        calls = 0
+
+        @cached("nocache", negative_ttl=0)
+        async def lookup():
+            nonlocal calls
+            calls += 1
+
+        await lookup()
+        await lookup()
+        assert calls == 2
+
+
+class TestBatchOperations:
+    """批量读写测试"""
+
+    async def test_get_set_delete_many(self, manager):
+        """测试批量读写与按键指定的过期时间"""
+        assert await manager.set_many(
+            {"item:1": {"id": 1}, "item:2": None, "item:3": [3]},
+            ttl={"item:1": 100, "item:2": 10},
+        )
+
+        found = await manager.get_many(["item:1", "item:2", "item:3", "item:4"])
+
+        assert found == {"item:1": {"id": 1}, "item:2": None, "item:3": [3]}
+        assert 90 < await manager.redis.ttl("item:1") <= 100
+        assert await manager.redis.ttl("item:2") <= 10
+        assert await manager.redis.ttl("item:3") > 100  # 默认 CACHE_TTL
+
+        assert await manager.delete_many(["item:1", "item:3", "item:4"]) == 2
+        assert await manager.get_many(["item:1", "item:2"]) == {"item:2": None}
+
+    async def test_cached_many_loads_only_missing_ids(self, manager):
+        """测试批量缓存只为未命中的ID查询一次"""
+        requested = []
+
+        @cached_many("card", tags=lambda user_id: [user_tag(user_id)])
+        async def cards(user_ids):
+            requested.append(list(user_ids))
+            return {user_id: {"id": user_id} for user_id in user_ids if user_id != 3}
+
+        assert await cards([1, 2]) == {1: {"id": 1}, 2: {"id": 2}}
+        assert await cards([2, 3, 1, 3]) == {2: {"id": 2}, 1: {"id": 1}}
+        assert await cards([3, 2]) == {2: {"id": 2}}
+        assert requested == [[1, 2], [3]]
+
+        await clear_user_cache(2)
+        await cards([1, 2])
+        assert requested[-1] == [2]
+
+
+class CountingRedis(fakeredis.FakeAsyncRedis):
+    """记录GET调用次数的内存Redis"""
+
+    calls = 0
+
+    async def get(self, name):
+        CountingRedis.calls += 1
+        return await super().get(name)
+
+
+class TestCircuitBreaker:
+    """熔断与重连测试"""
+
+    def test_half_open_allows_single_probe(self, monkeypatch):
+        """测试冷却后只放行一个探测调用，探测失败重新打开，成功则关闭"""
+        now = [100.0]
+        monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=5)
+
+        assert not breaker.record_failure()
+        assert breaker.record_failure()
+        assert not breaker.allow()
+
+        now[0] += 5
+        assert breaker.allow()
+        assert not breaker.allow()
+        assert breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+
+        now[0] += 5
+        assert breaker.allow()
+        assert breaker.record_success()
+        assert breaker.allow() and breaker.allow()
+
+    async def test_open_breaker_skips_redis(self, monkeypatch):
+        """测试连续失败后不再访问Redis，直到半开探测成功"""
+        monkeypatch.setattr(settings, "REDIS_RECONNECT_MIN_DELAY", 60)
+        server = fakeredis.FakeServer()
+        manager = CacheManager()
+        manager.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+        manager.redis = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        manager.binary = CountingRedis(server=server)
+        CountingRedis.calls = 0
+        await manager.set("item:1", [1])
+
+        server.connected = False
+        for _ in range(3):
+            assert await manager.get("item:1") is None
+        assert manager.breaker.state == CircuitBreaker.OPEN
+        assert manager._reconnector is not None
+
+        server.connected = True
+        assert await manager.get("item:1") is None
+        assert not await manager.set("item:2", [2])
+        assert await manager.acquire_lock("lock:item:1")
+        assert CountingRedis.calls == 3
+
+        manager.breaker.opened_at -= 60
+        assert await manager.get("item:1") == [1]
+        assert manager.breaker.state == CircuitBreaker.CLOSED
+        assert manager.client() is manager.redis
+        await manager.disconnect()
+
+    async def test_background_ping_closes_breaker(self, monkeypatch):
+        """测试熔断期间后台PING成功后关闭熔断器，不必等待冷却结束"""
+        monkeypatch.setattr(settings, "REDIS_RECONNECT_MIN_DELAY", 0.01)
+        server = fakeredis.FakeServer()
+        manager = CacheManager()
+        manager.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+        manager.redis = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        manager.binary = fakeredis.FakeAsyncRedis(server=server)
+
+        server.connected = False
+        await manager.get("item:1")
+        assert manager.client() is None
+        await asyncio.sleep(0.05)
+        assert manager.breaker.state == CircuitBreaker.OPEN
+
+        server.connected = True
+        for _ in range(100):
+            if manager.breaker.state == CircuitBreaker.CLOSED:
+                break
+            await asyncio.sleep(0.01)
+        assert manager.breaker.state == CircuitBreaker.CLOSED
+        assert manager._reconnector is None
+        await manager.disconnect()
+
+    async def test_reconnect_after_failed_startup(self, monkeypatch):
+        """测试启动时Redis不可用，之后在后台重连成功"""
+        monkeypatch.setattr(settings, "REDIS_RECONNECT_MIN_DELAY", 0.01)
+        server = fakeredis.FakeServer()
+        server.connected = False
+        manager = CacheManager()
+        monkeypatch.setattr(
+            manager,
+            "_client",
+            lambda decode_responses: fakeredis.FakeAsyncRedis(
+                server=server, decode_responses=decode_responses
+            ),
+        )
+
+        await manager.connect()
+        assert manager.redis is None
+        assert not await manager.set("item:1", [1])
+
+        server.connected = True
+        for _ in range(100):
+            if manager.redis is not None:
+                break
+            await asyncio.sleep(0.01)
+        assert await manager.set("item:1", [1])
+        assert await manager.get("item:1") == [1]
+        await manager.disconnect()
+        assert manager._reconnector is None
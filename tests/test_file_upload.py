@@ -0,0 +1,260 @@
+"""流式文件上传测试"""
+
+import hashlib
+import io
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI, Header, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+
+# 添加src到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from api.v1.files.files import download_file  # noqa: E402
+from models.admin import FileMapping, MultipartUpload  # noqa: E402
+from services.file_service import (  # noqa: E402
+    MULTIPART_ASSEMBLE_TIMEOUT,
+    MULTIPART_MIN_PART_SIZE,
+    UPLOAD_CHUNK_SIZE,
+    file_service,
+)
+
+
+@pytest.fixture
+def uploads_dir(tmp_path, monkeypatch):
+    """将上传目录指向临时目录，并跳过用户认证"""
+
+    async def fake_user():
+        return SimpleNamespace(id=1)
+
+    monkeypatch.setattr(file_service, "uploads_dir", tmp_path)
+    monkeypatch.setattr(file_service, "_authenticate_user", fake_user)
+    return tmp_path
+
+
+def _upload(content: bytes, filename: str) -> UploadFile:
+    return UploadFile(file=io.BytesIO(content), filename=filename)
+
+
+async def _chunks(data: bytes, size: int = 300 * 1024):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+class TestStreamToTemp:
+    """分块写入测试"""
+
+    async def test_writes_file_and_hashes_incrementally(self, uploads_dir):
+        """测试分块写入的内容与哈希正确"""
+        content = os.urandom(UPLOAD_CHUNK_SIZE * 2 + 123)
+
+        tmp_path, size, digest = await file_service._stream_to_temp(
+            _upload(content, "bot.zip")
+        )
+
+        assert size == len(content)
+        assert digest == hashlib.sha256(content).hexdigest()
+        assert tmp_path.read_bytes() == content
+
+    async def test_aborts_when_limit_exceeded(self, uploads_dir):
+        """测试超出大小限制时中止并清理临时文件"""
+        with pytest.raises(HTTPException) as exc_info:
+            await file_service._stream_to_temp(
+                _upload(b"x" * 5000, "big.txt"), max_size=4096
+            )
+
+        assert exc_info.value.status_code == 400
+        assert os.listdir(uploads_dir) == []
+
+
+class TestContentAddressedStore:
+    """内容寻址去重测试"""
+
+    async def test_duplicate_uploads_share_one_blob(self, uploads_dir):
+        """测试相同内容只存储一份，最后一个引用删除时才删除文件"""
+        content = b"def get_move(state):\n    return 'rock'\n"
+
+        first = await file_service.save_upload(_upload(content, "a.py"))
+        second = await file_service.save_upload(_upload(content, "b.py"))
+
+        assert first["file_path"] == second["file_path"]
+        assert first["file_id"] != second["file_id"]
+        blob = Path(first["file_path"])
+        assert blob.read_bytes() == content
+        assert blob.name == f"{first['file_hash']}.py"
+        assert [p.name for p in uploads_dir.iterdir()] == ["blobs"]
+
+        assert await file_service.delete_file(first["file_path"], first["file_id"])
+        assert blob.exists()
+        assert await file_service.delete_file(second["file_path"], second["file_id"])
+        assert not blob.exists()
+        assert not await FileMapping.filter(file_path=first["file_path"]).exists()
+
+    async def test_delete_never_removes_another_users_reference(self, uploads_dir, monkeypatch):
+        """测试不指定文件ID时只删除所属用户的引用，不会删除他人上传的同内容文件"""
+        content = b"shared content"
+        mine = await file_service.save_upload(_upload(content, "mine.txt"))
+
+        async def other_user():
+            return SimpleNamespace(id=2)
+
+        monkeypatch.setattr(file_service, "_authenticate_user", other_user)
+        theirs = await file_service.save_upload(_upload(content, "theirs.txt"))
+        path = mine["file_path"]
+
+        assert not await file_service.delete_file(path)
+        assert not await file_service.delete_file(path, user_id=3)
+        assert await file_service.delete_file(path, user_id=1)
+
+        remaining = await FileMapping.filter(file_path=path).values_list("file_id", flat=True)
+        assert remaining == [theirs["file_id"]]
+        assert Path(path).exists()
+        assert await file_service.delete_file(path, theirs["file_id"], user_id=2)
+        assert not Path(path).exists()
+
+
+class TestMultipartUpload:
+    """分片上传测试"""
+
+    async def _put(self, upload_id, number, data, checksum=None):
+        return await file_service.upload_part(
+            upload_id,
+            number,
+            _chunks(data),
+            checksum or hashlib.sha256(data).hexdigest(),
+        )
+
+    async def test_resume_uploads_only_missing_parts(self, uploads_dir):
+        """测试断线后只重传缺失分片，合并结果与原文件一致"""
+        part_size = MULTIPART_MIN_PART_SIZE
+        content = os.urandom(part_size * 2 + 777)
+        parts = [content[i:i + part_size] for i in range(0, len(content), part_size)]
+
+        session = await file_service.init_multipart_upload(
+            "bot.zip", len(content), part_size
+        )
+        upload_id = session["upload_id"]
+        assert session["part_count"] == 3
+
+        await self._put(upload_id, 3, parts[2])
+        await self._put(upload_id, 1, parts[0])
+        progress = await file_service.get_multipart_upload(upload_id)
+        assert progress["uploaded_parts"] == [1, 3]
+        assert progress["missing_parts"] == [2]
+        with pytest.raises(HTTPException):
+            await file_service.complete_multipart_upload(upload_id)
+
+        await self._put(upload_id, 2, parts[1])
+        file_info = await file_service.complete_multipart_upload(
+            upload_id, hashlib.sha256(content).hexdigest()
+        )
+
+        assert Path(file_info["file_path"]).read_bytes() == content
+        assert file_info["file_hash"] == hashlib.sha256(content).hexdigest()
+        assert not (uploads_dir / "multipart" / upload_id).exists()
+        again = await file_service.complete_multipart_upload(upload_id)
+        assert again["file_id"] == file_info["file_id"]
+
+    async def test_rejects_corrupt_or_wrong_size_part(self, uploads_dir):
+        """测试校验和或大小不符的分片不会保留"""
+        part_size = MULTIPART_MIN_PART_SIZE
+        session = await file_service.init_multipart_upload(
+            "bot.7z", part_size + 10, part_size
+        )
+        upload_id = session["upload_id"]
+        data = os.urandom(part_size)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await self._put(upload_id, 1, data, checksum="0" * 64)
+        assert exc_info.value.status_code == 400
+        with pytest.raises(HTTPException):
+            await self._put(upload_id, 2, data[:9])
+        progress = await file_service.get_multipart_upload(upload_id)
+        assert progress["uploaded_parts"] == []
+        assert os.listdir(uploads_dir) == []
+
+        await file_service.abort_multipart_upload(upload_id)
+        assert not (uploads_dir / "multipart" / upload_id).exists()
+
+    async def test_stale_assembling_session_can_be_taken_over(self, uploads_dir):
+        """测试合并中途崩溃的会话超时后可重新合并，未超时时仍返回409"""
+        content = os.urandom(1000)
+        session = await file_service.init_multipart_upload("bot.zip", len(content))
+        upload_id = session["upload_id"]
+        await self._put(upload_id, 1, content)
+
+        # 模拟合并进程刚开始合并
+        await MultipartUpload.filter(upload_id=upload_id).update(
+            status="assembling", assembling_at=datetime.now()
+        )
+        for action in (file_service.complete_multipart_upload, file_service.abort_multipart_upload):
+            with pytest.raises(HTTPException) as exc_info:
+                await action(upload_id)
+            assert exc_info.value.status_code == 409
+
+        # 合并进程崩溃，超时后接管
+        await MultipartUpload.filter(upload_id=upload_id).update(
+            assembling_at=datetime.now() - MULTIPART_ASSEMBLE_TIMEOUT - timedelta(seconds=1)
+        )
+        file_info = await file_service.complete_multipart_upload(upload_id)
+
+        assert Path(file_info["file_path"]).read_bytes() == content
+        assert (await MultipartUpload.get(upload_id=upload_id)).status == "completed"
+
+
+class TestFileResponse:
+    """文件下载响应测试"""
+
+    @pytest.fixture
+    def client(self, tmp_path):
+        path = tmp_path / "bot.zip"
+        path.write_bytes(bytes(range(256)) * 4)
+        app = FastAPI()
+
+        @app.get("/download")
+        async def download(if_none_match: str | None = Header(None)):
+            return await file_service.file_response(
+                str(path), "bot.zip", "abc123", if_none_match
+            )
+
+        return TestClient(app)
+
+    def test_etag_and_not_modified(self, client):
+        """测试以内容哈希作为ETag，命中时返回304"""
+        response = client.get("/download")
+
+        assert response.status_code == 200
+        assert response.headers["etag"] == '"abc123"'
+        assert len(response.content) == 1024
+        assert client.get("/download", headers={"If-None-Match": 'W/"abc123"'}).status_code == 304
+        assert client.get("/download", headers={"If-None-Match": '"other"'}).status_code == 200
+
+    def test_range_request(self, client):
+        """测试Range请求只返回指定区间"""
+        response = client.get("/download", headers={"Range": "bytes=10-19"})
+
+        assert response.status_code == 206
+        assert response.content == bytes(range(10, 20))
+        assert response.headers["content-range"] == "bytes 10-19/1024"
+
+    async def test_download_only_by_uploader_or_superuser(self, uploads_dir):
+        """测试其他用户下载文件时视为文件不存在"""
+        info = await file_service.save_upload(_upload(b"private bot", "bot.py"))
+
+        with pytest.raises(HTTPException) as exc_info:
+            await download_file(
+                info["file_id"], None, None, SimpleNamespace(id=2, is_superuser=False)
+            )
+        assert exc_info.value.status_code == 404
+
+        for user in (
+            SimpleNamespace(id=1, is_superuser=False),
+            SimpleNamespace(id=2, is_superuser=True),
+        ):
+            response = await download_file(info["file_id"], None, None, user)
+            assert response.status_code == 200
@@ -0,0 +1,44 @@
+"""游戏注册表测试"""
+
+import os
+import sys
+
+# 添加src到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import games  # noqa: E402
+
+
+class TestGameRegistry:
+    """延迟加载注册表测试"""
+
+    def test_builtin_games_registered_from_manifest(self):
+        """测试内置游戏从清单登记"""
+        info = games.get_game("avalon")
+
+        assert {"rock_paper_scissors", "avalon"} <= set(games.list_available_games())
+        assert info["referee"] == "games.avalon.referee:Referee"
+        assert info["source"] == "builtin"
+
+    def test_referee_loaded_on_demand_and_cached(self):
+        """测试裁判类按需导入并缓存"""
+        referee = games.get_game_referee("rock_paper_scissors")
+
+        assert referee.__name__ == "Referee"
+        assert games.get_game_referee("rock_paper_scissors") is referee
+        assert games.RockPaperScissorsReferee is referee
+
+    def test_unknown_game(self):
+        """测试未知游戏"""
+        assert games.get_game("chess") is None
+        assert games.get_game_referee("chess") is None
+
+    def test_invalid_referee_path_returns_none(self, monkeypatch):
+        """测试裁判路径无效时返回None"""
+        monkeypatch.setitem(
+            games.GAME_REGISTRY,
+            "broken",
+            {"name": "broken", "referee": "games.missing_module:Referee"},
+        )
+
+        assert games.get_game_referee("broken") is None
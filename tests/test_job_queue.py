@@ -0,0 +1,294 @@
+"""后台任务队列与AI代码处理测试"""
+
+import asyncio
+import io
+import os
+import sys
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+# 添加src到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from core.jobs import JobQueue  # noqa: E402
+from settings import settings  # noqa: E402
+from models.admin import BackgroundJob  # noqa: E402
+from models.games import AICode, AICodeVersion  # noqa: E402
+from services.ai_code_processing_service import (  # noqa: E402
+    ai_code_processing_service,
+    inspect_ai_code,
+)
+
+
+@pytest.fixture
+async def queue():
+    queue = JobQueue()
+    await BackgroundJob.all().delete()
+    yield queue
+    await queue.stop()
+
+
+class TestJobQueue:
+    """任务队列测试"""
+
+    async def test_run_pending_records_result(self, queue):
+        """测试任务执行成功后记录结果"""
+
+        async def double(payload):
+            return {"value": payload["n"] * 2}
+
+        queue.register("double", double)
+        job = await queue.enqueue("double", {"n": 21})
+
+        assert await queue.run_pending() == 1
+        status = await queue.get_status(job.id)
+        assert status["status"] == "succeeded"
+        assert status["result"] == {"value": 42}
+        assert status["attempts"] == 1
+
+    async def test_failed_job_is_retried_then_failed(self, queue):
+        """测试失败任务按次数重试，超过次数后标记失败"""
+        calls = []
+
+        async def broken(payload):
+            calls.append(payload)
+            raise RuntimeError("boom")
+
+        queue.register("broken", broken)
+        job = await queue.enqueue("broken", max_attempts=2)
+
+        await queue.run_pending()
+        job = await BackgroundJob.get(id=job.id)
+        assert job.status == "pending" and job.run_at > datetime.now()
+
+        await BackgroundJob.filter(id=job.id).update(run_at=datetime.now())
+        await queue.run_pending()
+        job = await BackgroundJob.get(id=job.id)
+        assert job.status == "failed"
+        assert "boom" in job.error
+        assert len(calls) == 2
+
+    async def test_expired_lease_is_reclaimed(self, queue):
+        """测试租约过期的运行中任务会被重新领取"""
+
+        async def noop(payload):
+            return None
+
+        queue.register("noop", noop)
+        job = await queue.enqueue("noop")
+        await BackgroundJob.filter(id=job.id).update(
+            status="running", attempts=1, locked_until=datetime(2000, 1, 1)
+        )
+
+        assert await queue.run_pending() == 1
+        job = await BackgroundJob.get(id=job.id)
+        assert job.status == "succeeded" and job.attempts == 2
+
+    async def test_long_job_renews_lease(self, queue, monkeypatch):
+        """测试执行时间超过租约的任务会续租，不会被重新领取"""
+        monkeypatch.setattr(settings, "JOB_LEASE_SECONDS", 0.3)
+        calls = []
+
+        async def slow(payload):
+            calls.append(payload)
+            await asyncio.sleep(0.8)
+            return {"done": True}
+
+        queue.register("slow", slow)
+        job = await queue.enqueue("slow")
+        first = asyncio.create_task(queue.run_pending())
+        await asyncio.sleep(0.5)
+
+        assert await queue.run_pending() == 0
+        assert await first == 1
+        job = await BackgroundJob.get(id=job.id)
+        assert job.status == "succeeded" and job.attempts == 1
+        assert len(calls) == 1
+
+    async def test_handler_cancelled_when_lease_lost(self, queue, monkeypatch):
+        """测试租约被其他工作协程领取后取消本次执行且不写回结果"""
+        monkeypatch.setattr(settings, "JOB_LEASE_SECONDS", 0.2)
+        cancelled = asyncio.Event()
+
+        async def slow(payload):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        queue.register("slow", slow)
+        job = await queue.enqueue("slow")
+        first = asyncio.create_task(queue.run_pending())
+        await asyncio.sleep(0.05)
+        await BackgroundJob.filter(id=job.id).update(attempts=2)
+
+        await asyncio.wait_for(first, 2)
+        assert cancelled.is_set()
+        job = await BackgroundJob.get(id=job.id)
+        assert job.status == "running" and job.attempts == 2
+
+    async def test_workers_process_enqueued_jobs(self, queue):
+        """测试工作协程并发处理任务且不超过并发上限"""
+        running = 0
+        peak = 0
+
+        async def slow(payload):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+
+        queue.register("slow", slow)
+        await queue.start(concurrency=2)
+        jobs = [await queue.enqueue("slow") for _ in range(5)]
+
+        for _ in range(100):
+            if await BackgroundJob.filter(status="succeeded").count() == len(jobs):
+                break
+            await asyncio.sleep(0.05)
+
+        assert await BackgroundJob.filter(status="succeeded").count() == len(jobs)
+        assert peak <= 2
+
+    async def test_schedule_enqueues_once_while_pending(self, queue):
+        """测试周期任务在同类任务执行中时不重复入队"""
+        payloads = []
+
+        async def slow(payload):
+            payloads.append(payload)
+            await asyncio.sleep(10)
+
+        queue.register("tick", slow)
+        queue.schedule("tick", 0.02, {"n": 1})
+        await queue.start(concurrency=1)
+        await asyncio.sleep(0.2)
+        await queue.stop()
+
+        assert await BackgroundJob.filter(kind="tick").count() == 1
+        assert payloads == [{"n": 1}]
+
+
+class TestAICodeProcessing:
+    """AI代码处理测试"""
+
+    def test_inspect_rejects_syntax_error(self, tmp_path):
+        """测试Python语法错误被拒绝"""
+        path = tmp_path / "bot.py"
+        path.write_text("def get_move(:\n")
+
+        report = inspect_ai_code(str(path), "bot.py", None, tmp_path / "x")
+
+        assert report["errors"] and "bot.py:1" in report["errors"][0]
+
+    def test_inspect_rejects_path_traversal(self, tmp_path):
+        """测试压缩包中的越界路径被拒绝且不解压"""
+        path = tmp_path / "bot.zip"
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.writestr("../evil.py", "x = 1\n")
+
+        report = inspect_ai_code(str(path), "bot.zip", None, tmp_path / "out")
+
+        assert report["errors"]
+        assert not (tmp_path / "out").exists()
+
+    async def test_process_extracts_archive_and_creates_version(self, tmp_path, monkeypatch):
+        """测试处理任务解压压缩包并登记版本"""
+        from services.file_service import file_service
+
+        monkeypatch.setattr(file_service, "uploads_dir", tmp_path)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("bot/main.py", "def get_move(state):\n    return 'rock'\n")
+        path = tmp_path / "bot.zip"
+        path.write_bytes(buffer.getvalue())
+        ai_code = await AICode.create(
+            user_id=1,
+            name="zip bot",
+            file_path=str(path),
+            file_name="bot.zip",
+            file_size=path.stat().st_size,
+            game_type="rock_paper_scissors",
+        )
+        await ai_code_processing_service.enqueue(ai_code)
+
+        report = await ai_code_processing_service.process({"ai_code_id": ai_code.id})
+
+        assert report["errors"] == []
+        assert (tmp_path / "extracted" / report["file_hash"] / "bot" / "main.py").exists()
+        await ai_code.refresh_from_db()
+        assert ai_code.processing_status == "ready"
+        version = await AICodeVersion.get(ai_code_id=ai_code.id)
+        assert version.file_hash == report["file_hash"]
+
+        # 重复执行不会重复登记版本
+        await ai_code_processing_service.process({"ai_code_id": ai_code.id})
+        assert await AICodeVersion.filter(ai_code_id=ai_code.id).count() == 1
+
+    async def test_extracted_tree_is_written_to_storage(self, tmp_path, monkeypatch):
+        """测试解压结果存入存储后端而不是执行任务的副本的本地目录"""
+        import services.ai_code_processing_service as processing_module
+        from services.file_service import file_service
+        from utils.storage import LocalStorage
+
+        remote = LocalStorage(tmp_path / "remote")
+        uploads = tmp_path / "uploads"
+        uploads.mkdir()
+        monkeypatch.setattr(file_service, "uploads_dir", Path("uploads"))
+        monkeypatch.setattr(processing_module, "storage", remote)
+        monkeypatch.chdir(tmp_path)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("bot/main.py", "def get_move(state):\n    return 'rock'\n")
+        (tmp_path / "remote" / "uploads").mkdir(parents=True)
+        (tmp_path / "remote" / "uploads" / "bot.zip").write_bytes(buffer.getvalue())
+        ai_code = await AICode.create(
+            user_id=1,
+            name="remote zip bot",
+            file_path="uploads/bot.zip",
+            file_name="bot.zip",
+            file_size=len(buffer.getvalue()),
+            game_type="rock_paper_scissors",
+        )
+
+        report = await ai_code_processing_service.process({"ai_code_id": ai_code.id})
+
+        prefix = f"uploads/extracted/{report['file_hash']}/"
+        assert report["extracted_path"] == prefix
+        assert await remote.exists(f"{prefix}bot/main.py")
+        assert await remote.exists(f"{prefix}{processing_module.EXTRACTED_MARKER}")
+        # 本地只剩下空的上传目录，暂存目录已清理
+        assert list(uploads.iterdir()) == []
+
+    async def test_final_failure_marks_ai_code_failed(self, monkeypatch):
+        """测试重试次数用尽后AI代码状态为 failed 并记录原因"""
+        import core.jobs as jobs_module
+
+        ai_code = await AICode.create(
+            user_id=1,
+            name="missing bot",
+            file_path="uploads/does-not-exist.py",
+            file_name="bot.py",
+            file_size=1,
+            game_type="rock_paper_scissors",
+        )
+        queue = JobQueue()
+        queue.register(
+            "ai_code.process",
+            ai_code_processing_service.process,
+            on_failure=ai_code_processing_service.fail,
+        )
+        monkeypatch.setattr(jobs_module, "RETRY_BACKOFF_SECONDS", 0)
+        await BackgroundJob.all().delete()
+        job = await queue.enqueue("ai_code.process", {"ai_code_id": ai_code.id}, max_attempts=2)
+
+        # 退避为0，两次执行都在这一次调用中完成
+        assert await queue.run_pending() == 2
+        await ai_code.refresh_from_db()
+        assert (await BackgroundJob.get(id=job.id)).status == "failed"
+        assert ai_code.processing_status == "failed"
+        assert "FileNotFoundError" in ai_code.processing_error
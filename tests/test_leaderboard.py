@@ -0,0 +1,129 @@
+"""排行榜服务测试"""
+
+import os
+import sys
+
+import fakeredis
+import pytest
+
+# 添加src到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from models.games import GameStats  # noqa: E402
+from services.leaderboard_service import leaderboard_service  # noqa: E402
+from utils.cache import CircuitBreaker, cache_manager  # noqa: E402
+
+GAME_TYPE = "leaderboard_test"
+
+
+class LockedRedis:
+    """排行榜不存在且重建锁被其他进程持有的Redis"""
+
+    async def exists(self, *keys):
+        return 0
+
+    async def set(self, key, value, nx=False, ex=None):
+        return None
+
+    async def zrevrange(self, *args, **kwargs):
+        return []
+
+
+class BrokenRedis(LockedRedis):
+    """排行榜存在但读取失败的Redis"""
+
+    async def exists(self, *keys):
+        return len(keys)
+
+    async def zrevrange(self, *args, **kwargs):
+        raise ConnectionError("redis down")
+
+    def pipeline(self, transaction=False):
+        raise ConnectionError("redis down")
+
+
+@pytest.fixture
+async def stats():
+    await GameStats.filter(game_type=GAME_TYPE).delete()
+    for user_id, elo in ((1, 1300), (2, 1250), (3, 1100), (4, 1250)):
+        await GameStats.create(user_id=user_id, game_type=GAME_TYPE, elo_score=elo)
+    yield
+    await GameStats.filter(game_type=GAME_TYPE).delete()
+
+
+class TestLeaderboardFallback:
+    """Redis不可读时退化为数据库查询"""
+
+    @pytest.mark.parametrize("redis", [LockedRedis(), BrokenRedis()])
+    async def test_queries_fall_back_to_database(self, stats, monkeypatch, redis):
+        """测试其他进程正在重建或Redis读取出错时仍返回数据库中的排名"""
+        monkeypatch.setattr(cache_manager, "redis", redis)
+        monkeypatch.setattr(cache_manager, "breaker", CircuitBreaker(100, 5))
+
+        top = await leaderboard_service.top(GAME_TYPE, limit=2)
+        rank = await leaderboard_service.get_rank(2, GAME_TYPE)
+        around = await leaderboard_service.around(3, GAME_TYPE, radius=1)
+
+        assert [row["user_id"] for row in top] == [1, 2]
+        assert rank == {"user_id": 2, "rank": 2, "elo_score": 1250}
+        assert [row["user_id"] for row in around] == [4, 3]
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    monkeypatch.setattr(cache_manager, "redis", redis)
+    monkeypatch.setattr(cache_manager, "breaker", CircuitBreaker(5, 5))
+    return redis
+
+
+class TestLeaderboardRedis:
+    """Redis有序集合中的排行榜"""
+
+    async def test_ties_rank_the_same_as_database(self, stats, fake_redis, monkeypatch):
+        """测试同分用户在Redis和数据库查询中的名次一致"""
+        from_redis = [await leaderboard_service.get_rank(u, GAME_TYPE) for u in (2, 4)]
+        window = await leaderboard_service.around(4, GAME_TYPE, radius=0)
+
+        monkeypatch.setattr(cache_manager, "redis", LockedRedis())
+        from_db = [await leaderboard_service.get_rank(u, GAME_TYPE) for u in (2, 4)]
+
+        assert [r["rank"] for r in from_redis] == [2, 3]
+        assert from_redis == from_db
+        assert [row["user_id"] for row in window] == [4]
+        assert window[0]["elo_score"] == 1250
+
+    async def test_updates_during_rebuild_are_kept(self, stats, fake_redis, monkeypatch):
+        """测试重建期间同步的评分在替换排行榜后仍然保留，且排行榜带有过期时间"""
+        original = leaderboard_service._publish
+
+        async def publish_after_update(redis, key, staging_key):
+            stat = await GameStats.get(user_id=3, game_type=GAME_TYPE)
+            stat.elo_score = 1400
+            await leaderboard_service.sync_stats([stat])
+            await original(redis, key, staging_key)
+
+        monkeypatch.setattr(leaderboard_service, "_publish", publish_after_update)
+        assert await leaderboard_service.rebuild(GAME_TYPE) == 4
+
+        top = await leaderboard_service.top(GAME_TYPE, limit=1)
+        key = leaderboard_service.board_key(GAME_TYPE)
+        assert top[0]["user_id"] == 3 and top[0]["elo_score"] == 1400
+        assert await fake_redis.ttl(key) > 0
+        assert await fake_redis.ttl(leaderboard_service.ready_key(key)) > 0
+
+    async def test_rebuild_keeps_lock_taken_over_by_another_process(
+        self, stats, fake_redis, monkeypatch
+    ):
+        """测试重建超时后锁被其他进程获得时不会被删除"""
+        lock_name = f"{leaderboard_service.board_key(GAME_TYPE)}:rebuild_lock"
+        original = leaderboard_service._publish
+
+        async def publish_after_lock_expired(redis, key, staging_key):
+            await fake_redis.set(lock_name, "other-token")
+            await original(redis, key, staging_key)
+
+        monkeypatch.setattr(leaderboard_service, "_publish", publish_after_lock_expired)
+        await leaderboard_service.rebuild(GAME_TYPE)
+
+        assert await fake_redis.get(lock_name) == "other-token"
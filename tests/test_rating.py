@@ -0,0 +1,92 @@
+"""ELO评分计算测试"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+# 添加src到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from models.games import Battle, BattlePlayer, GameStats  # noqa: E402
+from services.rating_service import RatingService, battle_elo_changes  # noqa: E402
+
+GAME_TYPE = "rating_concurrency_test"
+
+
+class TestBattleEloChanges:
+    """批量ELO计算测试"""
+
+    def test_equal_ratings_win(self):
+        """测试同分选手胜负各变化K/2"""
+        changes = battle_elo_changes(
+            [[("a", "win"), ("b", "loss")]], {"a": 1200, "b": 1200}, k_factor=32
+        )
+
+        assert changes == [[16, -16]]
+
+    def test_batch_uses_pre_batch_ratings(self):
+        """测试同一批内的对战都基于批次开始前的评分"""
+        battles = [
+            [("a", "win"), ("b", "loss")],
+            [("a", "win"), ("c", "loss")],
+        ]
+        changes = battle_elo_changes(battles, {"a": 1200, "b": 1200, "c": 1200})
+
+        assert changes == [[16, -16], [16, -16]]
+
+    def test_multiplayer_is_zero_sum(self):
+        """测试多人对战拆分为两两对局且总变化为零"""
+        battle = [("a", "win"), ("b", "win"), ("c", "loss"), ("d", "loss")]
+        ratings = {"a": 1300, "b": 1250, "c": 1200, "d": 1150}
+
+        [changes] = battle_elo_changes([battle], ratings)
+
+        assert changes[0] > 0 and changes[1] > 0
+        assert changes[2] < 0 and changes[3] < 0
+        assert abs(sum(changes)) <= 2
+
+    def test_unknown_outcome_is_ignored(self):
+        """测试无结果的参与者不参与计算"""
+        changes = battle_elo_changes(
+            [[("a", "win"), ("b", None)]], {"a": 1200, "b": 1200}
+        )
+
+        assert changes == [[0, 0]]
+
+
+@pytest.fixture
+async def pending_battles():
+    """用户501依次击败502~505的四场待计算对战"""
+    battle_ids = []
+    for opponent in range(502, 506):
+        battle = await Battle.create(status="finished", results={"game_type": GAME_TYPE})
+        await BattlePlayer.create(battle_id=battle.id, user_id=501, position=1, outcome="win")
+        await BattlePlayer.create(
+            battle_id=battle.id, user_id=opponent, position=2, outcome="loss"
+        )
+        battle_ids.append(battle.id)
+    yield battle_ids
+    await BattlePlayer.filter(battle_id__in=battle_ids).delete()
+    await Battle.filter(id__in=battle_ids).delete()
+    await GameStats.filter(game_type=GAME_TYPE).delete()
+
+
+class TestProcessBatch:
+    """批量回写测试"""
+
+    async def test_concurrent_batches_do_not_lose_updates(self, pending_battles):
+        """测试并发的批次各自认领不同的对战，评分变化全部累加"""
+        service = RatingService()
+        await asyncio.gather(
+            service.process_pending(batch_size=3), service.process_pending(batch_size=2)
+        )
+
+        players = await BattlePlayer.filter(battle_id__in=pending_battles)
+        assert all(p.initial_elo is not None for p in players)
+        for user_id in range(501, 506):
+            stat = await GameStats.get(user_id=user_id, game_type=GAME_TYPE)
+            changes = [p.elo_change for p in players if p.user_id == user_id]
+            assert stat.elo_score == 1200 + sum(changes)
+        assert sum(p.elo_change for p in players if p.user_id == 501) > 16 * 3
@@ -0,0 +1,138 @@
+"""回放日志格式测试"""
+
+import os
+import sys
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+# 添加src到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from api.v1.games import battles  # noqa: E402
+from core.dependency import AuthControl  # noqa: E402
+from games.replay_log import (  # noqa: E402
+    COMPRESSION_ZLIB,
+    ReplayLogError,
+    ReplayLogReader,
+    ReplayLogWriter,
+    decode_varint,
+    encode_varint,
+)
+from models.games import Battle, BattlePlayer  # noqa: E402
+
+
+def _write_log(path, rounds, players=7, **kwargs):
+    with ReplayLogWriter(str(path), **kwargs) as writer:
+        for round_no in range(rounds):
+            for player in range(players):
+                writer.append(round_no, player, {"vote": (round_no + player) % 2 == 0})
+    return ReplayLogReader(str(path))
+
+
+class TestReplayLog:
+    """回放日志读写测试"""
+
+    def test_varint_roundtrip(self):
+        """测试varint编解码"""
+        for value in (0, 1, 127, 128, 300, 2**40):
+            buf = bytearray()
+            encode_varint(value, buf)
+            assert decode_varint(bytes(buf), 0) == (value, len(buf))
+
+    def test_roundtrip_all_records(self, tmp_path):
+        """测试写入的记录可完整读回"""
+        reader = _write_log(tmp_path / "a.glog", rounds=50, block_records=32)
+
+        records = list(reader.read_rounds())
+
+        assert len(records) == reader.total_records == 350
+        assert records[8] == (1, 1, {"vote": True})
+
+    def test_blocks_split_on_round_boundary(self, tmp_path):
+        """测试数据块只在回合边界切分"""
+        reader = _write_log(tmp_path / "a.glog", rounds=50, block_records=10)
+
+        assert len(reader.blocks) > 1
+        assert all(block[3] % 7 == 0 for block in reader.blocks)
+
+    def test_range_read_only_returns_requested_rounds(self, tmp_path):
+        """测试按回合区间读取"""
+        reader = _write_log(tmp_path / "a.glog", rounds=100, block_records=20)
+
+        records = list(reader.read_rounds(40, 42))
+
+        assert {r[0] for r in records} == {40, 41, 42}
+        assert len(records) == 21
+
+    def test_zlib_fallback(self, tmp_path):
+        """测试zlib压缩方式"""
+        reader = _write_log(
+            tmp_path / "a.glog", rounds=5, compression=COMPRESSION_ZLIB
+        )
+
+        assert reader.compression == COMPRESSION_ZLIB
+        assert len(list(reader.read_rounds())) == 35
+
+    def test_rejects_decreasing_rounds(self, tmp_path):
+        """测试回合号不可递减"""
+        writer = ReplayLogWriter(str(tmp_path / "a.glog"))
+        writer.append(3, 0, "rock")
+        with pytest.raises(ReplayLogError):
+            writer.append(2, 0, "rock")
+        writer.abort()
+
+        assert not list(tmp_path.iterdir())
+
+    def test_rejects_invalid_file(self, tmp_path):
+        """测试拒绝非回放日志文件"""
+        path = tmp_path / "bad.glog"
+        path.write_bytes(b"not a replay log at all")
+
+        with pytest.raises(ReplayLogError):
+            ReplayLogReader(str(path))
+
+
+class TestReplayEndpoint:
+    """回放接口测试"""
+
+    @pytest.fixture
+    async def battle(self, tmp_path, monkeypatch):
+        log_uuid = str(uuid.uuid4())
+        _write_log(tmp_path / "battle.glog", rounds=3, players=2)
+        monkeypatch.setattr(battles, "game_log_path", lambda _: tmp_path / "battle.glog")
+        battle = await Battle.create(status="finished", game_log_uuid=log_uuid)
+        await BattlePlayer.create(battle_id=battle.id, user_id=1, position=1)
+        yield battle
+        await BattlePlayer.filter(battle_id=battle.id).delete()
+        await battle.delete()
+
+    async def _get(self, path, user):
+        app = FastAPI()
+        app.include_router(battles.battles_router, prefix="/battles")
+        app.dependency_overrides[AuthControl.is_authed] = lambda: user
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+            return await ac.get(path)
+
+    async def test_participant_can_read_replay(self, battle):
+        """测试参与者可以按回合区间读取回放"""
+        user = SimpleNamespace(id=1, is_superuser=False)
+        response = await self._get(f"/battles/{battle.id}/replay?start_round=1&end_round=1", user)
+
+        assert response.status_code == 200
+        assert response.text.splitlines() == [
+            '{"round": 1, "player": 0, "move": {"vote": false}}',
+            '{"round": 1, "player": 1, "move": {"vote": true}}',
+        ]
+
+    async def test_other_users_get_404(self, battle):
+        """测试非参与者无法读取回放，超级管理员可以"""
+        stranger = SimpleNamespace(id=2, is_superuser=False)
+        admin = SimpleNamespace(id=3, is_superuser=True)
+
+        assert (await self._get(f"/battles/{battle.id}/replay", stranger)).status_code == 404
+        assert (await self._get(f"/battles/{battle.id}/replay", admin)).status_code == 200
+        assert (await self._get("/battles/0/replay", admin)).status_code == 404
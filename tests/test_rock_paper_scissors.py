@@ -0,0 +1,67 @@
+"""石头剪刀布裁判测试"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# 添加src到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from games.rock_paper_scissors.referee import GameResult, Referee  # noqa: E402
+
+
+class TestJudgeBatch:
+    """批量判定测试"""
+
+    def test_matches_per_call_path(self):
+        """测试批量判定与逐回合判定结果一致"""
+        referee = Referee()
+        moves = referee.valid_moves
+        moves1 = [m1 for m1 in moves for _ in moves]
+        moves2 = [m2 for _ in moves for m2 in moves]
+
+        result = referee.judge_batch(moves1, moves2)
+
+        expected = {GameResult.WIN: 1, GameResult.DRAW: 0, GameResult.LOSS: -1}
+        for i, (m1, m2) in enumerate(zip(moves1, moves2)):
+            r1, r2 = referee.determine_winner(m1, m2)
+            assert result["player1_outcomes"][i] == expected[r1]
+            assert result["player2_outcomes"][i] == expected[r2]
+
+        assert result["player1_wins"] == 3
+        assert result["player2_wins"] == 3
+        assert result["draws"] == 3
+        assert result["rounds"] == 9
+
+    def test_accepts_encoded_arrays(self):
+        """测试直接传入整数编码数组"""
+        referee = Referee()
+        result = referee.judge_batch(np.array([0, 1, 2]), np.array([2, 2, 2]))
+
+        assert result["player1_outcomes"].tolist() == [1, -1, 0]
+
+    def test_rejects_invalid_input(self):
+        """测试无效动作和长度不一致"""
+        referee = Referee()
+
+        with pytest.raises(ValueError):
+            referee.judge_batch(["rock", "lizard"], ["rock", "rock"])
+        with pytest.raises(ValueError):
+            referee.judge_batch(np.array([3]), np.array([0]))
+        with pytest.raises(ValueError):
+            referee.judge_batch(["rock"], ["rock", "paper"])
+        with pytest.raises(ValueError):
+            referee.judge_batch(np.array([256]), np.array([0]))
+        with pytest.raises(ValueError):
+            referee.judge_batch([["rock"]], ["rock"])
+
+    def test_validate_move_rejects_non_strings(self):
+        """测试不可哈希的返回值视为无效动作而不是抛出异常"""
+        referee = Referee()
+
+        assert referee.validate_move("rock")
+        assert not referee.validate_move(["rock"])
+        assert not referee.validate_move({"move": "rock"})
+        assert not referee.validate_move(None)
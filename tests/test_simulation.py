@@ -0,0 +1,76 @@
+"""蒙特卡洛模拟测试"""
+
+import os
+import sys
+
+# 添加src到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from services.simulation_service import (  # noqa: E402
+    _simulate_rps_chunk,
+    wilson_interval,
+)
+
+
+class TestWilsonInterval:
+    """置信区间测试"""
+
+    def test_interval_contains_estimate_and_narrows(self):
+        """测试区间包含点估计且随局数增加而收窄"""
+        low_small, high_small = wilson_interval(30, 60)
+        low_large, high_large = wilson_interval(500, 1000)
+
+        assert low_small < 0.5 < high_small
+        assert high_large - low_large < high_small - low_small
+
+    def test_interval_is_clamped(self):
+        """测试全胜时区间不超过1"""
+        low, high = wilson_interval(20, 20)
+
+        assert high == 1.0 and 0.8 < low < 1.0
+
+    def test_no_games(self):
+        """测试没有对局时返回完整区间"""
+        assert wilson_interval(0, 0) == (0.0, 1.0)
+
+
+class TestSimulateChunk:
+    """批量模拟测试"""
+
+    def test_baselines_are_reproducible(self):
+        """测试相同种子下基线对局结果一致"""
+        seeds = list(range(10))
+        first = _simulate_rps_chunk({"baseline": "random"}, {"baseline": "rock"}, seeds, 20)
+        second = _simulate_rps_chunk({"baseline": "random"}, {"baseline": "rock"}, seeds, 20)
+
+        assert first == second
+        assert sum(first.values()) == 10
+
+    def test_constant_baselines_draw(self):
+        """测试相同出招的基线全部平局"""
+        counts = _simulate_rps_chunk({"baseline": "rock"}, {"baseline": "rock"}, [1, 2, 3], 5)
+
+        assert counts == {"wins": 0, "losses": 0, "draws": 3}
+
+    def test_uploaded_bots_are_reproducible(self, tmp_path):
+        """测试上传的AI代码使用 random 时，相同种子下每局结果一致"""
+        from games.bot_cache import CompiledBotCache
+        from games.sandbox import BaselineBotPool, BotWorkerPool, play_rps_match
+
+        path = tmp_path / "random_bot.py"
+        path.write_text(
+            "import random\n\n"
+            "def get_move(state):\n"
+            "    return random.choice(['rock', 'paper', 'scissors'])\n"
+        )
+
+        def run(seeds):
+            cache = CompiledBotCache(str(tmp_path / "cache"))
+            with BotWorkerPool(str(path), size=1, cache=cache) as pool, BaselineBotPool("rock") as rock:
+                return [
+                    play_rps_match(pool, rock, rounds=30, seed=seed)["player1_wins"]
+                    for seed in seeds
+                ]
+
+        assert run(range(8)) == run(range(8))
+        assert run(range(8)) != run(range(100, 108))
@@ -0,0 +1,255 @@
+"""文件存储后端测试"""
+
+import hashlib
+import os
+import re
+import sys
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from urllib.parse import unquote
+
+import httpx
+import pytest
+
+# 添加src到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import services.file_service as file_service_module  # noqa: E402
+import services.image_service as image_service_module  # noqa: E402
+import utils.storage as storage_module  # noqa: E402
+from utils.storage import LocalStorage, S3Storage  # noqa: E402
+
+
+class FakeS3:
+    """进程内的S3兼容服务，实现存储后端用到的接口子集"""
+
+    def __init__(self, bucket: str = "test"):
+        self.bucket = bucket
+        self.objects: dict[str, bytes] = {}
+        self.uploads: dict[str, dict[int, bytes]] = {}
+        self.requests: list[httpx.Request] = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        assert request.headers["Authorization"].startswith("AWS4-HMAC-SHA256 ")
+        path = unquote(request.url.path)
+        assert path.startswith(f"/{self.bucket}/")
+        key = path[len(self.bucket) + 2:]
+        params = request.url.params
+        method = request.method
+
+        if method == "GET" and not key:
+            return self._list(params["prefix"])
+        if method == "POST" and "uploads" in params:
+            upload_id = f"upload-{len(self.uploads)}"
+            self.uploads[upload_id] = {}
+            return httpx.Response(
+                200,
+                content=(
+                    '<InitiateMultipartUploadResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+                    f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+                ),
+            )
+        if method == "PUT" and "uploadId" in params:
+            self.uploads[params["uploadId"]][int(params["partNumber"])] = request.content
+            return httpx.Response(200, headers={"ETag": f'"{hashlib.md5(request.content).hexdigest()}"'})
+        if method == "POST" and "uploadId" in params:
+            parts = self.uploads.pop(params["uploadId"])
+            numbers = [int(n.text) for n in ET.fromstring(request.content).iter("PartNumber")]
+            self.objects[key] = b"".join(parts[n] for n in numbers)
+            return httpx.Response(200, content=b"<CompleteMultipartUploadResult/>")
+        if method == "PUT" and "x-amz-copy-source" in request.headers:
+            source = unquote(request.headers["x-amz-copy-source"])[len(self.bucket) + 2:]
+            if source not in self.objects:
+                return httpx.Response(404)
+            self.objects[key] = self.objects[source]
+            return httpx.Response(200, content=b"<CopyObjectResult/>")
+        if method == "PUT":
+            self.objects[key] = request.content
+            return httpx.Response(200)
+        if key not in self.objects:
+            return httpx.Response(404 if method != "DELETE" else 204)
+        if method == "DELETE":
+            del self.objects[key]
+            return httpx.Response(204)
+        data = self.objects[key]
+        if method == "HEAD":
+            return httpx.Response(200, headers={"Content-Length": str(len(data))})
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", request.headers.get("Range", ""))
+        if match:
+            start = int(match[1])
+            end = int(match[2]) if match[2] else len(data) - 1
+            return httpx.Response(206, content=data[start:end + 1])
+        return httpx.Response(200, content=data)
+
+    def _list(self, prefix: str) -> httpx.Response:
+        contents = "".join(
+            f"<Contents><Key>{key}</Key></Contents>"
+            for key in sorted(self.objects)
+            if key.startswith(prefix)
+        )
+        return httpx.Response(
+            200,
+            content=(
+                '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+                f"{contents}<IsTruncated>false</IsTruncated></ListBucketResult>"
+            ),
+        )
+
+
+@pytest.fixture
+def fake_s3():
+    return FakeS3()
+
+
+@pytest.fixture
+def s3(fake_s3, tmp_path):
+    return S3Storage(
+        "http://s3.test",
+        fake_s3.bucket,
+        "access",
+        "secret",
+        cache_dir=tmp_path / "cache",
+        transport=httpx.MockTransport(fake_s3.handler),
+    )
+
+
+async def _read(backend, key, start=0, end=None) -> bytes:
+    return b"".join([chunk async for chunk in backend.open(key, start, end)])
+
+
+class TestLocalStorage:
+    """本地存储测试"""
+
+    async def test_roundtrip(self, tmp_path):
+        """测试保存、区间读取、列举、移动与删除"""
+        backend = LocalStorage(tmp_path)
+        source = tmp_path / "tmp.bin"
+        source.write_bytes(b"0123456789")
+
+        await backend.save("uploads/blobs/ab/x.bin", source)
+
+        assert not source.exists()
+        assert await backend.stat("uploads/blobs/ab/x.bin") == 10
+        assert await _read(backend, "uploads/blobs/ab/x.bin", 2, 4) == b"234"
+        assert await backend.list("uploads/blobs/ab/x") == ["uploads/blobs/ab/x.bin"]
+        await backend.move("uploads/blobs/ab/x.bin", "uploads/blobs/ab/y.bin")
+        assert not await backend.exists("uploads/blobs/ab/x.bin")
+        await backend.delete("uploads/blobs/ab/y.bin")
+        assert await backend.list("uploads/") == []
+
+
+class TestS3Storage:
+    """S3兼容存储测试（进程内假服务）"""
+
+    async def test_small_object_roundtrip(self, s3, fake_s3, tmp_path):
+        """测试单次PUT、区间GET、复制移动与删除"""
+        source = tmp_path / "small.txt"
+        source.write_bytes(b"hello storage")
+
+        await s3.save("uploads/blobs/ab/small.txt", source)
+
+        assert fake_s3.objects["uploads/blobs/ab/small.txt"] == b"hello storage"
+        assert not source.exists()
+        assert await s3.stat("uploads/blobs/ab/small.txt") == 13
+        assert await s3.stat("uploads/missing") is None
+        assert await _read(s3, "uploads/blobs/ab/small.txt", 6, 12) == b"storage"
+        await s3.move("uploads/blobs/ab/small.txt", "uploads/blobs/ab/moved.txt")
+        assert await s3.list("uploads/blobs/") == ["uploads/blobs/ab/moved.txt"]
+        with pytest.raises(FileNotFoundError):
+            await s3.move("uploads/blobs/ab/small.txt", "uploads/x")
+        await s3.delete_prefix("uploads/")
+        assert fake_s3.objects == {}
+
+    async def test_large_object_uses_multipart_upload(self, s3, fake_s3, tmp_path, monkeypatch):
+        """测试大文件分片上传，并可下载到本地缓存"""
+        monkeypatch.setattr(storage_module, "S3_PART_SIZE", 1024)
+        content = os.urandom(1024 * 3 + 100)
+        source = tmp_path / "big.zip"
+        source.write_bytes(content)
+
+        await s3.save("uploads/blobs/cd/big.zip", source)
+
+        part_puts = [r for r in fake_s3.requests if "partNumber" in r.url.params]
+        assert len(part_puts) == 4
+        assert fake_s3.objects["uploads/blobs/cd/big.zip"] == content
+        local = await s3.local_path("uploads/blobs/cd/big.zip")
+        assert local.read_bytes() == content
+        assert local.is_relative_to(tmp_path / "cache")
+
+
+class TestFileServiceOnS3:
+    """文件服务使用S3存储的端到端测试"""
+
+    async def test_upload_download_and_delete(self, s3, fake_s3, tmp_path, monkeypatch):
+        """测试上传经由存储后端保存，下载支持Range，最后一个引用删除时删除对象"""
+        import io
+        from types import SimpleNamespace
+
+        from fastapi import UploadFile
+
+        service = file_service_module.file_service
+
+        async def fake_user():
+            return SimpleNamespace(id=1)
+
+        monkeypatch.setattr(file_service_module, "storage", s3)
+        monkeypatch.setattr(image_service_module, "storage", s3)
+        monkeypatch.setattr(service, "uploads_dir", Path("uploads"))
+        monkeypatch.setattr(service, "_authenticate_user", fake_user)
+        monkeypatch.chdir(tmp_path)
+        Path("uploads").mkdir()
+        content = b"def get_move(state):\n    return 'paper'\n"
+
+        info = await service.save_upload(
+            UploadFile(file=io.BytesIO(content), filename="bot.py")
+        )
+
+        key = info["file_path"]
+        assert key == f"uploads/blobs/{info['file_hash'][:2]}/{info['file_hash']}.py"
+        assert fake_s3.objects[key] == content
+        assert os.listdir("uploads") == []
+
+        response = await service.file_response(key, "bot.py", info["file_hash"], range_header="bytes=4-11")
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        assert response.status_code == 206
+        assert body == content[4:12]
+        assert response.headers["content-range"] == f"bytes 4-11/{len(content)}"
+
+        assert await service.delete_file(key, info["file_id"])
+        assert fake_s3.objects == {}
+
+
+class TestUploadsRoute:
+    """/uploads 路由测试"""
+
+    @pytest.mark.parametrize(
+        "url",
+        [
+            "/uploads//etc/passwd",
+            "/uploads/%2Fetc%2Fhostname",
+            "/uploads/..%2F.env",
+            "/uploads/blobs/%2E%2E/%2E%2E/.env",
+            "/uploads/extracted/abc/bot/main.py",
+            "/uploads/multipart/abc/00001.part",
+        ],
+    )
+    async def test_rejects_paths_outside_uploads(self, async_client, url):
+        """测试绝对路径、越界路径与私有子目录不可访问"""
+        response = await async_client.get(url)
+
+        assert response.status_code == 404
+
+    async def test_rejects_absolute_and_parent_paths(self, tmp_path, monkeypatch):
+        """测试服务层直接拒绝绝对路径与 .. 路径"""
+        from fastapi import HTTPException
+
+        service = file_service_module.file_service
+        monkeypatch.setattr(service, "uploads_dir", tmp_path / "uploads")
+        (tmp_path / "uploads").mkdir()
+        (tmp_path / "secret.txt").write_text("secret")
+
+        for path in ("/etc/passwd", str(tmp_path / "secret.txt"), "../secret.txt", "a/../../secret.txt"):
+            with pytest.raises(HTTPException) as exc_info:
+                await service.upload_response(path)
+            assert exc_info.value.status_code == 404
@@ -0,0 +1,203 @@
+"""上传目录孤儿文件回收测试"""
+
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+# 添加src到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from models.admin import FileMapping, MultipartUpload, User  # noqa: E402
+from models.games import AICode  # noqa: E402
+from services.file_service import file_service  # noqa: E402
+from services.storage_reaper_service import storage_reaper_service  # noqa: E402
+from services.user_service import user_service  # noqa: E402
+
+HASH_A = "a" * 64
+HASH_B = "b" * 64
+
+
+def _write(path, content=b"x", age=7200):
+    """写入文件并把修改时间调到 age 秒之前"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    old = time.time() - age
+    os.utime(path, (old, old))
+    return path
+
+
+@pytest.fixture
+async def uploads(tmp_path, monkeypatch):
+    root = tmp_path / "uploads"
+    root.mkdir()
+    monkeypatch.setattr(file_service, "uploads_dir", root)
+    await FileMapping.all().delete()
+    await MultipartUpload.all().delete()
+    await AICode.filter(file_path__startswith=str(root)).delete()
+    await User.filter(username__startswith="reaper").delete()
+    yield root
+    await FileMapping.all().delete()
+    await User.filter(username__startswith="reaper").delete()
+
+
+@pytest.fixture
+async def tree(uploads):
+    """引用与未引用的各类文件"""
+    files = {
+        "mapped": _write(uploads / "blobs" / "aa" / f"{HASH_A}.png"),
+        "thumb": _write(uploads / "blobs" / "aa" / f"{HASH_A}_64.webp"),
+        "orphan": _write(uploads / "blobs" / "bb" / f"{HASH_B}.txt", b"orphan!"),
+        "orphan_thumb": _write(uploads / "blobs" / "bb" / f"{HASH_B}_64.webp"),
+        "code": _write(uploads / "blobs" / "cc" / "bot.py"),
+        "avatar": _write(uploads / "legacy_avatar.png"),
+        "temp": _write(uploads / ".abc.uploading"),
+        "fresh": _write(uploads / "fresh.txt", age=0),
+        "part": _write(uploads / "multipart" / "live" / "00001.part"),
+        "stale_part": _write(uploads / "multipart" / "gone" / "00001.part"),
+    }
+    await FileMapping.create(
+        file_id=uuid.uuid4().hex,
+        original_filename="a.png",
+        file_type="image",
+        upload_user_id=1,
+        file_path=str(files["mapped"]),
+        file_hash=HASH_A,
+    )
+    await AICode.create(
+        user_id=1,
+        name="reaper bot",
+        file_path=str(files["code"]),
+        file_name="bot.py",
+        file_size=1,
+        game_type="rock_paper_scissors",
+    )
+    await User.create(
+        username="reaper_user",
+        email="reaper@example.com",
+        avatar="/" + str(files["avatar"]).replace("\\", "/"),
+    )
+    await MultipartUpload.create(
+        upload_id="live",
+        user_id=1,
+        original_filename="big.zip",
+        file_size=1,
+        part_size=1,
+        part_count=1,
+        expires_at=datetime.now() + timedelta(hours=1),
+    )
+    return files
+
+
+def _orphan_keys(report):
+    return {item["key"] for item in report["items"]}
+
+
+class TestStorageReaper:
+    """孤儿文件回收测试"""
+
+    async def test_report_mode_lists_orphans_without_touching_files(self, tree):
+        """测试 dry-run 只报告孤儿文件"""
+        report = await storage_reaper_service.reap(mode="report")
+
+        expected = {
+            str(tree[name]) for name in ("orphan", "orphan_thumb", "temp", "stale_part")
+        }
+        assert _orphan_keys(report) == expected
+        assert report["orphans"] == len(expected)
+        assert report["scanned"] == len(tree)
+        assert all(path.exists() for path in tree.values())
+
+    async def test_quarantine_moves_orphans_and_purges_old_quarantine(self, tree, uploads):
+        """测试隔离模式移走孤儿文件，过期的隔离文件被清理"""
+        old_day = (datetime.now() - timedelta(days=30)).strftime("%Y%m%d")
+        expired = _write(uploads / ".quarantine" / old_day / "old.txt")
+
+        report = await storage_reaper_service.reap(mode="quarantine")
+
+        assert report["quarantined"] == 4
+        assert report["purged"] == 1
+        assert not expired.exists()
+        assert not tree["orphan"].exists()
+        day = datetime.now().strftime("%Y%m%d")
+        moved = uploads / ".quarantine" / day / "blobs" / "bb" / f"{HASH_B}.txt"
+        assert moved.read_bytes() == b"orphan!"
+        for name in ("mapped", "thumb", "code", "avatar", "fresh", "part"):
+            assert tree[name].exists(), name
+        assert not (uploads / "multipart" / "gone").exists()
+
+        # 刚移入隔离区的文件不会被清理，也不会再次被当作孤儿
+        report = await storage_reaper_service.reap(mode="quarantine")
+        assert report["orphans"] == 0 and report["purged"] == 0
+        assert moved.exists()
+
+    async def test_delete_mode_removes_expired_sessions_and_their_parts(self, tree):
+        """测试删除模式删除过期的分片会话及其分片"""
+        await MultipartUpload.filter(upload_id="live").update(
+            expires_at=datetime.now() - timedelta(minutes=1)
+        )
+
+        report = await storage_reaper_service.reap(mode="delete")
+
+        assert report["expired_sessions"] == 1
+        assert report["deleted"] == 5
+        assert not tree["part"].exists()
+        assert not await MultipartUpload.filter(upload_id="live").exists()
+        assert tree["mapped"].exists()
+
+    async def test_file_referenced_during_reap_is_restored(self, tree, monkeypatch):
+        """测试扫描后新增引用的文件在复查时被移回"""
+        original = storage_reaper_service._find_orphans
+        calls = 0
+
+        async def find_orphans(objects):
+            nonlocal calls
+            calls += 1
+            orphans = await original(objects)
+            if calls == 1:
+                await FileMapping.create(
+                    file_id=uuid.uuid4().hex,
+                    original_filename="b.txt",
+                    file_type="document",
+                    upload_user_id=2,
+                    file_path=str(tree["orphan"]),
+                    file_hash=HASH_B,
+                )
+            return orphans
+
+        monkeypatch.setattr(storage_reaper_service, "_find_orphans", find_orphans)
+
+        report = await storage_reaper_service.reap(mode="delete")
+
+        assert report["restored"] == 2  # 原文件与其缩略图
+        assert tree["orphan"].read_bytes() == b"orphan!"
+        assert tree["orphan_thumb"].exists()
+
+    async def test_replaced_avatar_is_released(self, uploads):
+        """测试更换头像后旧头像的上传引用被释放，旧文件不会成为永久保留的孤儿"""
+        user = await User.create(username="reaper_avatar", email="avatar@example.com")
+        paths = []
+        for file_hash in (HASH_A, HASH_B):
+            path = _write(uploads / "blobs" / file_hash[:2] / f"{file_hash}.png")
+            await FileMapping.create(
+                file_id=uuid.uuid4().hex,
+                original_filename="avatar.png",
+                file_type="image",
+                upload_user_id=user.id,
+                file_path=str(path),
+                file_hash=file_hash,
+            )
+            paths.append(path)
+        old, new = paths
+        await user_service.update_user_avatar(user.id, str(old))
+
+        await user_service.update_user_avatar(user.id, str(new))
+
+        assert not await FileMapping.filter(file_path=str(old)).exists()
+        assert not old.exists()
+        assert new.exists()
+        report = await storage_reaper_service.reap(mode="report")
+        assert report["orphans"] == 0
@@ -0,0 +1,169 @@
+"""锦标赛对阵测试"""
+
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+# 添加src到路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import services.tournament_service as tournament_module  # noqa: E402
+from models.games import AICode, Battle, BattlePlayer, Tournament  # noqa: E402
+from services.tournament_service import (  # noqa: E402
+    TournamentService,
+    pairing_key,
+    round_robin_pairings,
+    swiss_pairings,
+)
+
+
+class TestPairings:
+    """对阵生成测试"""
+
+    def test_round_robin_covers_every_pair_once(self):
+        """测试单循环每两名选手对战一次"""
+        pairs = list(round_robin_pairings([3, 1, 2, 4]))
+
+        assert len(pairs) == 6
+        assert len({tuple(sorted(p)) for p in pairs}) == 6
+
+    def test_pairing_key_is_order_independent(self):
+        """测试对局键与选手顺序无关"""
+        assert pairing_key(2, 5, 3) == pairing_key(2, 3, 5) == "2:3-5"
+
+    def test_swiss_pairs_by_score_and_avoids_rematches(self):
+        """测试瑞士轮按积分配对并避免重复交手"""
+        scores = {1: 2.0, 2: 2.0, 3: 1.0, 4: 1.0}
+        pairs, bye = swiss_pairings(scores, scores, {(1, 2)}, set())
+
+        assert bye is None
+        assert pairs == [(1, 3), (2, 4)]
+
+    def test_swiss_bye_goes_to_lowest_without_previous_bye(self):
+        """测试奇数人数时由排名最低且未轮空的选手轮空"""
+        scores = {1: 2.0, 2: 1.0, 3: 0.0}
+        pairs, bye = swiss_pairings(scores, scores, set(), {3})
+
+        assert bye == 2
+        assert pairs == [(1, 3)]
+
+
+def _fake_match(bot1: dict, bot2: dict, rounds: int) -> dict:
+    if 13 in (bot1["id"], bot2["id"]):
+        raise RuntimeError("bot crashed")
+    return {"player1_wins": 1 if bot1["id"] < bot2["id"] else 0, "player2_wins": 0, "draws": 0}
+
+
+class TestRunPairings:
+    """对局执行测试"""
+
+    async def test_pairings_are_consumed_lazily_with_bounded_tasks(self, monkeypatch):
+        """测试对阵惰性消费、在途任务数有上限，失败的对局也写入断点"""
+        service = TournamentService()
+        saved = []
+        in_flight = peak = 0
+
+        async def fake_save(context, bot1, bot2, results, started_at, game_log_uuid=None):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            saved.append(results)
+
+        monkeypatch.setitem(tournament_module.MATCH_RUNNERS, "fake", _fake_match)
+        monkeypatch.setattr(service, "_save_battle", fake_save)
+        ids = [1, 2, 13, 4, 5]
+        bots = {i: SimpleNamespace(id=i, file_hash=None, name=f"bot{i}") for i in ids}
+        context = {
+            "tournament_id": 1,
+            "game_type": "fake",
+            "rounds_per_match": 1,
+            "ranking_id": 0,
+            "local_paths": {i: f"{i}.py" for i in ids},
+        }
+        pairings = ((0, a, b) for a, b in round_robin_pairings(ids))
+        assert not isinstance(round_robin_pairings(ids), list)
+        finished = {}
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            await service._run_pairings(executor, 2, pairings, bots, context, finished)
+
+        assert len(finished) == 10 and len(saved) == 10
+        failed = [r for r in finished.values() if r.get("failed")]
+        assert len(failed) == 4 and all("bot crashed" in r["error"] for r in failed)
+        assert peak <= 2
+
+
+
+@pytest.fixture
+async def fake_bots(monkeypatch):
+    """游戏类型为 fake 的参赛AI代码，对局在线程池中运行"""
+    monkeypatch.setitem(tournament_module.MATCH_RUNNERS, "fake", _fake_match)
+    monkeypatch.setattr(tournament_module, "ProcessPoolExecutor", ThreadPoolExecutor)
+    bots = [
+        await AICode.create(
+            user_id=100 + i,
+            name=f"bot{i}",
+            file_path=f"uploads/bot{i}.py",
+            file_name=f"bot{i}.py",
+            file_size=1,
+            game_type="fake",
+            is_active=True,
+        )
+        for i in range(4)
+    ]
+    yield bots
+    tournaments = await Tournament.filter(name__startswith="test-").values_list("id", flat=True)
+    battles = await Battle.filter(tournament_id__in=tournaments).values_list("id", flat=True)
+    await BattlePlayer.filter(battle_id__in=battles).delete()
+    await Battle.filter(id__in=battles).delete()
+    await Tournament.filter(id__in=tournaments).delete()
+    await AICode.filter(game_type="fake").delete()
+
+
+class TestRunTournament:
+    """锦标赛断点续跑测试"""
+
+    async def test_resume_runs_only_missing_pairings(self, fake_bots):
+        """测试续跑只运行缺少的对局，积分由数据库聚合"""
+        service = TournamentService()
+        ids = sorted(bot.id for bot in fake_bots)
+        first = await service.run_tournament("test-rr", "fake", max_workers=2)
+        assert first["battles"] == 6 and first["failed_battles"] == 0
+
+        tournament = await Tournament.get(name="test-rr")
+        removed = await Battle.get(
+            tournament_id=tournament.id, pairing_key=pairing_key(0, ids[1], ids[3])
+        )
+        await BattlePlayer.filter(battle_id=removed.id).delete()
+        await removed.delete()
+
+        calls = []
+        original = tournament_module.MATCH_RUNNERS["fake"]
+
+        def counting(bot1, bot2, rounds):
+            calls.append((bot1["id"], bot2["id"]))
+            return original(bot1, bot2, rounds)
+
+        tournament_module.MATCH_RUNNERS["fake"] = counting
+        second = await service.run_tournament("test-rr", "fake", max_workers=2)
+
+        assert calls == [(ids[1], ids[3])]
+        assert second["battles"] == 6
+        # 较小ID一方获胜：ids[0] 三胜，ids[3] 全负
+        scores = {row["ai_code_id"]: row["score"] for row in second["standings"]}
+        assert scores == {ids[0]: 3.0, ids[1]: 2.0, ids[2]: 1.0, ids[3]: 0.0}
+        assert await Battle.filter(tournament_id=tournament.id, battle_type="tournament").count() == 6
+
+    async def test_resume_rejects_different_settings(self, fake_bots):
+        """测试同名锦标赛以不同的对阵方式续跑时报错"""
+        service = TournamentService()
+        await service.run_tournament("test-mode", "fake", max_workers=1)
+
+        with pytest.raises(ValueError):
+            await service.run_tournament("test-mode", "fake", mode="swiss", max_workers=1)